@@ -5,4 +5,6 @@ except ImportError:
     __version__ = "unknown"
 
 from ._qt.subboxing_widget import napari_experimental_provide_dock_widget
+from .eralda import Pose, Transform
+from .expansion import expand_particles, expand_poses
 
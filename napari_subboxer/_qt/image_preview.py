@@ -0,0 +1,43 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from qtpy.QtWidgets import QWidget, QVBoxLayout, QLabel
+from vispy import scene
+
+
+class ImagePreview(QWidget):
+    """2D greyscale image in a pan/zoom canvas, for previews docked next to
+    the main viewer."""
+    def __init__(self, title: str = '', *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = QLabel(title, parent=self)
+        self.canvas = scene.SceneCanvas(keys=None, size=(256, 256))
+        self.view = self.canvas.central_widget.add_view()
+        self.view.camera = scene.PanZoomCamera(aspect=1)
+        self.view.camera.flip = (False, True, False)
+        self.image = scene.visuals.Image(
+            np.zeros((1, 1), dtype=np.float32),
+            cmap='grays',
+            interpolation='nearest',
+            parent=self.view.scene,
+        )
+        self._shape: Optional[Tuple[int, int]] = None
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(self.label)
+        self.layout().addWidget(self.canvas.native)
+        self.layout().setContentsMargins(2, 2, 2, 2)
+
+    def set_image(self, image: np.ndarray, contrast_limits=None):
+        image = np.asarray(image, dtype=np.float32)
+        if contrast_limits is None:
+            contrast_limits = (float(image.min()), float(image.max()))
+        self.image.set_data(image)
+        self.image.clim = contrast_limits
+        # only reset the camera when the image size changes, keeping zoom
+        if image.shape != self._shape:
+            self._shape = image.shape
+            self.view.camera.set_range(
+                x=(0, image.shape[1]), y=(0, image.shape[0]), margin=0
+            )
+        self.canvas.update()
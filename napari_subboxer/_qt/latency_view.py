@@ -0,0 +1,95 @@
+from typing import Callable, Dict
+
+from qtpy.QtCore import QTimer
+from qtpy.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, \
+    QPushButton, QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView
+
+from napari_subboxer.latency_monitor import LatencyMonitor
+
+HANDLER_COLUMNS = ('count', 'rate', 'p50', 'p95', 'p99', 'max')
+
+
+class LatencyView(QWidget):
+    """Latency percentiles (ms) and event rates (per second) of handlers
+    and memory held by layers, refreshed periodically while visible."""
+    def __init__(
+            self,
+            monitor: LatencyMonitor,
+            layer_memory: Callable[[], Dict[str, int]],
+            dump: Callable[[str], None],
+            interval: int = 500,
+            *args,
+            **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.monitor = monitor
+        self.layer_memory = layer_memory
+        self.dump = dump
+
+        self.handlers_table = QTableWidget(0, len(HANDLER_COLUMNS))
+        self.handlers_table.setHorizontalHeaderLabels(HANDLER_COLUMNS)
+        self.layers_table = QTableWidget(0, 1)
+        self.layers_table.setHorizontalHeaderLabels(['MB'])
+        for table in self.handlers_table, self.layers_table:
+            table.horizontalHeader().setSectionResizeMode(
+                QHeaderView.ResizeToContents
+            )
+        self.reset_button = QPushButton('reset')
+        self.save_button = QPushButton('save JSON')
+        buttons = QWidget()
+        buttons.setLayout(QHBoxLayout())
+        buttons.layout().addWidget(self.reset_button)
+        buttons.layout().addWidget(self.save_button)
+        buttons.layout().setContentsMargins(2, 2, 2, 2)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(QLabel('handler latency (ms)'))
+        self.layout().addWidget(self.handlers_table)
+        self.layout().addWidget(QLabel('layer memory'))
+        self.layout().addWidget(self.layers_table)
+        self.layout().addWidget(buttons)
+        self.layout().setContentsMargins(2, 2, 2, 2)
+
+        self.reset_button.clicked.connect(self._on_reset)
+        self.save_button.clicked.connect(self._on_save)
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(interval)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        statistics = self.monitor.statistics()
+        self.handlers_table.setRowCount(len(statistics))
+        self.handlers_table.setVerticalHeaderLabels(list(statistics))
+        for row, handler in enumerate(statistics.values()):
+            for column, name in enumerate(HANDLER_COLUMNS):
+                value = handler[name]
+                text = str(value) if name == 'count' else f'{value:.1f}'
+                self.handlers_table.setItem(row, column, QTableWidgetItem(text))
+
+        layer_memory = self.layer_memory()
+        self.layers_table.setRowCount(len(layer_memory))
+        self.layers_table.setVerticalHeaderLabels(list(layer_memory))
+        for row, nbytes in enumerate(layer_memory.values()):
+            self.layers_table.setItem(
+                row, 0, QTableWidgetItem(f'{nbytes / 1e6:.1f}')
+            )
+
+    def _on_reset(self):
+        self.monitor.reset()
+        self.refresh()
+
+    def _on_save(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save latency report...",
+            "subboxer_latency.json",
+            "JSON (*.json)",
+            options=options
+        )
+        if filename == '':  # no file selected, early exit
+            return
+        self.dump(filename)
@@ -4,8 +4,15 @@ from .utils import change_enabled_with_opacity
 
 
 class OpenCloseButtonsWidget(QWidget):
-    def __init__(self, open_button: ButtonData, close_button: ButtonData):
+    def __init__(
+            self,
+            open_button: ButtonData,
+            close_button: ButtonData,
+            reopenable: bool = False
+    ):
         super().__init__()
+        # whether more can be opened while open
+        self.reopenable = reopenable
         self.open_button = QPushButton(open_button[0])
         self.close_button = QPushButton(close_button[0])
 
@@ -26,7 +33,7 @@ class OpenCloseButtonsWidget(QWidget):
     def on_open_change(self, opened: bool):
         self.open = opened
         change_enabled_with_opacity(self.close_button, enabled=self.open)
-        change_enabled_with_opacity(self.open_button, enabled=(not self.open))
+        change_enabled_with_opacity(self.open_button, enabled=(self.reopenable or not self.open))
 
     def on_open(self):
         self.on_open_change(opened=True)
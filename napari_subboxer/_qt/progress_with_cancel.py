@@ -0,0 +1,41 @@
+from typing import Callable
+
+from qtpy.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLabel, \
+    QProgressBar, QPushButton
+
+
+class ProgressWithCancel(QWidget):
+    """Progress bar with a message and a cancel button, hidden when idle."""
+    def __init__(self, cancel_callback: Callable, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = QLabel(parent=self)
+        self.progress_bar = QProgressBar(parent=self)
+        self.cancel_button = QPushButton('cancel', parent=self)
+
+        self.progress_bar.setRange(0, 100)
+
+        progress_row = QWidget(parent=self)
+        progress_row.setLayout(QHBoxLayout())
+        progress_row.layout().addWidget(self.progress_bar)
+        progress_row.layout().addWidget(self.cancel_button)
+        progress_row.layout().setContentsMargins(0, 0, 0, 0)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(self.label)
+        self.layout().addWidget(progress_row)
+        self.layout().setContentsMargins(2, 2, 2, 2)
+
+        self.cancel_button.clicked.connect(cancel_callback)
+        self.cancel_button.clicked.connect(self.stop)
+        self.stop()
+
+    def start(self, message: str = ''):
+        self.set_progress(0, message)
+        self.setVisible(True)
+
+    def set_progress(self, fraction: float, message: str = ''):
+        self.label.setText(message)
+        self.progress_bar.setValue(int(round(fraction * 100)))
+
+    def stop(self):
+        self.setVisible(False)
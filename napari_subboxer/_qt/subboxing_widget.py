@@ -1,20 +1,31 @@
 from functools import partial
+from pathlib import Path
 
 import napari.viewer
 from napari_plugin_engine import napari_hook_implementation
-from qtpy.QtWidgets import QWidget, QVBoxLayout, QFileDialog, QPushButton
+from qtpy.QtCore import Signal
+from qtpy.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFileDialog, \
+    QPushButton, QCheckBox, QSpinBox, QComboBox, QDoubleSpinBox, QLabel
 
 
 from .open_close_buttons import OpenCloseButtonsWidget
+from .progress_with_cancel import ProgressWithCancel
+from .image_preview import ImagePreview
+from .latency_view import LatencyView
 from .named_labeled_slider import NamedLabeledSlider
 from .label_between_arrows import LabelBetweenArrows
 from .selectable_button_list import LabeledSelectableButtonList
 from .utils import enable_with_opacity, disable_with_opacity
 
+from napari_subboxer.derivatives import DERIVATIVES
 from napari_subboxer.subboxer import Subboxer, SubboxerMode
 
 
 class SubboxingWidget(QWidget):
+    # write errors are emitted from writer threads, a Qt signal queues them
+    # to the main thread
+    _write_failed = Signal(str, str)
+
     def __init__(self, viewer: napari.viewer.Viewer):
         super().__init__()
         self.viewer = viewer
@@ -22,13 +33,43 @@ class SubboxingWidget(QWidget):
 
         self.open_close_buttons = OpenCloseButtonsWidget(
             open_button=('open map', self._on_tomogram_open),
-            close_button=('close map', self._on_tomogram_close)
+            close_button=('close map', self._on_tomogram_close),
+            reopenable=True
+        )
+        self.open_maps_controls = QWidget()
+        self.open_maps_combobox = QComboBox()
+        self.open_maps_controls.setLayout(QHBoxLayout())
+        self.open_maps_controls.layout().addWidget(QLabel('open maps:'))
+        self.open_maps_controls.layout().addWidget(self.open_maps_combobox, 1)
+        self.open_maps_controls.layout().setContentsMargins(2, 2, 2, 2)
+        self.loading_progress = ProgressWithCancel(
+            cancel_callback=self.subboxer.cancel_map_loading
         )
+        self.error_label = QLabel()
+        self.error_label.setWordWrap(True)
+        self.error_label.setStyleSheet("QLabel{color: red;}")
+        self.error_label.setVisible(False)
         self.active_transformation_controls = LabelBetweenArrows(
             label_func=self.generate_label,
             decrease_callback=self.subboxer.previous_subparticle,
             increase_callback=self.subboxer.next_subparticle,
         )
+        self.derivative_controls = QWidget()
+        self.derivative_combobox = QComboBox()
+        self.derivative_combobox.addItems(DERIVATIVES)
+        self.derivative_combobox.setCurrentText(self.subboxer.map_derivative)
+        self.sigma_spinbox = QDoubleSpinBox()
+        self.sigma_spinbox.setRange(0.5, 20)
+        self.sigma_spinbox.setSingleStep(0.5)
+        self.sigma_spinbox.setValue(self.subboxer.gaussian_sigma)
+        self.sigma_spinbox.setPrefix('sigma: ')
+        self.sigma_spinbox.setKeyboardTracking(False)
+        self.sigma_spinbox.setEnabled(self.subboxer.map_derivative == 'gaussian')
+        self.derivative_controls.setLayout(QHBoxLayout())
+        self.derivative_controls.layout().addWidget(QLabel('map:'))
+        self.derivative_controls.layout().addWidget(self.derivative_combobox)
+        self.derivative_controls.layout().addWidget(self.sigma_spinbox)
+        self.derivative_controls.layout().setContentsMargins(2, 2, 2, 2)
         self.mode_controls = LabeledSelectableButtonList(
             label='mode:',
             button_data=[
@@ -37,13 +78,62 @@ class SubboxingWidget(QWidget):
                 ('in plane', self.subboxer.activate_rotate_in_plane_mode)
             ]
         )
+        self.snap_controls = QWidget()
+        self.snap_checkbox = QCheckBox('snap to density')
+        self.snap_checkbox.setChecked(self.subboxer.snap_to_density)
+        self.dark_density_checkbox = QCheckBox('dark density')
+        self.dark_density_checkbox.setChecked(self.subboxer.dark_density)
+        self.snap_controls.setLayout(QHBoxLayout())
+        self.snap_controls.layout().addWidget(self.snap_checkbox)
+        self.snap_controls.layout().addWidget(self.dark_density_checkbox)
+        self.snap_controls.layout().setContentsMargins(2, 2, 2, 2)
         self.save_transformations_button = QPushButton('save transformations')
+        self.session_buttons = QWidget()
+        self.save_session_button = QPushButton('save session')
+        self.load_session_button = QPushButton('load session')
+        self.session_buttons.setLayout(QHBoxLayout())
+        self.session_buttons.layout().addWidget(self.save_session_button)
+        self.session_buttons.layout().addWidget(self.load_session_button)
+        self.session_buttons.layout().setContentsMargins(2, 2, 2, 2)
+        self.overlay_button = QPushButton('overlay expanded subparticles')
+        self.plane_view_checkbox = QCheckBox('2D plane view')
+        self.plane_view = None
+        self.subbox_preview_controls = QWidget()
+        self.subbox_preview_checkbox = QCheckBox('sub-box preview')
+        self.subbox_size_spinbox = QSpinBox()
+        self.subbox_size_spinbox.setRange(8, 256)
+        self.subbox_size_spinbox.setSingleStep(8)
+        self.subbox_size_spinbox.setValue(self.subboxer.subbox_preview_size)
+        self.subbox_mode_combobox = QComboBox()
+        self.subbox_mode_combobox.addItems(['sections', 'projection'])
+        self.subbox_preview_controls.setLayout(QHBoxLayout())
+        self.subbox_preview_controls.layout().addWidget(
+            self.subbox_preview_checkbox
+        )
+        self.subbox_preview_controls.layout().addWidget(self.subbox_size_spinbox)
+        self.subbox_preview_controls.layout().addWidget(
+            self.subbox_mode_combobox
+        )
+        self.subbox_preview_controls.layout().setContentsMargins(2, 2, 2, 2)
+        self.subbox_preview = None
+        self.latency_checkbox = QCheckBox('latency monitor')
+        self.latency_view = None
 
         self.setLayout(QVBoxLayout())
         self.layout().addWidget(self.open_close_buttons)
+        self.layout().addWidget(self.open_maps_controls)
+        self.layout().addWidget(self.loading_progress)
+        self.layout().addWidget(self.error_label)
+        self.layout().addWidget(self.derivative_controls)
         self.layout().addWidget(self.mode_controls)
         self.layout().addWidget(self.active_transformation_controls)
+        self.layout().addWidget(self.snap_controls)
         self.layout().addWidget(self.save_transformations_button)
+        self.layout().addWidget(self.session_buttons)
+        self.layout().addWidget(self.overlay_button)
+        self.layout().addWidget(self.plane_view_checkbox)
+        self.layout().addWidget(self.subbox_preview_controls)
+        self.layout().addWidget(self.latency_checkbox)
         self.layout().setSpacing(0)
         self.layout().setContentsMargins(8, 2, 2, 2)
         self.layout().addStretch(1)
@@ -55,9 +145,43 @@ class SubboxingWidget(QWidget):
         self.subboxer.active_subparticle_changed.connect(
             self._on_active_subparticle_changed
         )
+        self.snap_checkbox.toggled.connect(self._on_snap_toggled)
+        self.dark_density_checkbox.toggled.connect(self._on_dark_density_toggled)
+        self.derivative_combobox.currentTextChanged.connect(
+            self._on_derivative_changed
+        )
+        self.sigma_spinbox.valueChanged.connect(self._on_derivative_changed)
         self.save_transformations_button.clicked.connect(
             self._on_save_subparticles
         )
+        self.save_session_button.clicked.connect(self._on_save_session)
+        self.load_session_button.clicked.connect(self._on_load_session)
+        self.overlay_button.clicked.connect(self._on_overlay)
+        self.plane_view_checkbox.toggled.connect(self._on_plane_view_toggled)
+        self.subboxer.plane_resliced.connect(self._on_plane_resliced)
+        self.subbox_preview_checkbox.toggled.connect(
+            self._on_subbox_preview_toggled
+        )
+        self.subbox_size_spinbox.valueChanged.connect(
+            self._on_subbox_preview_changed
+        )
+        self.subbox_mode_combobox.currentTextChanged.connect(
+            self._on_subbox_preview_changed
+        )
+        self.subboxer.subbox_previewed.connect(self._on_subbox_previewed)
+        self.latency_checkbox.toggled.connect(self._on_latency_toggled)
+        self.subboxer.map_loading_progress.connect(
+            self.loading_progress.set_progress
+        )
+        self.subboxer.map_loaded.connect(self._on_map_loading_stopped)
+        self.subboxer.open_maps_changed.connect(self._on_open_maps_changed)
+        self.open_maps_combobox.activated.connect(self._on_open_map_selected)
+        self.subboxer.map_loading_cancelled.connect(
+            self._on_map_loading_cancelled
+        )
+        self.subboxer.map_loading_failed.connect(self._on_map_loading_failed)
+        self.subboxer.write_failed.connect(self._write_failed.emit)
+        self._write_failed.connect(self._on_write_failed)
 
     def _on_tomogram_open(self):
         options = QFileDialog.Options()
@@ -71,12 +195,73 @@ class SubboxingWidget(QWidget):
         )
         if filename == '':  # no file selected, early exit
             return
+        self.loading_progress.start(message='opening map')
         self.subboxer.open_map(filename)
 
     def _on_tomogram_close(self):
         self.subboxer.close_map()
-        disable_with_opacity(self.plane_thickness_controls)
-        disable_with_opacity(self.plane_volume_toggle)
+        if self.subboxer.loading_map:
+            self.loading_progress.start(message='opening map')
+        self.open_close_buttons.on_open_change(
+            opened=len(self.subboxer.open_maps) > 0
+        )
+
+    def _on_open_maps_changed(self):
+        self.open_maps_combobox.blockSignals(True)
+        self.open_maps_combobox.clear()
+        for map_file in self.subboxer.open_maps:
+            self.open_maps_combobox.addItem(Path(map_file).name, map_file)
+        index = self.open_maps_combobox.findData(self.subboxer.map_file)
+        self.open_maps_combobox.setCurrentIndex(index)
+        self.open_maps_combobox.blockSignals(False)
+
+    def _on_open_map_selected(self, index: int):
+        map_file = self.open_maps_combobox.itemData(index)
+        if map_file == self.subboxer.map_file:
+            return
+        self.subboxer.switch_map(map_file)
+        if self.subboxer.loading_map:
+            self.loading_progress.start(message='opening map')
+
+    def _on_map_loading_stopped(self, map_file: str = None):
+        self.loading_progress.stop()
+        self.clear_error()
+
+    def _on_map_loading_cancelled(self):
+        self.loading_progress.stop()
+        self.open_close_buttons.on_open_change(
+            opened=self.subboxer.map_file is not None
+        )
+        self._on_open_maps_changed()
+
+    def _on_map_loading_failed(self, map_file: str, message: str):
+        self._on_map_loading_cancelled()
+        self.show_error(f'could not open {Path(map_file).name}: {message}')
+
+    def _on_write_failed(self, path: str, message: str):
+        self.show_error(f'could not write {Path(path).name}: {message}')
+
+    def show_error(self, message: str):
+        self.error_label.setText(message)
+        self.error_label.setVisible(True)
+
+    def clear_error(self):
+        self.error_label.setVisible(False)
+
+    def _on_derivative_changed(self, value=None):
+        derivative = self.derivative_combobox.currentText()
+        self.sigma_spinbox.setEnabled(derivative == 'gaussian')
+        if self.subboxer._map_file is not None:
+            self.loading_progress.start(message='opening map')
+        self.subboxer.set_map_derivative(
+            derivative, sigma=self.sigma_spinbox.value()
+        )
+
+    def _on_snap_toggled(self, checked: bool):
+        self.subboxer.snap_to_density = checked
+
+    def _on_dark_density_toggled(self, checked: bool):
+        self.subboxer.dark_density = checked
 
     def _on_save_subparticles(self):
         options = QFileDialog.Options()
@@ -92,6 +277,125 @@ class SubboxingWidget(QWidget):
             return
         self.subboxer.save_subparticles(output_filename=filename)
 
+    def _on_save_session(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save session...",
+            f"subboxer_session.npz",
+            "subboxer sessions (*.npz)",
+            options=options
+        )
+        if filename == '':  # no file selected, early exit
+            return
+        self.subboxer.save_session(filename)
+
+    def _on_load_session(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filename, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select a session file...",
+            "",
+            "subboxer sessions (*.npz)",
+            options=options
+        )
+        if filename == '':  # no file selected, early exit
+            return
+        self.loading_progress.start(message='opening map')
+        self.open_close_buttons.on_open_change(opened=True)
+        self.subboxer.load_session(filename)
+
+    def _on_overlay(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        particles_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select particles from a consensus refinement...",
+            "",
+            "RELION particles (*.star)",
+            options=options
+        )
+        if particles_file == '':  # no file selected, early exit
+            return
+        transformations_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select subparticle transformations...",
+            "",
+            "subboxer transformations (*.star)",
+            options=options
+        )
+        if transformations_file == '':  # no file selected, early exit
+            return
+        self.subboxer.show_expanded_subparticles(
+            particles_file, transformations_file
+        )
+
+    def _on_plane_view_toggled(self, checked: bool):
+        if checked:
+            if self.plane_view is None:
+                self.plane_view = ImagePreview(title='plane')
+                self.viewer.window.add_dock_widget(
+                    self.plane_view, name='plane view', area='right'
+                )
+            self.plane_view.parent().setVisible(True)
+            self.subboxer.enable_plane_reslicing()
+        else:
+            self.subboxer.disable_plane_reslicing()
+            if self.plane_view is not None:
+                self.plane_view.parent().setVisible(False)
+
+    def _on_plane_resliced(self, image):
+        if self.plane_view is not None:
+            self.plane_view.set_image(
+                image, contrast_limits=self.subboxer.plane_layer.contrast_limits
+            )
+
+    def _on_subbox_preview_toggled(self, checked: bool):
+        if checked:
+            if self.subbox_preview is None:
+                self.subbox_preview = ImagePreview(title='sub-box (xy | xz | yz)')
+                self.viewer.window.add_dock_widget(
+                    self.subbox_preview, name='sub-box preview', area='right'
+                )
+            self.subbox_preview.parent().setVisible(True)
+            self.subboxer.enable_subbox_preview()
+        else:
+            self.subboxer.disable_subbox_preview()
+            if self.subbox_preview is not None:
+                self.subbox_preview.parent().setVisible(False)
+
+    def _on_latency_toggled(self, checked: bool):
+        if checked and self.latency_view is None:
+            self.latency_view = LatencyView(
+                self.subboxer.latency_monitor,
+                layer_memory=self.subboxer.layer_memory,
+                dump=self.subboxer.dump_latency,
+            )
+            self.viewer.window.add_dock_widget(
+                self.latency_view, name='latency', area='right'
+            )
+        if self.latency_view is not None:
+            self.latency_view.parent().setVisible(checked)
+
+    def _on_subbox_preview_changed(self, value=None):
+        mode = self.subbox_mode_combobox.currentText()
+        self.subboxer.set_subbox_preview(
+            box_size=self.subbox_size_spinbox.value(), mode=mode
+        )
+        if self.subbox_preview is not None:
+            self.subbox_preview.label.setText(
+                'sub-box (xy | xz | yz)' if mode == 'sections'
+                else 'sub-box (projection along z)'
+            )
+
+    def _on_subbox_previewed(self, image):
+        if self.subbox_preview is not None:
+            self.subbox_preview.set_image(
+                image, contrast_limits=self.subboxer.plane_layer.contrast_limits
+            )
+
     def generate_label(self):
         return f'{self.subboxer.active_subparticle_id:03d}'
 
@@ -0,0 +1,255 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+
+import mrcfile
+import napari
+import numpy as np
+from napari.utils.interactions import mouse_move_callbacks, \
+    mouse_press_callbacks, mouse_release_callbacks
+from napari.utils.key_bindings import KeymapHandler
+
+from .latency_monitor import LatencyMonitor
+from .subboxer import Subboxer
+
+
+def write_synthetic_map(
+        map_file,
+        size: int = 512,
+        blob_spacing: float = 32,
+        blob_sigma: float = 3,
+        noise: float = 0.3,
+        slab_size: int = 64,
+        seed: int = 0,
+) -> np.ndarray:
+    """Write a cubic map of Gaussian blobs in noise, returning blob centers.
+
+    One blob is placed at random per `blob_spacing`³ voxels. The map is
+    written in slabs of `slab_size` sections so that large maps (e.g. 1024³)
+    are never held in memory. Centers are zyx ordered voxel coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    n_blobs = max(int((size / blob_spacing) ** 3), 1)
+    centers = rng.uniform(0, size - 1, size=(n_blobs, 3))
+    radius = int(np.ceil(4 * blob_sigma))
+    with mrcfile.new_mmap(
+            map_file, shape=(size, size, size), mrc_mode=2, overwrite=True
+    ) as mrc:
+        for start in range(0, size, slab_size):
+            stop = min(start + slab_size, size)
+            slab = rng.normal(scale=noise, size=(stop - start, size, size))
+            slab = slab.astype(np.float32)
+            nearby = np.abs(centers[:, 0] - (start + stop - 1) / 2) <= \
+                (stop - start) / 2 + radius
+            for center in centers[nearby]:
+                # blobs are added in a box of 4 sigma around their center
+                low = np.maximum(np.floor(center).astype(int) - radius, 0)
+                high = np.minimum(np.floor(center).astype(int) + radius + 1, size)
+                low[0], high[0] = max(low[0], start), min(high[0], stop)
+                if low[0] >= high[0]:
+                    continue
+                z, y, x = (
+                    np.arange(low[i], high[i]) - center[i] for i in range(3)
+                )
+                blob = np.exp(-z[:, None, None] ** 2 / (2 * blob_sigma ** 2)) * \
+                    np.exp(-y[None, :, None] ** 2 / (2 * blob_sigma ** 2)) * \
+                    np.exp(-x[None, None, :] ** 2 / (2 * blob_sigma ** 2))
+                slab[low[0] - start:high[0] - start, low[1]:high[1], low[2]:high[2]] \
+                    += blob.astype(np.float32)
+            mrc.data[start:stop] = slab
+    return centers
+
+
+def _mouse_event(event_type: str, position, view_direction, modifiers=()):
+    return SimpleNamespace(
+        type=event_type,
+        position=np.asarray(position, dtype=float),
+        view_direction=np.asarray(view_direction, dtype=float),
+        modifiers=list(modifiers),
+        dims_displayed=[0, 1, 2],
+        is_dragging=event_type == 'mouse_move',
+        handled=False,
+        pos=(0, 0),
+    )
+
+
+class SubboxerBenchmark:
+    """Replay scripted mouse and key events through the callbacks of a
+    Subboxer with an open map, timing each event.
+
+    Events are dispatched to the viewer as napari would dispatch them from
+    the canvas, so the callbacks registered in `Subboxer.connect_callbacks`
+    run unchanged. Scheduled updates are applied after every event, the
+    latency of an event is that of its handlers and the updates they cause.
+    Positions are in world (zyx) coordinates.
+    """
+    def __init__(self, subboxer: Subboxer, seed: int = 0):
+        self.subboxer = subboxer
+        self.viewer = subboxer.viewer
+        self.monitor = LatencyMonitor(max_samples=100000)
+        self.totals: Dict[str, float] = {}
+        self._keys = KeymapHandler()
+        self._keys.keymap_providers = [self.viewer]
+        self._rng = np.random.default_rng(seed)
+        # viewed obliquely, so drags project onto any plane normal
+        view_direction = np.array([1, 0.5, 0.25])
+        self.view_direction = view_direction / np.linalg.norm(view_direction)
+
+    def _dispatch(self, name: str, dispatch: Callable):
+        with self.monitor.measure(name):
+            dispatch()
+            self.subboxer.scheduler.flush()
+
+    @contextmanager
+    def _scenario(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.totals[name] = self.totals.get(name, 0) + time.perf_counter() - start
+
+    def press_key(self, name: str, key: str):
+        def press_and_release():
+            self._keys.press_key(key)
+            self._keys.release_key(key)
+        self._dispatch(name, press_and_release)
+
+    def drag(self, name: str, positions, modifiers=()):
+        """Press at the first position, move through the others and release
+        at the last, each a separate event."""
+        positions = np.atleast_2d(positions)
+        event = _mouse_event(
+            'mouse_press', positions[0], self.view_direction, modifiers
+        )
+        # points are added where the cursor ray meets the plane
+        self.viewer.cursor._view_direction = self.view_direction
+        self.viewer.cursor.position = tuple(positions[0])
+        self._dispatch(name, partial(mouse_press_callbacks, self.viewer, event))
+        for position in positions[1:]:
+            event.type, event.position = 'mouse_move', position
+            self._dispatch(name, partial(mouse_move_callbacks, self.viewer, event))
+        event.type = 'mouse_release'
+        self._dispatch(name, partial(mouse_release_callbacks, self.viewer, event))
+
+    def _random_plane_points(self, n: int) -> np.ndarray:
+        # points on the plane (through the map center), seen from the camera
+        plane = self.subboxer.plane_layer.experimental_slicing_plane
+        center = np.array(self.subboxer._map_shape) / 2
+        normal = np.array(plane.normal)
+        extent = 0.4 * np.array(self.subboxer._map_shape)
+        points = center + self._rng.uniform(-extent, extent, size=(n, 3))
+        points -= np.outer((points - center) @ normal, normal)
+        return points - 10 * self.view_direction
+
+    def add_subparticles(self, n: int = 50):
+        self.subboxer.activate_add_mode()
+        with self._scenario('add subparticle'):
+            for point in self._random_plane_points(n):
+                self.drag('add subparticle', point, modifiers=['Alt'])
+
+    def define_z_axes(self):
+        self.subboxer.activate_define_z_mode()
+        points = self._random_plane_points(self.subboxer.n_subparticles)
+        with self._scenario('define z axis'):
+            for point in points:
+                self.press_key('next subparticle', 'Right')
+                self.drag('define z axis', point, modifiers=['Alt'])
+
+    def rotate_in_plane(self, n_steps: int = 100):
+        self.subboxer.activate_rotate_in_plane_mode()
+        steps = np.linspace(0, 1, n_steps)[:, np.newaxis] * [0, 1, 0]
+        with self._scenario('rotate in plane'):
+            self.drag('rotate in plane', steps, modifiers=['Alt'])
+        self.subboxer.activate_add_mode()
+
+    def drag_plane(self, n_steps: int = 100):
+        start = self._random_plane_points(1)[0]
+        shape = np.array(self.subboxer._map_shape)
+        steps = start + np.linspace(0, 0.25, n_steps)[:, np.newaxis] * shape
+        with self._scenario('drag plane'):
+            self.drag('drag plane', steps)
+
+    def change_plane(self):
+        with self._scenario('change plane'):
+            for key in 'xyz':
+                self.press_key('plane normal', key)
+            for key in '[]':
+                self.press_key('plane thickness', key)
+
+    def run(self, n_subparticles: int = 50, n_drag_steps: int = 100):
+        self.add_subparticles(n_subparticles)
+        self.define_z_axes()
+        self.rotate_in_plane(n_drag_steps)
+        self.drag_plane(n_drag_steps)
+        self.change_plane()
+
+    def report(self) -> dict:
+        """Latency per event (ms) and total time (s) per scenario, and the
+        latency of the Subboxer's own handlers and updates."""
+        return {
+            'events': self.monitor.statistics(),
+            'totals': self.totals,
+            'handlers': self.subboxer.latency_monitor.statistics(),
+            'layer_memory': self.subboxer.layer_memory(),
+        }
+
+
+@contextmanager
+def _cache_directory(directory: Path):
+    previous = os.environ.get('NAPARI_SUBBOXER_CACHE')
+    os.environ['NAPARI_SUBBOXER_CACHE'] = str(directory)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['NAPARI_SUBBOXER_CACHE']
+        else:
+            os.environ['NAPARI_SUBBOXER_CACHE'] = previous
+
+
+def run_benchmark(
+        size: int = 512,
+        n_subparticles: int = 50,
+        n_drag_steps: int = 100,
+        map_file: Optional[Path] = None,
+        viewer: Optional[napari.Viewer] = None,
+        seed: int = 0,
+        **subboxer_options,
+) -> dict:
+    """Benchmark interactive paths of a Subboxer on a synthetic map.
+
+    A `size`³ map is written (unless a `map_file` is given) and opened in a
+    viewer which is not shown, derivatives and journals are written to a
+    temporary cache. `subboxer_options` are passed on to the Subboxer, e.g.
+    memory budgets. See `SubboxerBenchmark` for the replayed events.
+    """
+    with tempfile.TemporaryDirectory() as directory, \
+            _cache_directory(Path(directory) / 'cache'):
+        if map_file is None:
+            map_file = Path(directory) / f'synthetic_{size}.mrc'
+            write_synthetic_map(map_file, size=size, seed=seed)
+        close_viewer = viewer is None
+        if viewer is None:
+            viewer = napari.Viewer(show=False)
+        try:
+            subboxer = Subboxer(viewer, **subboxer_options)
+            start = time.perf_counter()
+            subboxer.open_map(str(map_file), blocking=True)
+            open_time = time.perf_counter() - start
+
+            benchmark = SubboxerBenchmark(subboxer, seed=seed)
+            benchmark.run(n_subparticles=n_subparticles, n_drag_steps=n_drag_steps)
+            report = benchmark.report()
+            report['map'] = {
+                'shape': list(subboxer._map_shape),
+                'open_seconds': open_time,
+                'n_subparticles': subboxer.n_subparticles,
+            }
+            subboxer.close_map()
+        finally:
+            if close_viewer:
+                viewer.close()
+    return report
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+# suffixes of data derived from maps, which can be pruned from the cache
+DERIVED_SUFFIXES = ('.npy', '.npz')
+
+
+def cache_directory() -> Path:
+    """Directory in which napari-subboxer caches data derived from maps.
+
+    Defaults to ~/.cache/napari-subboxer, override by setting the
+    NAPARI_SUBBOXER_CACHE environment variable.
+    """
+    directory = os.environ.get(
+        'NAPARI_SUBBOXER_CACHE', Path.home() / '.cache' / 'napari-subboxer'
+    )
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def map_cache_key(map_file, **parameters) -> str:
+    """Key identifying a map file (path, size and modification time) and a
+    set of parameters used to derive data from it."""
+    map_file = Path(map_file).resolve()
+    stat = map_file.stat()
+    key = f'{map_file}:{stat.st_size}:{stat.st_mtime_ns}'
+    for name, value in sorted(parameters.items()):
+        key += f':{name}={value}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def touch(path):
+    """Mark a cached file as recently used by its access time, see
+    `prune_cache`. The modification time is left unchanged."""
+    os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+
+
+def _cache_key(path: Path) -> str:
+    # files derived with the same key are named '<key>.npy', '<key>_*.np?'
+    return path.name.partition('_')[0].partition('.')[0]
+
+
+def prune_cache(
+        max_bytes: float,
+        keep: Iterable = (),
+        cache_dir: Optional[Path] = None,
+) -> int:
+    """Delete the least recently used data derived from maps until the cache
+    holds at most `max_bytes`, returning the number of bytes freed.
+
+    Files sharing a cache key (e.g. the levels of a pyramid and statistics
+    of a derivative) are deleted together, by the time they were last
+    written, read or `touch`ed. Files sharing a key with a path in `keep` are kept.
+    Session journals are never deleted.
+    """
+    if cache_dir is None:
+        cache_dir = cache_directory()
+    keep = {_cache_key(Path(path)) for path in keep}
+    groups = {}
+    for path in Path(cache_dir).iterdir():
+        # files being written are named '<name>.tmp.npy'
+        if path.suffix in DERIVED_SUFFIXES and '.tmp' not in path.suffixes:
+            groups.setdefault(_cache_key(path), []).append(path)
+    stats = {path: path.stat() for paths in groups.values() for path in paths}
+    n_bytes = sum(stat.st_size for stat in stats.values())
+    last_used = {
+        key: max(
+            max(stats[path].st_atime, stats[path].st_mtime) for path in paths
+        )
+        for key, paths in groups.items()
+    }
+    n_freed = 0
+    for key in sorted(groups, key=last_used.get):
+        if n_bytes - n_freed <= max_bytes:
+            break
+        if key in keep:
+            continue
+        for path in groups[key]:
+            try:
+                path.unlink()
+            except OSError:  # e.g. memory-mapped on Windows
+                continue
+            n_freed += stats[path].st_size
+    return n_freed
+
+
+def clear_cache(cache_dir: Optional[Path] = None) -> int:
+    """Delete all data derived from maps, keeping session journals."""
+    return prune_cache(0, cache_dir=cache_dir)
+
+
+def map_fingerprint(map_file, block_size: int = 2 ** 20) -> str:
+    """Hash identifying the contents of a map without reading all of it.
+
+    The file size and blocks at the start, middle and end are hashed.
+    """
+    size = os.path.getsize(map_file)
+    digest = hashlib.sha1(str(size).encode())
+    with open(map_file, 'rb') as file:
+        for offset in (0, max(0, size // 2 - block_size // 2),
+                       max(0, size - block_size)):
+            file.seek(offset)
+            digest.update(file.read(block_size))
+    return digest.hexdigest()
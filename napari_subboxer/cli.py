@@ -1,13 +1,26 @@
+import json
+import os
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import eulerangles
+import mrcfile
 import napari
 import numpy as np
 import starfile
 import typer
 
-from .pose_io import pose2star, star2pose, read_transformations
+from .pose_io import pose2star, star2pose, read_transformations, \
+    projections2star, read_particles, particles2pose
 from .eralda import Pose, Transform
+from .expansion import expand_particles
+from .projection import project_poses, read_tilt_angles, read_xf
+from .reconstruction import quick_look_average
+from . import sharding
+from .server import PoseServer
+from .recombination import RotationAveraging, recombine as recombine_poses
+from .benchmark import run_benchmark
+from .cache import cache_directory, prune_cache
 cli = typer.Typer()
 
 
@@ -37,7 +50,58 @@ def define(map_file: Path = typer.Argument(
 
 
 @cli.command()
-def apply(transformations: Path, poses: Path, output: Path):
+def overlay(
+        map_file: Path = typer.Argument(..., exists=True, readable=True),
+        particles: Path = typer.Argument(..., exists=True, readable=True),
+        transformations: Path = typer.Argument(..., exists=True, readable=True),
+        where: Optional[List[str]] = typer.Option(
+            None,
+            help='only transform particles matching an expression over star '
+                 'file columns, e.g. "rlnMicrographName == \'TS_01\'"'
+        ),
+        max_points: int = typer.Option(
+            20000, help='maximum number of subparticles drawn at once'
+        ),
+        all_micrographs: bool = typer.Option(
+            False, help='transform particles from every tomogram rather than '
+                        'those whose rlnMicrographName matches the map file'
+        ),
+):
+    """Check subparticle transformations by overlaying the subparticles they
+    produce from a set of particles on a tomogram.
+
+    Only particles on the tomogram, by rlnMicrographName, are transformed.
+    Only subparticles in the slab rendered by the plane and in view of the
+    camera are drawn.
+    """
+    viewer = napari.Viewer()
+    _, subboxing_widget = viewer.window.add_plugin_dock_widget(
+        plugin_name='napari-subboxer'
+    )
+    subboxer = subboxing_widget.subboxer
+    subboxer.open_map(str(map_file), blocking=True)
+    where = ' and '.join(f'({expression})' for expression in where or []) or None
+    subboxer.show_expanded_subparticles(
+        particles,
+        transformations,
+        where=where,
+        max_points=max_points,
+        all_micrographs=all_micrographs,
+    )
+    napari.run()
+
+
+@cli.command()
+def apply(
+        transformations: Path,
+        poses: Path,
+        output: Path,
+        where: Optional[List[str]] = typer.Option(
+            None,
+            help='only transform poses matching an expression over star file '
+                 'columns, e.g. "rlnClassNumber == 3", may be repeated'
+        ),
+):
     """Apply subparticle transformations on a set of poses from a consensus
     refinement.
 
@@ -45,18 +109,285 @@ def apply(transformations: Path, poses: Path, output: Path):
     the map used to define
     """
     shifts, rotations = read_transformations(transformations)
-    positions, orientations, sources = star2pose(poses)
-    n_transformations = len(shifts)
-    n_poses = len(positions)
-
-    poses = Pose(positions=positions, orientations=orientations)
-    transforms = Transform(shifts=shifts, rotations=rotations)
-    transformed_positions, transformed_orientations = transforms.apply(poses)
-    transformed_sources = np.broadcast_to(
-        sources[np.newaxis, :], shape=(n_transformations, n_poses)
-    ).reshape(-1)
-    transformed_poses = Pose(
-        positions=transformed_positions, orientations=transformed_orientations
-    )
-    pose2star(poses=transformed_poses, micrograph_names=transformed_sources,
-              star_file=output)
+    where = ' and '.join(f'({expression})' for expression in where or []) or None
+    subparticles = expand_particles(
+        particles=read_particles(poses),
+        transform=Transform(shifts=shifts, rotations=rotations),
+        where=where,
+    )
+    starfile.write(subparticles, output, overwrite=True)
+
+
+@cli.command()
+def project(
+        subparticles: Path,
+        output_directory: Path,
+        tilt_angles_directory: Path = typer.Option(
+            ..., help='directory containing {tomogram}.tlt files'
+        ),
+        tomogram_size: Tuple[int, int, int] = typer.Option(
+            ..., help='xyz dimensions of the tomograms in pixels'
+        ),
+        alignments_directory: Optional[Path] = typer.Option(
+            None, help='directory containing {tomogram}.xf files'
+        ),
+        per_tilt: bool = typer.Option(
+            False, help='write one file per tilt rather than per tomogram'
+        ),
+):
+    """Project subparticles into every image of their tilt-series.
+
+    Subparticles should be the output of `apply`, tilt angles and
+    alignments are found by the name of the tomogram each subparticle
+    came from.
+    """
+    positions, orientations, sources = star2pose(subparticles)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    for tomogram in np.unique(sources):
+        name = Path(tomogram).stem
+        mask = sources == tomogram
+        poses = Pose(positions=positions[mask], orientations=orientations[mask])
+        tilt_angles = read_tilt_angles(tilt_angles_directory / f'{name}.tlt')
+        xf = None
+        if alignments_directory is not None:
+            xf = read_xf(alignments_directory / f'{name}.xf')
+
+        projected_positions, projected_orientations = project_poses(
+            pose=poses,
+            tilt_angles=tilt_angles,
+            tomogram_size=tomogram_size,
+            xf=xf,
+        )
+        if not per_tilt:
+            projections2star(
+                positions=projected_positions,
+                orientations=projected_orientations,
+                tilt_angles=tilt_angles,
+                micrograph_name=tomogram,
+                star_file=output_directory / f'{name}.star',
+            )
+            continue
+        for idx in range(len(tilt_angles)):
+            projections2star(
+                positions=projected_positions[idx:idx + 1],
+                orientations=projected_orientations[idx:idx + 1],
+                tilt_angles=tilt_angles[idx:idx + 1],
+                tilt_indices=[idx],
+                micrograph_name=tomogram,
+                star_file=output_directory / f'{name}_{idx:03d}.star',
+            )
+
+
+@cli.command()
+def average(
+        subparticles: Path,
+        output: Path,
+        tomogram_directory: Path = typer.Option(
+            ..., help='directory containing the tomograms named in the star file'
+        ),
+        box_size: int = typer.Option(64, help='sidelength of the box in pixels'),
+        n_particles: int = typer.Option(
+            1000, help='number of randomly selected subparticles to average'
+        ),
+        n_workers: Optional[int] = typer.Option(None),
+        seed: Optional[int] = typer.Option(None),
+        view: bool = typer.Option(
+            False, help='open the average for defining subparticles'
+        ),
+):
+    """Reconstruct a quick-look average from a random subset of subparticles.
+
+    Useful for validating subparticle transformations before running a
+    full extraction and refinement.
+    """
+    positions, orientations, sources = star2pose(subparticles)
+    tomogram_files = np.array(
+        [str(tomogram_directory / Path(source).name) for source in sources]
+    )
+    subparticle_average = quick_look_average(
+        positions=positions,
+        orientations=orientations,
+        tomogram_files=tomogram_files,
+        box_size=box_size,
+        n_particles=n_particles,
+        n_workers=n_workers,
+        seed=seed,
+    )
+    mrcfile.write(output, subparticle_average, overwrite=True)
+    if view:
+        define(output)
+
+
+@cli.command()
+def shard(
+        poses: Path,
+        output_directory: Path,
+        n_shards: int = typer.Option(..., min=1),
+        strategy: sharding.ShardingStrategy = typer.Option(
+            sharding.ShardingStrategy.HASH,
+            help='hash micrograph names or balance shards by particle count'
+        ),
+):
+    """Partition a set of poses by micrograph into shards which can be
+    transformed independently with `apply`.
+    """
+    shard_files = sharding.shard(
+        star_file=poses,
+        output_directory=output_directory,
+        n_shards=n_shards,
+        strategy=strategy
+    )
+    for shard_file in shard_files:
+        typer.echo(shard_file)
+
+
+@cli.command()
+def merge(
+        star_files: List[Path],
+        output: Path = typer.Option(...),
+        optics: Optional[Path] = typer.Option(
+            None, help='star file from which to take the optics table'
+        ),
+):
+    """Merge star files, e.g. the outputs of `apply` on a set of shards."""
+    sharding.merge(star_files=star_files, output=output, optics_file=optics)
+
+
+@cli.command()
+def serve(
+        poses: Path,
+        host: str = typer.Option('127.0.0.1'),
+        port: int = typer.Option(8000),
+):
+    """Hold a set of poses in memory and apply transformations on request.
+
+    POST a transformations star file to /apply for the transformed poses or
+    to /summary for summary statistics, e.g.
+
+    curl --data-binary @transformations.star localhost:8000/apply
+    """
+    server = PoseServer.from_star(poses, host=host, port=port)
+    typer.echo(f'serving {server.poses.count} poses on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@cli.command()
+def recombine(
+        transformations: Path,
+        subparticles: Path,
+        output: Path,
+        method: RotationAveraging = typer.Option(
+            RotationAveraging.QUATERNION,
+            help='method used to average parent orientations'
+        ),
+):
+    """Fold refined subparticle poses back onto their parent particles.
+
+    Subparticles must carry the subboxerParentIndex and
+    subboxerTransformIndex columns written by `apply`.
+    """
+    shifts, rotations = read_transformations(transformations)
+    particles = read_particles(subparticles)
+    provenance_columns = ['subboxerParentIndex', 'subboxerTransformIndex']
+    if not set(provenance_columns).issubset(particles.columns):
+        raise typer.BadParameter(
+            f'{subparticles} is missing {provenance_columns}, was it '
+            f'produced by apply?'
+        )
+    positions, orientations, sources = particles2pose(particles)
+    parent_indices = particles['subboxerParentIndex'].to_numpy()
+
+    parents, parent_positions, parent_orientations, counts = recombine_poses(
+        pose=Pose(positions=positions, orientations=orientations),
+        transform=Transform(shifts=shifts, rotations=rotations),
+        parent_indices=parent_indices,
+        transform_indices=particles['subboxerTransformIndex'].to_numpy(),
+        method=method,
+    )
+    # every subparticle of a parent comes from the same micrograph
+    _, first_children = np.unique(parent_indices, return_index=True)
+    parent_poses = Pose(
+        positions=parent_positions, orientations=parent_orientations
+    )
+    pose2star(poses=parent_poses, micrograph_names=sources[first_children],
+              star_file=output, parent_indices=parents)
+
+
+@cli.command()
+def benchmark(
+        size: List[int] = typer.Option(
+            [512], help='side length of synthetic maps, repeat for several'
+        ),
+        n_subparticles: int = typer.Option(50),
+        n_drag_steps: int = typer.Option(
+            100, help='mouse moves per in-plane rotation and plane drag'
+        ),
+        plane_memory_budget: float = typer.Option(
+            2e9, help='bytes of float32 data used to render the plane'
+        ),
+        output: Optional[Path] = typer.Option(
+            None, help='JSON file the reports are written to'
+        ),
+        max_latency: Optional[float] = typer.Option(
+            None, help='fail if the 95th percentile latency (ms) of any '
+                       'event exceeds this'
+        ),
+):
+    """Replay scripted interactions on synthetic maps in an offscreen viewer
+    and report the latency of each event.
+
+    Subparticles are added, their z axes defined, one is rotated in plane and
+    the plane is dragged, all through the callbacks used interactively.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    reports = {}
+    slow_events = []
+    for map_size in size:
+        report = run_benchmark(
+            size=map_size,
+            n_subparticles=n_subparticles,
+            n_drag_steps=n_drag_steps,
+            plane_memory_budget=plane_memory_budget,
+        )
+        reports[map_size] = report
+        typer.echo(
+            f'{map_size}^3 map, opened in {report["map"]["open_seconds"]:.2f} s'
+        )
+        for name, statistics in report['events'].items():
+            typer.echo(
+                f'  {name:<20} n={statistics["count"]:<5} '
+                f'p50={statistics["p50"]:7.1f} ms '
+                f'p95={statistics["p95"]:7.1f} ms '
+                f'max={statistics["max"]:7.1f} ms'
+            )
+            if max_latency is not None and statistics['p95'] > max_latency:
+                slow_events.append(f'{name} ({map_size}^3)')
+        typer.echo('  total: ' + ', '.join(
+            f'{name} {seconds:.2f} s' for name, seconds in report['totals'].items()
+        ))
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(reports, f, indent=2)
+    if len(slow_events) > 0:
+        typer.echo(f'slower than {max_latency} ms: {", ".join(slow_events)}')
+        raise typer.Exit(code=1)
+
+
+@cli.command()
+def clear_cache(
+        max_size: float = typer.Option(
+            0, help='GB of cached data to keep, the most recently used'
+        ),
+):
+    """Delete normalised and filtered maps and pyramids from the cache.
+
+    Session journals are kept.
+    """
+    n_freed = prune_cache(max_size * 1e9)
+    typer.echo(f'freed {n_freed / 1e9:.2f} GB from {cache_directory()}')
@@ -1,60 +1,236 @@
-import numpy as np
-from napari.utils.events import EventedModel
-from pydantic import validator
+from typing import Dict, Optional
 
-from typing import Tuple, Optional
+import eulerangles
+import numpy as np
 
 
-class SubParticlePose(EventedModel):
-    """An object representing the pose of a subparticle.
+class SubParticleRegistry:
+    """Poses of a set of subparticles stored as a struct of arrays.
 
-    Vectors are xyz ordered.
+    Positions and x/y/z axis vectors are xyz ordered and stored in
+    contiguous (capacity, 3) arrays which grow by doubling, undefined vectors
+    are NaN. Subparticles are addressed by id, ids map to rows through a dict
+    so lookup, addition and removal (which moves the last row into the gap)
+    are O(1).
     """
-    x: float
-    y: float
-    z: float
-    x_vector: Optional[Tuple[float, float, float]] = None
-    y_vector: Optional[Tuple[float, float, float]] = None
-    z_vector: Optional[Tuple[float, float, float]] = None
-
-    @validator('x_vector', 'y_vector', 'z_vector', pre=True)
-    def normalise_vector(cls, value):
-        if value is None:
-            return value
-        return tuple(np.asarray(value) / np.linalg.norm(value))
+    def __init__(self, capacity: int = 64):
+        self._n = 0
+        self._next_id = 0
+        self._rows: Dict[int, int] = {}
+        self._ids = np.empty(capacity, dtype=int)
+        self._positions = np.empty((capacity, 3))
+        self._x_vectors = np.empty((capacity, 3))
+        self._y_vectors = np.empty((capacity, 3))
+        self._z_vectors = np.empty((capacity, 3))
+
+    @classmethod
+    def from_arrays(
+            cls,
+            ids: np.ndarray,
+            positions: np.ndarray,
+            x_vectors: np.ndarray,
+            y_vectors: np.ndarray,
+            z_vectors: np.ndarray,
+    ) -> 'SubParticleRegistry':
+        """Registry holding (n, ) ids and (n, 3) positions and vectors."""
+        n = len(ids)
+        registry = cls(capacity=max(64, n))
+        registry._ids[:n] = ids
+        for name, array in zip(
+                ('_positions', '_x_vectors', '_y_vectors', '_z_vectors'),
+                (positions, x_vectors, y_vectors, z_vectors)
+        ):
+            getattr(registry, name)[:n] = array
+        registry._rows = {int(id): row for row, id in enumerate(ids)}
+        registry._n = n
+        registry._next_id = int(np.max(ids)) + 1 if n > 0 else 0
+        return registry
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, id: int):
+        return id in self._rows
+
+    @property
+    def capacity(self) -> int:
+        return len(self._ids)
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
 
     @property
-    def position_napari(self):
-        return np.array([self.z, self.y, self.x])
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._n]
 
     @property
-    def x_vector_napari(self):
-        if self.x_vector is None:
-            return None
-        vector_napari = np.asarray(self.x_vector, dtype=float)[::-1]
-        return np.stack((self.position_napari, vector_napari), axis=0)
+    def positions(self) -> np.ndarray:
+        return self._positions[:self._n]
 
     @property
-    def y_vector_napari(self):
-        if self.y_vector is None:
-            return None
-        vector_napari = np.asarray(self.y_vector, dtype=float)[::-1]
-        return np.stack((self.position_napari, vector_napari), axis=0)
+    def x_vectors(self) -> np.ndarray:
+        return self._x_vectors[:self._n]
 
     @property
-    def z_vector_napari(self):
-        if self.z_vector is None:
-            return None
-        vector_napari = np.asarray(self.z_vector, dtype=float)[::-1]
-        return np.stack((self.position_napari, vector_napari), axis=0)
-
-    def _initialise_xy_vectors(self):
-        if self.z_vector is None:
-            self.x_vector = (1, 0, 0)
-            self.y_vector = (0, 1, 0)
-            self.z_vector = (0, 0, 1)
-            return
-        if self.x_vector is None and self.y_vector is None:
-            arbitrary_vector = np.array([1.23, 2.34, 3.45])
-            self.x_vector = np.cross(self.z_vector, arbitrary_vector)
-            self.y_vector = np.cross(self.z_vector, self.x_vector)
+    def y_vectors(self) -> np.ndarray:
+        return self._y_vectors[:self._n]
+
+    @property
+    def z_vectors(self) -> np.ndarray:
+        return self._z_vectors[:self._n]
+
+    def row(self, id: int) -> int:
+        return self._rows[id]
+
+    def position(self, id: int) -> np.ndarray:
+        return self._positions[self._rows[id]]
+
+    def vector(self, id: int, axis: str) -> np.ndarray:
+        return self._vectors(axis)[self._rows[id]]
+
+    def orientation(self, id: int, complete: bool = False) -> np.ndarray:
+        """(3, 3) rotation matrix with x, y and z vectors as columns.
+
+        If `complete`, undefined vectors are completed as in `orientations`.
+        """
+        row = self._rows[id]
+        vectors = (
+            self._x_vectors[row:row + 1],
+            self._y_vectors[row:row + 1],
+            self._z_vectors[row:row + 1],
+        )
+        if complete:
+            vectors = _complete_vectors(*vectors)
+        return np.column_stack([v[0] for v in vectors])
+
+    def _vectors(self, axis: str) -> np.ndarray:
+        return {
+            'x': self._x_vectors, 'y': self._y_vectors, 'z': self._z_vectors
+        }[axis]
+
+    def _grow(self):
+        capacity = 2 * self.capacity
+        self._ids = np.resize(self._ids, capacity)
+        for name in '_positions', '_x_vectors', '_y_vectors', '_z_vectors':
+            array = getattr(self, name)
+            grown = np.empty((capacity, 3))
+            grown[:self._n] = array[:self._n]
+            setattr(self, name, grown)
+
+    def add(self, position, id: Optional[int] = None) -> int:
+        """Add a subparticle at an xyz position, return its id."""
+        if id is None:
+            id = self._next_id
+        if id in self._rows:
+            raise ValueError(f'subparticle {id} already exists')
+        if self._n == self.capacity:
+            self._grow()
+        row = self._n
+        self._ids[row] = id
+        self._positions[row] = position
+        for vectors in self._x_vectors, self._y_vectors, self._z_vectors:
+            vectors[row] = np.nan
+        self._rows[id] = row
+        self._n += 1
+        self._next_id = max(self._next_id, id + 1)
+        return id
+
+    def remove(self, id: int):
+        """Remove a subparticle, the last row is moved into its place."""
+        row = self._rows.pop(id)
+        last = self._n - 1
+        if row != last:
+            for array in (self._ids, self._positions, self._x_vectors,
+                          self._y_vectors, self._z_vectors):
+                array[row] = array[last]
+            self._rows[int(self._ids[row])] = row
+        self._n -= 1
+
+    def set_position(self, id: int, position):
+        self._positions[self._rows[id]] = position
+
+    def set_vectors(self, id: int, x_vector=None, y_vector=None, z_vector=None):
+        """Set (normalised) axis vectors of a subparticle."""
+        row = self._rows[id]
+        for vector, vectors in zip(
+                (x_vector, y_vector, z_vector),
+                (self._x_vectors, self._y_vectors, self._z_vectors)
+        ):
+            if vector is not None:
+                vector = np.asarray(vector, dtype=float).reshape(3)
+                vectors[row] = vector / np.linalg.norm(vector)
+
+    def initialise_xy_vectors(self, id: int):
+        """Define x and y vectors of a subparticle if they are undefined.
+
+        Without a z vector the subparticle is aligned with the map axes,
+        otherwise x and y are chosen arbitrarily perpendicular to z.
+        """
+        row = self._rows[id]
+        x, y, z = _complete_vectors(
+            self._x_vectors[row:row + 1],
+            self._y_vectors[row:row + 1],
+            self._z_vectors[row:row + 1],
+        )
+        self._x_vectors[row], self._y_vectors[row], self._z_vectors[row] = \
+            x[0], y[0], z[0]
+
+    def orientations(self) -> np.ndarray:
+        """(n, 3, 3) rotation matrices with x, y and z vectors as columns.
+
+        Undefined vectors are completed as in `initialise_xy_vectors`
+        without modifying the registry.
+        """
+        x, y, z = _complete_vectors(self.x_vectors, self.y_vectors, self.z_vectors)
+        return np.stack((x, y, z), axis=-1)
+
+    def eulers(self) -> np.ndarray:
+        """(n, 3) ZYZ intrinsic Euler angles of all subparticles, in degrees."""
+        if self._n == 0:
+            return np.empty((0, 3))
+        return eulerangles.matrix2euler(
+            self.orientations().swapaxes(-1, -2),
+            axes='zyz',
+            intrinsic=True,
+            right_handed_rotation=True
+        ).reshape((-1, 3))
+
+    def defined(self, axis: str) -> np.ndarray:
+        """(n, ) boolean mask of subparticles with a defined `axis` vector."""
+        return ~np.any(np.isnan(self._vectors(axis)[:self._n]), axis=1)
+
+    def napari_vectors(self, axis: str) -> np.ndarray:
+        """(m, 2, 3) napari vectors data for subparticles with a defined
+        `axis` vector, positions and vectors are zyx ordered."""
+        vectors = self._vectors(axis)[:self._n]
+        defined = self.defined(axis)
+        return np.stack(
+            (self.positions[defined, ::-1], vectors[defined, ::-1]), axis=1
+        )
+
+    def napari_vector(self, id: int, axis: str) -> np.ndarray:
+        """(2, 3) napari vector data for the `axis` vector of a subparticle."""
+        row = self._rows[id]
+        return np.stack(
+            (self._positions[row, ::-1], self._vectors(axis)[row, ::-1])
+        )
+
+
+def _complete_vectors(x_vectors, y_vectors, z_vectors):
+    x_vectors, y_vectors, z_vectors = (
+        np.array(v, dtype=float) for v in (x_vectors, y_vectors, z_vectors)
+    )
+    z_undefined = np.any(np.isnan(z_vectors), axis=1)
+    x_vectors[z_undefined] = (1, 0, 0)
+    y_vectors[z_undefined] = (0, 1, 0)
+    z_vectors[z_undefined] = (0, 0, 1)
+
+    xy_undefined = np.any(np.isnan(x_vectors), axis=1) & \
+                   np.any(np.isnan(y_vectors), axis=1)
+    arbitrary_vector = np.array([1.23, 2.34, 3.45])
+    x = np.cross(z_vectors[xy_undefined], arbitrary_vector)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    x_vectors[xy_undefined] = x
+    y_vectors[xy_undefined] = np.cross(z_vectors[xy_undefined], x)
+    return x_vectors, y_vectors, z_vectors
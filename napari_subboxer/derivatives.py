@@ -0,0 +1,245 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from .cache import cache_directory, map_cache_key, touch
+from .filters import gaussian_kernel, separable_filter
+from .map_io import mmap_map
+from .progress import ProgressGenerator, exhaust, rescale_progress
+from .volume_statistics import RunningStatistics, iter_volume_statistics
+
+# derivatives of a map which can be cached and displayed
+DERIVATIVES = ('normalised', 'gaussian')
+
+
+def derivative_name(
+        derivative: str = 'normalised',
+        sigma: float = 2,
+        subsample: Optional[float] = None,
+) -> str:
+    """Name identifying a derivative and its parameters, e.g. 'gaussian(2.0)'.
+
+    Derivatives normalised with statistics from a subsample of the map (see
+    `iter_volume_statistics`) are named with the subsampled fraction.
+    """
+    if derivative not in DERIVATIVES:
+        raise ValueError(f'derivative must be one of {DERIVATIVES}, got {derivative}')
+    name = f'gaussian({float(sigma)})' if derivative == 'gaussian' else derivative
+    if subsample is not None:
+        name += f'[subsample={float(subsample)}]'
+    return name
+
+
+def derivative_path(map_file, name: str, cache_dir: Optional[Path] = None) -> Path:
+    """Path of a cached map derivative (see `derivative_name`)."""
+    if cache_dir is None:
+        cache_dir = cache_directory()
+    return Path(cache_dir) / f'{map_cache_key(map_file, derivative=name)}.npy'
+
+
+def _statistics_path(derivative_file: Path) -> Path:
+    return derivative_file.with_name(f'{derivative_file.stem}_statistics.npz')
+
+
+def _iter_write_slabs(
+        output_file: Path,
+        shape: Tuple[int, ...],
+        compute_slab: Callable[[int, int], np.ndarray],
+        slab_size: int = 64,
+        n_workers: Optional[int] = None,
+        statistics: bool = False,
+) -> ProgressGenerator[Tuple[np.ndarray, Optional[RunningStatistics]]]:
+    """Write a float32 volume to an .npy file, slabs are computed in parallel.
+
+    `compute_slab(start, stop)` returns the slab [start:stop] along the first
+    axis. The fraction of slabs written is yielded as slabs complete, pending
+    slabs are cancelled and the partial file removed if the generator is
+    closed before completion. If `statistics`, statistics of each slab are
+    computed with it and merged.
+    """
+    if n_workers is None:
+        n_workers = min(4, os.cpu_count() or 1)
+    temporary_file = output_file.with_suffix('.tmp.npy')
+    output = np.lib.format.open_memmap(
+        temporary_file, mode='w+', dtype=np.float32, shape=shape
+    )
+
+    def write_slab(start, stop):
+        slab = compute_slab(start, stop)
+        output[start:stop] = slab
+        if statistics:
+            slab_statistics = RunningStatistics()
+            slab_statistics.update(slab)
+            return slab_statistics
+
+    volume_statistics = RunningStatistics() if statistics else None
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    futures = []
+    try:
+        for start in range(0, shape[0], slab_size):
+            futures.append(executor.submit(
+                write_slab, start, min(start + slab_size, shape[0])
+            ))
+        for n_written, future in enumerate(as_completed(futures), start=1):
+            slab_statistics = future.result()
+            if statistics:
+                volume_statistics.merge(slab_statistics)
+            yield n_written / len(futures)
+        output.flush()
+        del output
+        os.replace(temporary_file, output_file)
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if temporary_file.exists():
+            temporary_file.unlink()
+    return np.load(output_file, mmap_mode='r'), volume_statistics
+
+
+def _iter_write_normalised(
+        volume: np.ndarray,
+        output_file: Path,
+        slab_size: int = 64,
+        subsample: Optional[float] = None,
+) -> ProgressGenerator[Tuple[np.ndarray, RunningStatistics]]:
+    statistics = yield from rescale_progress(
+        iter_volume_statistics(volume, subsample=subsample),
+        start=0,
+        stop=0.5
+    )
+    mean, std = statistics.mean, statistics.std
+
+    def normalise_slab(start, stop):
+        return (np.asarray(volume[start:stop], dtype=np.float32) - mean) / std
+
+    normalised, _ = yield from rescale_progress(
+        _iter_write_slabs(
+            output_file, volume.shape, normalise_slab, slab_size=slab_size
+        ),
+        start=0.5,
+        stop=1
+    )
+    # statistics of the normalised map follow from those of the map
+    return normalised, statistics.scaled(offset=mean, scale=std)
+
+
+def _iter_write_gaussian(
+        volume: np.ndarray, output_file: Path, sigma: float, slab_size: int = 16
+) -> ProgressGenerator[Tuple[np.ndarray, RunningStatistics]]:
+    kernel = gaussian_kernel(sigma)
+    halo = len(kernel) // 2
+
+    def filter_slab(start, stop):
+        # slabs are read with a halo, padded by edge values at the map borders
+        read_start = max(start - halo, 0)
+        read_stop = min(stop + halo, volume.shape[0])
+        slab = np.asarray(volume[read_start:read_stop], dtype=np.float32)
+        padding = (
+            (halo - (start - read_start), halo - (read_stop - stop)),
+            (halo, halo),
+            (halo, halo),
+        )
+        return separable_filter(np.pad(slab, padding, mode='edge'), kernel)
+
+    filtered = yield from _iter_write_slabs(
+        output_file,
+        volume.shape,
+        filter_slab,
+        slab_size=slab_size,
+        statistics=True
+    )
+    return filtered
+
+
+def _iter_cached(
+        output_file: Path,
+        write: Callable[[], ProgressGenerator[Tuple[np.ndarray, RunningStatistics]]],
+) -> ProgressGenerator[Tuple[np.ndarray, RunningStatistics]]:
+    # statistics are stored next to each derivative and computed once
+    statistics_file = _statistics_path(output_file)
+    if output_file.exists():
+        touch(output_file)
+        data = np.load(output_file, mmap_mode='r')
+        if statistics_file.exists():
+            return data, RunningStatistics.load(statistics_file)
+        statistics = yield from iter_volume_statistics(data)
+    else:
+        data, statistics = yield from write()
+    statistics.save(statistics_file)
+    return data, statistics
+
+
+def iter_cached_derivative(
+        map_file,
+        derivative: str = 'normalised',
+        sigma: float = 2,
+        subsample: Optional[float] = None,
+        cache_dir: Optional[Path] = None,
+) -> ProgressGenerator[Tuple[np.ndarray, RunningStatistics]]:
+    """Derivative of a map and its statistics, cached on disk.
+
+    'normalised' maps have zero mean and unit variance, 'gaussian' maps are
+    normalised maps filtered by a Gaussian of width `sigma` voxels. The mean
+    and standard deviation used for normalisation are computed from a
+    `subsample` of the map if given. Maps are stored as float32 .npy files
+    keyed on the map file (path, size and modification time) and the
+    derivative parameters, they are computed in parallel slabs on first use
+    and returned memory-mapped. Statistics (see `RunningStatistics`) are
+    computed in the same pass and stored alongside. Progress is yielded
+    while files are written.
+    """
+    name = derivative_name(derivative, sigma, subsample=subsample)
+    normalised_name = derivative_name('normalised', subsample=subsample)
+    normalised_file = derivative_path(map_file, normalised_name, cache_dir=cache_dir)
+    output_file = derivative_path(map_file, name, cache_dir=cache_dir)
+    # work is split between the derivatives which are not yet cached
+    n_missing = int(not normalised_file.exists())
+    if name != normalised_name:
+        n_missing += int(not output_file.exists())
+    n_missing = max(n_missing, 1)
+
+    normalised = yield from rescale_progress(
+        _iter_cached(
+            normalised_file,
+            lambda: _iter_write_normalised(
+                mmap_map(map_file), normalised_file, subsample=subsample
+            )
+        ),
+        start=0,
+        stop=1 / n_missing
+    )
+    if name == normalised_name:
+        return normalised
+
+    filtered = yield from rescale_progress(
+        _iter_cached(
+            output_file,
+            lambda: _iter_write_gaussian(normalised[0], output_file, sigma=sigma)
+        ),
+        start=1 - 1 / n_missing,
+        stop=1
+    )
+    return filtered
+
+
+def cached_derivative(
+        map_file,
+        derivative: str = 'normalised',
+        sigma: float = 2,
+        subsample: Optional[float] = None,
+        cache_dir: Optional[Path] = None,
+) -> Tuple[np.ndarray, RunningStatistics]:
+    """Derivative of a map cached on disk, see `iter_cached_derivative`."""
+    return exhaust(
+        iter_cached_derivative(
+            map_file,
+            derivative=derivative,
+            sigma=sigma,
+            subsample=subsample,
+            cache_dir=cache_dir
+        )
+    )
@@ -1,3 +1,5 @@
+from typing import Optional, Tuple
+
 import numpy as np
 import einops
 from pydantic import BaseModel
@@ -103,3 +105,95 @@ class Transform(BaseModel):
         final_positions = pose.positions + oriented_shifts
 
         return final_positions.squeeze(), final_rotations.squeeze()
+
+    def apply_inverse(
+            self, pose: Pose, transform_indices: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Undo transformations on a set of transformed poses
+
+        Parameters
+        ----------
+        pose: Pose
+            A set of n transformed poses
+        transform_indices: (n, ) np.ndarray
+            Index of the transform which produced each transformed pose
+
+        Returns
+        -------
+        poses: (positions, orientations)
+            (n, 3) positions and (n, 3, 3) orientations of the poses on which
+            the transforms were originally applied
+        """
+        transform_indices = np.asarray(transform_indices).reshape(-1)
+        rotations = self.rotations[transform_indices]
+        shifts = self.shifts[transform_indices]
+
+        # final rotations R' = R_pose @ R_transform
+        # -> R_pose = R' @ R_transform^T
+        orientations = pose.orientations @ rotations.swapaxes(-1, -2)
+
+        # final positions p' = p + R_pose @ shift
+        # -> p = p' - R_pose @ shift
+        positions = pose.positions - orientations @ shifts
+        return positions.reshape((-1, 3)), orientations
+
+    def expansion_indices(self, pose: Pose) -> Tuple[np.ndarray, np.ndarray]:
+        """Provenance of the transformed poses produced by `apply`
+
+        Parameters
+        ----------
+        pose: Pose
+            A set of poses on which transforms are applied
+
+        Returns
+        -------
+        provenance: (pose_indices, transform_indices)
+            (m, n) arrays of int32 containing the index of the pose and the
+            index of the transform which produced each transformed pose.
+            These are read-only broadcast views which take no extra memory.
+        """
+        pose_indices = np.broadcast_to(
+            np.arange(pose.count, dtype=np.int32)[np.newaxis, :],
+            shape=(self.count, pose.count)
+        )
+        transform_indices = np.broadcast_to(
+            np.arange(self.count, dtype=np.int32)[:, np.newaxis],
+            shape=(self.count, pose.count)
+        )
+        return pose_indices, transform_indices
+
+
+def children_index(
+        parent_indices: np.ndarray, n_parents: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Build a CSR style lookup from parents to their children
+
+    Parameters
+    ----------
+    parent_indices : (k, ) np.ndarray
+        Index of the parent of each child, e.g. pose indices from
+        `Transform.expansion_indices`
+    n_parents : optional int
+        Number of parents, defaults to the largest parent index + 1. Parent
+        indices outside [0, n_parents) raise a ValueError
+
+    Returns
+    -------
+    index: (indptr, children)
+        The children of parent p are children[indptr[p]:indptr[p + 1]]
+    """
+    parent_indices = np.asarray(parent_indices).reshape(-1)
+    if n_parents is None:
+        n_parents = int(parent_indices.max()) + 1 if parent_indices.size else 0
+    out_of_range = (parent_indices < 0) | (parent_indices >= n_parents)
+    if np.any(out_of_range):
+        bad_index = parent_indices[np.argmax(out_of_range)]
+        raise ValueError(
+            f'parent index {bad_index} is outside [0, {n_parents})'
+        )
+    children = np.argsort(parent_indices, kind='stable')
+    indptr = np.zeros(n_parents + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(parent_indices, minlength=n_parents), out=indptr[1:]
+    )
+    return indptr, children
@@ -0,0 +1,92 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .eralda import Pose, Transform
+from .pose_io import PARTICLE_INDEX_COLUMN, filter_particles, particles2pose, \
+    pose2df
+
+
+def expand_poses(
+        positions: np.ndarray, orientations: np.ndarray, transform: Transform
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Apply a set of subparticle transforms on a set of poses in memory.
+
+    float64 inputs, including memory-mapped arrays, are used without copying.
+
+    Parameters
+    ----------
+    positions : (n, 3) np.ndarray
+        xyz positions of the poses
+    orientations : (n, 3, 3) np.ndarray
+        Orientations as rotation matrices which premultiply column vectors
+    transform : Transform
+        m transforms to apply on every pose
+
+    Returns
+    -------
+    expanded: (positions, orientations, pose_indices, transform_indices)
+        (m * n, 3) positions, (m * n, 3, 3) orientations and (m * n, ) pose
+        and transform indices of the transformed poses, ordered by transform
+        then pose
+    """
+    pose = Pose(positions=positions, orientations=orientations)
+    transformed_positions, transformed_orientations = transform.apply(pose)
+    pose_indices, transform_indices = transform.expansion_indices(pose)
+    return (
+        transformed_positions.reshape((-1, 3)),
+        transformed_orientations.reshape((-1, 3, 3)),
+        pose_indices.reshape(-1),
+        transform_indices.reshape(-1),
+    )
+
+
+def expand_particles(
+        particles: pd.DataFrame,
+        transform: Transform,
+        where: Optional[str] = None
+) -> pd.DataFrame:
+    """Apply a set of subparticle transforms on a RELION particle table.
+
+    This is the in-memory equivalent of `napari-subboxer apply`.
+
+    Parameters
+    ----------
+    particles : pd.DataFrame
+        Particles from a RELION 3.1 star file
+    transform : Transform
+        m transforms to apply on every particle
+    where : optional str
+        Only transform particles matching this expression over the columns
+        of `particles`, see `pose_io.filter_particles`
+
+    Returns
+    -------
+    subparticles : pd.DataFrame
+        Transformed particles with subboxerParentIndex (index of the parent
+        in `particles`, or its row in the unsharded star file for particles
+        from `sharding.shard`) and subboxerTransformIndex columns
+    """
+    if where is not None:
+        particles = filter_particles(particles, where)
+    positions, orientations, sources = particles2pose(particles)
+    (
+        transformed_positions,
+        transformed_orientations,
+        pose_indices,
+        transform_indices
+    ) = expand_poses(positions, orientations, transform)
+    if PARTICLE_INDEX_COLUMN in particles.columns:
+        parent_indices = particles[PARTICLE_INDEX_COLUMN].to_numpy()
+    else:
+        parent_indices = particles.index.to_numpy()
+    transformed_poses = Pose(
+        positions=transformed_positions, orientations=transformed_orientations
+    )
+    return pose2df(
+        poses=transformed_poses,
+        micrograph_names=sources[pose_indices],
+        parent_indices=parent_indices[pose_indices],
+        transform_indices=transform_indices,
+    )
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    """Normalised 1D Gaussian kernel truncated at 3 sigma."""
+    half_width = int(np.ceil(3 * sigma))
+    x = np.arange(-half_width, half_width + 1)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def separable_filter(volume: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Filter a volume along each axis with a 1D kernel, without padding.
+
+    Each axis of the output is `len(kernel) - 1` shorter than the input.
+    """
+    filtered = np.asarray(volume, dtype=np.float32)
+    kernel = kernel.astype(np.float32)
+    for axis in range(filtered.ndim):
+        windows = np.lib.stride_tricks.sliding_window_view(
+            filtered, len(kernel), axis=axis
+        )
+        filtered = windows @ kernel
+    return filtered
@@ -0,0 +1,81 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Optional
+
+from qtpy.QtCore import QTimer
+
+from .latency_monitor import LatencyMonitor
+
+
+class InteractionScheduler:
+    """Coalesce interactive updates to at most one per frame.
+
+    Drag callbacks schedule an update under a key rather than applying it on
+    every mouse move event. Only the latest update for each key is kept and
+    pending updates are applied together once per frame, after Qt has
+    processed queued events (including redraws). The achieved rate of
+    applied updates is tracked per key, and the latency of each update with
+    a `monitor` if given.
+    """
+    def __init__(
+            self,
+            max_rate: float = 60,
+            rate_window: float = 1,
+            monitor: Optional[LatencyMonitor] = None,
+    ):
+        self.frame_interval = 1 / max_rate
+        self.rate_window = rate_window
+        self.monitor = monitor
+        self._pending: Dict[Hashable, Callable] = {}
+        self._last_flush = -float('inf')
+        self._update_times: Dict[Hashable, Deque[float]] = {}
+        self.n_scheduled: Dict[Hashable, int] = {}
+        self.n_applied: Dict[Hashable, int] = {}
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def schedule(self, key: Hashable, update: Callable):
+        """Schedule an update, replacing any pending update for `key`."""
+        self._pending[key] = update
+        self.n_scheduled[key] = self.n_scheduled.get(key, 0) + 1
+        if not self._timer.isActive():
+            elapsed = time.perf_counter() - self._last_flush
+            wait = max(0, self.frame_interval - elapsed)
+            self._timer.start(int(wait * 1000))
+
+    def flush(self):
+        """Apply all pending updates now."""
+        self._timer.stop()
+        pending, self._pending = self._pending, {}
+        now = time.perf_counter()
+        for key, update in pending.items():
+            if self.monitor is None:
+                update()
+            else:
+                with self.monitor.measure(str(key)):
+                    update()
+            self.n_applied[key] = self.n_applied.get(key, 0) + 1
+            update_times = self._update_times.setdefault(key, deque())
+            update_times.append(now)
+            # only times within the rate window are kept
+            _drop_times_before(update_times, now - self.rate_window)
+        self._last_flush = now
+
+    def update_rate(self, key: Optional[Hashable] = None) -> float:
+        """Updates applied per second over the last `rate_window` seconds,
+        for one key or summed over all keys."""
+        keys = self._update_times.keys() if key is None else [key]
+        start = time.perf_counter() - self.rate_window
+        n_updates = 0
+        for key in keys:
+            update_times = self._update_times.get(key, deque())
+            _drop_times_before(update_times, start)
+            n_updates += len(update_times)
+        return n_updates / self.rate_window
+
+
+def _drop_times_before(times: Deque[float], start: float):
+    while len(times) > 0 and times[0] < start:
+        times.popleft()
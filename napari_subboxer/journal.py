@@ -0,0 +1,177 @@
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from .cache import cache_directory, map_cache_key
+from .data_model import SubParticleRegistry
+
+
+def journal_path(map_file, cache_dir: Optional[Path] = None) -> Path:
+    """Path of the session journal for a map in the cache directory."""
+    if cache_dir is None:
+        cache_dir = cache_directory()
+    return Path(cache_dir) / f'{map_cache_key(map_file, derivative="journal")}.jsonl'
+
+
+def _vector_or_none(vector: np.ndarray):
+    return None if np.any(np.isnan(vector)) else vector.tolist()
+
+
+def subparticle_record(registry: SubParticleRegistry, id: int) -> dict:
+    """Journal record holding the full state of one subparticle."""
+    return {
+        'id': int(id),
+        'position': registry.position(id).tolist(),
+        'x_vector': _vector_or_none(registry.vector(id, 'x')),
+        'y_vector': _vector_or_none(registry.vector(id, 'y')),
+        'z_vector': _vector_or_none(registry.vector(id, 'z')),
+    }
+
+
+def registry_records(registry: SubParticleRegistry) -> Dict[int, dict]:
+    """Journal records of all subparticles, see `subparticle_record`."""
+    vectors = {}
+    for axis in 'xyz':
+        defined = registry.defined(axis)
+        values = getattr(registry, f'{axis}_vectors').tolist()
+        vectors[axis] = [v if d else None for v, d in zip(values, defined)]
+    return {
+        id: {
+            'id': id,
+            'position': position,
+            'x_vector': x_vector,
+            'y_vector': y_vector,
+            'z_vector': z_vector,
+        }
+        for id, position, x_vector, y_vector, z_vector in zip(
+            registry.ids.tolist(),
+            registry.positions.tolist(),
+            vectors['x'],
+            vectors['y'],
+            vectors['z'],
+        )
+    }
+
+
+def _apply_record(state: Dict[int, dict], record: dict):
+    if record.get('removed', False):
+        state.pop(record['id'], None)
+    else:
+        state[record['id']] = record
+
+
+def read_journal(path) -> Dict[int, dict]:
+    """Replay a journal into the latest record of each subparticle.
+
+    A truncated final line, as left by a crash mid-write, is ignored.
+    """
+    state: Dict[int, dict] = {}
+    if not Path(path).exists():
+        return state
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            _apply_record(state, record)
+    return state
+
+
+def registry_from_records(records: Dict[int, dict]) -> SubParticleRegistry:
+    registry = SubParticleRegistry(capacity=max(64, len(records)))
+    for id, record in records.items():
+        registry.add(position=record['position'], id=id)
+        registry.set_vectors(
+            id,
+            x_vector=record['x_vector'],
+            y_vector=record['y_vector'],
+            z_vector=record['z_vector'],
+        )
+    return registry
+
+
+class SessionJournal:
+    """Append-only journal of subparticle edits, written in the background.
+
+    Recording an edit only queues a record, a writer thread appends queued
+    records to a JSON lines file and flushes them to disk. The writer keeps
+    the latest record of each subparticle and compacts the file to one line
+    per subparticle every `compact_every` records.
+
+    If writing fails the writer stops, the exception is kept as `error` and
+    passed to `error_callback` (called from the writer thread) if given.
+    """
+    def __init__(
+            self,
+            path,
+            records: Optional[Dict[int, dict]] = None,
+            compact_every: int = 1000,
+            error_callback: Optional[Callable[[Exception], None]] = None,
+    ):
+        self.path = Path(path)
+        self.compact_every = compact_every
+        self.error_callback = error_callback
+        self.error: Optional[Exception] = None
+        self._state: Dict[int, dict] = dict(records or {})
+        self._queue: queue.Queue = queue.Queue()
+        self._file = None
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def record_subparticle(self, registry: SubParticleRegistry, id: int):
+        self._queue.put(subparticle_record(registry, id))
+
+    def record_removal(self, id: int):
+        self._queue.put({'id': int(id), 'removed': True})
+
+    def close(self):
+        """Write all queued records and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _compact(self):
+        if self._file is not None:
+            self._file.close()
+        temporary_file = self.path.with_suffix('.tmp')
+        with open(temporary_file, 'w') as file:
+            for record in self._state.values():
+                file.write(json.dumps(record) + '\n')
+        os.replace(temporary_file, self.path)
+        self._file = open(self.path, 'a')
+
+    def _write_loop(self):
+        try:
+            self._write_records()
+        except Exception as error:
+            self.error = error
+            if self.error_callback is not None:
+                self.error_callback(error)
+
+    def _write_records(self):
+        self._compact()
+        n_records = 0
+        stop = False
+        while not stop:
+            # block for one record then drain the queue, flush once per batch
+            records = [self._queue.get()]
+            while not self._queue.empty():
+                records.append(self._queue.get())
+            for record in records:
+                if record is None:
+                    stop = True
+                    break
+                self._file.write(json.dumps(record) + '\n')
+                _apply_record(self._state, record)
+                n_records += 1
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if n_records >= self.compact_every:
+                self._compact()
+                n_records = 0
+        self._file.close()
@@ -0,0 +1,122 @@
+import inspect
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Deque, Dict, Iterable, Optional
+
+import numpy as np
+
+
+class LatencyMonitor:
+    """Latency of interactive handlers and layer updates.
+
+    Durations are recorded per handler name, the latest `max_samples` of
+    each are kept for percentiles. The event rate of a handler is the number
+    of calls over the last `rate_window` seconds, only the times of those
+    calls are kept.
+
+    Drag callbacks (generators in napari) are timed per step: the press, each
+    mouse move and the release are separate events. Drags which exit on the
+    press (e.g. in another mode) are not recorded.
+    """
+    def __init__(self, max_samples: int = 1000, rate_window: float = 1):
+        self.max_samples = max_samples
+        self.rate_window = rate_window
+        self._durations: Dict[str, Deque[float]] = {}
+        self._times: Dict[str, Deque[float]] = {}
+        self.n_events: Dict[str, int] = {}
+
+    def record(self, name: str, duration: float):
+        """Record a `duration` of handler `name`, in seconds."""
+        if name not in self._durations:
+            self._durations[name] = deque(maxlen=self.max_samples)
+            self._times[name] = deque()
+            self.n_events[name] = 0
+        self._durations[name].append(duration)
+        now = time.perf_counter()
+        self._times[name].append(now)
+        self._drop_old_times(self._times[name], now)
+        self.n_events[name] += 1
+
+    def _drop_old_times(self, times: Deque[float], now: float):
+        start = now - self.rate_window
+        while len(times) > 0 and times[0] < start:
+            times.popleft()
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Wrap a callback, timing each call (or drag step) as `name`."""
+        @wraps(func)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return self._timed_steps(name, result, start)
+            self.record(name, time.perf_counter() - start)
+            return result
+        return inner
+
+    def _timed_steps(self, name: str, steps, start: float):
+        dragged = False
+        while True:
+            try:
+                next(steps)
+            except StopIteration:
+                if dragged:
+                    self.record(name, time.perf_counter() - start)
+                return
+            dragged = True
+            self.record(name, time.perf_counter() - start)
+            yield
+            start = time.perf_counter()
+
+    def rate(self, name: str) -> float:
+        """Events per second over the last `rate_window` seconds."""
+        times = self._times.get(name, deque())
+        self._drop_old_times(times, time.perf_counter())
+        return len(times) / self.rate_window
+
+    def statistics(self, percentiles: Iterable[float] = (50, 95, 99)) -> Dict[str, dict]:
+        """Event counts, rates and latency percentiles (ms) per handler."""
+        statistics = {}
+        for name, durations in self._durations.items():
+            milliseconds = 1000 * np.array(durations)
+            handler = {'count': self.n_events[name], 'rate': self.rate(name)}
+            for q, value in zip(percentiles, np.percentile(milliseconds, percentiles)):
+                handler[f'p{q:g}'] = float(value)
+            handler['max'] = float(milliseconds.max())
+            statistics[name] = handler
+        return statistics
+
+    def reset(self):
+        self._durations.clear()
+        self._times.clear()
+        self.n_events.clear()
+
+    def dump(self, output_file, layer_memory: Optional[Dict[str, int]] = None):
+        """Write handler statistics and memory held by layers to JSON."""
+        report = {'handlers': self.statistics()}
+        if layer_memory is not None:
+            report['layer_memory'] = layer_memory
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def monitored(name: str):
+    """Time a method with the `latency_monitor` of its instance."""
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def inner(self, *args, **kwargs):
+            with self.latency_monitor.measure(name):
+                return method(self, *args, **kwargs)
+        return inner
+    return decorator
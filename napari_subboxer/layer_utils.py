@@ -1,7 +1,95 @@
+import napari
+import numpy as np
+from napari.layers import Vectors
 from napari.layers.base import Layer
+from napari.layers.vectors._vector_utils import generate_vector_meshes
+from napari.utils.transforms import Affine
 
+# versions of napari whose Vectors layer internals `update_vectors_rows`
+# patches in place, other versions set the layer data
+PATCHABLE_VECTORS_VERSIONS = ('0.4.12', )
 
-def reset_contrast_limits(*layers: Layer):
-    for layer in layers:
-        layer.reset_contrast_limits_range()
-        layer.reset_contrast_limits()
+
+def set_contrast_limits(layer: Layer, contrast_limits, contrast_limits_range=None):
+    """Set contrast limits and their range without scanning the layer data.
+
+    The range defaults to the contrast limits.
+    """
+    if contrast_limits_range is None:
+        contrast_limits_range = contrast_limits
+    layer.contrast_limits_range = contrast_limits_range
+    layer.contrast_limits = contrast_limits
+
+
+def world_to_data(layer: Layer, position) -> np.ndarray:
+    return np.asarray(layer.world_to_data(position))
+
+
+def data_to_world(layer: Layer, position) -> np.ndarray:
+    """Inverse of `Layer.world_to_data`, composed from the public transform
+    properties as affine * (rotate * shear * scale + translate)."""
+    transform = Affine(
+        scale=layer.scale,
+        translate=layer.translate,
+        rotate=layer.rotate,
+        shear=layer.shear,
+    )
+    return np.asarray(layer.affine.compose(transform)(position))
+
+
+def set_binned_data(layer: Layer, data, binning: int = 1):
+    """Display binned data in the (unbinned) world coordinate system."""
+    layer.data = data
+    layer.scale = (binning, ) * layer.ndim
+    # center of binned voxel i is at (i + 0.5) * binning - 0.5 unbinned
+    layer.translate = ((binning - 1) / 2, ) * layer.ndim
+
+
+def update_vectors_rows(layer: Vectors, rows, vectors: np.ndarray):
+    """Overwrite rows of a Vectors layer, regenerating only their meshes.
+
+    Setting `layer.data` regenerates the mesh of every vector, here the
+    (m, 2, D) `vectors` replace the data and mesh vertices at `rows` in place.
+    The layer thumbnail, which is drawn from every vector, is not updated.
+
+    This relies on the private mesh layout of napari's Vectors layer, in
+    versions other than `PATCHABLE_VECTORS_VERSIONS` the data is set instead.
+    """
+    rows = np.atleast_1d(rows)
+    if napari.__version__ not in PATCHABLE_VECTORS_VERSIONS:
+        data = np.array(layer.data)
+        data[rows] = vectors
+        layer.data = data
+        return
+    layer._data[rows] = vectors
+    if layer._displayed_stored == layer._dims_displayed:
+        # meshes hold 4 vertices per vector, in 3D a second set of 4N
+        # vertices for an orthogonal ribbon follows the first
+        vertices, _ = generate_vector_meshes(
+            vectors[:, :, list(layer._dims_displayed)],
+            layer.edge_width,
+            layer.length,
+        )
+        vertex_indices = (4 * rows[:, np.newaxis] + np.arange(4)).reshape(-1)
+        n_sets = len(vertices) // (4 * len(rows))
+        for i in range(n_sets):
+            layer._mesh_vertices[4 * len(layer._data) * i + vertex_indices] = \
+                vertices[4 * len(rows) * i:4 * len(rows) * (i + 1)]
+    if layer.visible:
+        layer.set_view_slice()
+        layer.events.set_data()
+
+
+def layer_nbytes(layer: Layer) -> int:
+    """Bytes of array data held by a layer, including data for rendering
+    (e.g. vector meshes) and per-item properties and colours."""
+    if isinstance(layer.data, list):  # multiscale images
+        arrays = list(layer.data)
+    else:
+        arrays = [layer.data]
+    for name in '_mesh_vertices', '_mesh_triangles', '_face', '_edge':
+        value = getattr(layer, name, None)
+        arrays.append(getattr(value, 'colors', value))
+    properties = getattr(layer, 'properties', None) or {}
+    arrays.extend(properties.values())
+    return int(sum(getattr(array, 'nbytes', 0) for array in arrays))
@@ -0,0 +1,70 @@
+from typing import Optional, Tuple
+
+import dask.array as da
+import mrcfile
+import numpy as np
+
+from .progress import ProgressGenerator, exhaust
+from .volume_statistics import iter_volume_statistics
+
+
+def mmap_map(map_file) -> np.ndarray:
+    """Memory-map the data of an MRC file without reading it into memory."""
+    with mrcfile.mmap(map_file, mode='r', permissive=True) as mrc:
+        # the memmap remains valid (read-only) after the file is closed
+        return mrc.data
+
+
+def iter_chunked_mean_std(
+        volume: np.ndarray,
+        chunk_size: Optional[int] = None,
+        memory_budget: float = 64e6,
+) -> ProgressGenerator[Tuple[float, float]]:
+    """Mean and standard deviation of a volume from running statistics.
+
+    See `iter_volume_statistics`, slabs are as long as fit in
+    `memory_budget` bytes unless a `chunk_size` is given. The fraction of
+    slabs processed is yielded after each slab.
+    """
+    statistics = yield from iter_volume_statistics(
+        volume, chunk_size=chunk_size, memory_budget=memory_budget
+    )
+    return statistics.mean, statistics.std
+
+
+def chunked_mean_std(
+        volume: np.ndarray,
+        chunk_size: Optional[int] = None,
+        memory_budget: float = 64e6,
+) -> Tuple[float, float]:
+    """Mean and standard deviation of a volume, see `iter_chunked_mean_std`."""
+    return exhaust(iter_chunked_mean_std(
+        volume, chunk_size=chunk_size, memory_budget=memory_budget
+    ))
+
+
+def normalise_lazily(
+        volume: np.ndarray, mean: float, std: float, chunk_size: int = 64
+) -> da.Array:
+    """Chunked dask array of (volume - mean) / std, computed as float32."""
+    lazy_volume = da.from_array(volume, chunks=chunk_size).astype(np.float32)
+    return (lazy_volume - np.float32(mean)) / np.float32(std)
+
+
+def iter_open_normalised_map(
+        map_file, chunk_size: int = 64
+) -> ProgressGenerator[da.Array]:
+    """Lazily open a map normalised to zero mean and unit variance.
+
+    The map is memory-mapped and wrapped in a chunked dask array,
+    normalisation is applied per chunk (as float32) when data is accessed.
+    Progress of the pass computing the mean and standard deviation is yielded.
+    """
+    volume = mmap_map(map_file)
+    mean, std = yield from iter_chunked_mean_std(volume)
+    return normalise_lazily(volume, mean, std, chunk_size=chunk_size)
+
+
+def open_normalised_map(map_file, chunk_size: int = 64) -> da.Array:
+    """Lazily open a normalised map, see `iter_open_normalised_map`."""
+    return exhaust(iter_open_normalised_map(map_file, chunk_size=chunk_size))
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from functools import partial
 from typing import TYPE_CHECKING, Optional, Callable
 import numpy as np
 from .interactivity_utils import theta2rotz
@@ -24,33 +25,33 @@ def update_in_plane_rotation(
     viewer.layers.selection.active.interactive = False
 
     # get necessary info from active subparticle
-    active_subparticle = subboxer.active_subparticle
-    active_subparticle._initialise_xy_vectors()
-    subparticle_rotation_matrix = np.column_stack((
-        active_subparticle.x_vector,
-        active_subparticle.y_vector,
-        active_subparticle.z_vector
-    ))
-    original_x_vector = np.array(active_subparticle.x_vector).reshape((3, 1))
+    subparticles = subboxer.subparticles
+    active_id = subboxer.active_subparticle_id
+    subparticles.initialise_xy_vectors(active_id)
+    subparticle_rotation_matrix = subparticles.orientation(active_id)
+    z_vector = subparticle_rotation_matrix[:, 2]
+
+    def set_in_plane_rotation(theta):
+        # rotating about z in the subparticle frame, the x vector (the first
+        # column of the orientation) is mapped onto R @ Rz[:, 0]
+        rotz = theta2rotz(theta)
+        x_vector = subparticle_rotation_matrix @ rotz[:, 0]
+        subparticles.set_vectors(
+            active_id,
+            x_vector=x_vector,
+            y_vector=np.cross(z_vector, x_vector)
+        )
+        subboxer.update_subparticle_vectors(active_id)
 
-    mouse_dragged = False
     start_position = np.copy(event.position)
     yield
     while event.type == 'mouse_move':
         drag_vector = event.position - start_position
-        if np.all(drag_vector == 0):
-            magnitude = 0
-        else:
-            magnitude = np.linalg.norm(drag_vector)
-            mouse_dragged = True
-        # print(magnitude)
-        rotz = theta2rotz(magnitude * 25)
-        rotm = subparticle_rotation_matrix @ rotz @ np.linalg.pinv(subparticle_rotation_matrix)
-        active_subparticle.x_vector = rotm @ original_x_vector
-        active_subparticle.y_vector = np.cross(
-            active_subparticle.z_vector, active_subparticle.x_vector
+        magnitude = np.linalg.norm(drag_vector)
+        subboxer.scheduler.schedule(
+            'in plane rotation', partial(set_in_plane_rotation, magnitude * 25)
         )
-        subboxer.populate_subparticle_vectors_layers()
-        print(active_subparticle.y_vector)
         yield
+    subboxer.scheduler.flush()
+    subboxer.record_subparticle(active_id)
     viewer.layers.selection.active.interactive = True
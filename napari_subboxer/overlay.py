@@ -0,0 +1,220 @@
+from typing import Optional
+
+import napari
+import napari.layers
+import numpy as np
+
+from .eralda import children_index
+from .interaction_scheduler import InteractionScheduler
+from .layer_utils import data_to_world
+
+
+def _gather_ranges(indptr: np.ndarray, values: np.ndarray, bins: np.ndarray):
+    """Concatenate values[indptr[b]:indptr[b + 1]] for each bin b."""
+    starts = indptr[bins]
+    lengths = indptr[bins + 1] - starts
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return values[offsets + np.arange(total)]
+
+
+class GridIndex:
+    """Uniform grid spatial index over a set of points.
+
+    Points are bucketed into cubic cells of `cell_size` and stored in a CSR
+    style lookup from cells to point indices, so queries only visit points
+    in cells which may intersect the query region.
+    """
+    def __init__(self, points: np.ndarray, cell_size: float = 64):
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = cell_size
+        self.origin = self.points.min(axis=0) if len(self.points) else np.zeros(3)
+        cells = np.floor((self.points - self.origin) / cell_size).astype(int)
+        self.grid_shape = cells.max(axis=0) + 1 if len(cells) else np.ones(3, int)
+        cell_indices = np.ravel_multi_index(cells.T, self.grid_shape)
+        self.indptr, self.point_indices = children_index(
+            cell_indices, n_parents=int(np.prod(self.grid_shape))
+        )
+        # centers of all cells, in the same order as the lookup
+        grid = np.indices(self.grid_shape).reshape((3, -1)).T
+        self.cell_centers = self.origin + (grid + 0.5) * cell_size
+        self.cell_radius = np.sqrt(3) * cell_size / 2
+
+    def query(
+            self,
+            plane_position: Optional[np.ndarray] = None,
+            plane_normal: Optional[np.ndarray] = None,
+            half_thickness: float = np.inf,
+            view_center: Optional[np.ndarray] = None,
+            view_direction: Optional[np.ndarray] = None,
+            view_radius: float = np.inf,
+    ) -> np.ndarray:
+        """Indices of points in a slab and inside a cylinder along the view.
+
+        The slab is defined by a plane and its half thickness, the cylinder
+        by the center and direction of the view and the visible radius.
+        Either region is ignored if undefined.
+        """
+        use_slab = plane_position is not None and np.isfinite(half_thickness)
+        use_view = view_center is not None and np.isfinite(view_radius)
+
+        # coarse test on cells, cells are treated as their bounding spheres
+        cells = np.ones(len(self.cell_centers), dtype=bool)
+        if use_slab:
+            distance = np.abs((self.cell_centers - plane_position) @ plane_normal)
+            cells &= distance <= half_thickness + self.cell_radius
+        if use_view:
+            distance = self._distance_from_axis(
+                self.cell_centers, view_center, view_direction
+            )
+            cells &= distance <= view_radius + self.cell_radius
+        candidates = _gather_ranges(
+            self.indptr, self.point_indices, np.flatnonzero(cells)
+        )
+
+        # exact test on points in candidate cells
+        points = self.points[candidates]
+        keep = np.ones(len(candidates), dtype=bool)
+        if use_slab:
+            keep &= np.abs((points - plane_position) @ plane_normal) <= half_thickness
+        if use_view:
+            keep &= self._distance_from_axis(
+                points, view_center, view_direction
+            ) <= view_radius
+        return candidates[keep]
+
+    @staticmethod
+    def _distance_from_axis(points, center, direction):
+        offsets = points - center
+        along = offsets @ direction
+        return np.linalg.norm(offsets - along[:, np.newaxis] * direction, axis=1)
+
+
+class SubparticleOverlay:
+    """Subparticle positions and z axes drawn over a map, culled to what is
+    visible.
+
+    Points are indexed with a GridIndex, only those in the slab rendered by
+    the slicing plane (if visible) and in view of the camera are sent to the
+    Points and Vectors layers. At most `max_points` positions and
+    `max_vectors` axes are drawn, when zoomed out a fixed random subset is
+    shown so that points don't flicker as the view changes.
+    """
+    def __init__(
+            self,
+            viewer: napari.Viewer,
+            positions: np.ndarray,
+            orientations: np.ndarray,
+            plane_layer: Optional[napari.layers.Image] = None,
+            scheduler: Optional[InteractionScheduler] = None,
+            max_points: int = 20000,
+            max_vectors: int = 2000,
+            cell_size: float = 64,
+            axis_length: float = 10,
+            seed: int = 0,
+    ):
+        self.viewer = viewer
+        self.plane_layer = plane_layer
+        self.scheduler = scheduler
+        self.max_points = max_points
+        self.max_vectors = max_vectors
+
+        # napari world coordinates are zyx
+        self.positions = np.asarray(positions, dtype=float)[:, ::-1]
+        self.z_vectors = np.asarray(orientations)[:, ::-1, 2]
+        self.index = GridIndex(self.positions, cell_size=cell_size)
+        self.priority = np.random.default_rng(seed).permutation(len(positions))
+        self.visible_indices = np.empty(0, dtype=int)
+
+        self.points_layer = viewer.add_points(
+            data=np.empty((0, 3)),
+            ndim=3,
+            name='expanded subparticles',
+            face_color='cornflowerblue',
+            size=4,
+            n_dimensional=True,
+        )
+        self.vectors_layer = viewer.add_vectors(
+            data=np.zeros(6).reshape((1, 2, 3)),
+            ndim=3,
+            length=axis_length,
+            name='expanded subparticle z axes',
+            edge_color='blue',
+            edge_width=2,
+        )
+        self.connect()
+        self.update()
+
+    def connect(self):
+        camera = self.viewer.camera
+        for event in camera.events.center, camera.events.zoom, \
+                camera.events.angles:
+            event.connect(self.schedule_update)
+        if self.plane_layer is not None:
+            plane = self.plane_layer.experimental_slicing_plane
+            for event in plane.events.position, plane.events.normal, \
+                    plane.events.thickness:
+                event.connect(self.schedule_update)
+            self.plane_layer.events.visible.connect(self.schedule_update)
+
+    def disconnect(self):
+        camera = self.viewer.camera
+        for event in camera.events.center, camera.events.zoom, \
+                camera.events.angles:
+            event.disconnect(self.schedule_update)
+        if self.plane_layer is not None:
+            plane = self.plane_layer.experimental_slicing_plane
+            for event in plane.events.position, plane.events.normal, \
+                    plane.events.thickness:
+                event.disconnect(self.schedule_update)
+            self.plane_layer.events.visible.disconnect(self.schedule_update)
+
+    def close(self):
+        self.disconnect()
+        self.viewer.layers.remove(self.points_layer)
+        self.viewer.layers.remove(self.vectors_layer)
+
+    def schedule_update(self, event=None):
+        if self.scheduler is None:
+            self.update()
+        else:
+            self.scheduler.schedule('overlay', self.update)
+
+    def _query_parameters(self) -> dict:
+        camera = self.viewer.camera
+        parameters = {
+            'view_center': np.asarray(camera.center, dtype=float),
+            'view_direction': np.asarray(camera.view_direction, dtype=float),
+            'view_radius': np.max(self.viewer._canvas_size) / (2 * camera.zoom),
+        }
+        if self.plane_layer is not None and self.plane_layer.visible:
+            plane = self.plane_layer.experimental_slicing_plane
+            scale = self.plane_layer.scale[0]
+            parameters['plane_position'] = data_to_world(
+                self.plane_layer, plane.position
+            )
+            parameters['plane_normal'] = np.asarray(plane.normal, dtype=float)
+            parameters['half_thickness'] = plane.thickness * scale / 2
+        return parameters
+
+    def _decimate(self, indices: np.ndarray, n: int) -> np.ndarray:
+        # lowest priority values are kept, giving a stable subset
+        if len(indices) <= n:
+            return indices
+        keep = np.argpartition(self.priority[indices], n)[:n]
+        return np.sort(indices[keep])
+
+    def update(self):
+        visible = self.index.query(**self._query_parameters())
+        visible = self._decimate(visible, self.max_points)
+        self.visible_indices = visible
+        self.points_layer.data = self.positions[visible]
+
+        with_vectors = self._decimate(visible, self.max_vectors)
+        if len(with_vectors) > 0:
+            self.vectors_layer.data = np.stack(
+                (self.positions[with_vectors], self.z_vectors[with_vectors]),
+                axis=1
+            )
+        else:
+            self.vectors_layer.data = np.zeros(6).reshape((1, 2, 3))
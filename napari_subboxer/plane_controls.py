@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Optional
 
 import napari.layers
@@ -7,19 +8,27 @@ from napari.utils.geometry import clamp_point_to_bounding_box
 
 from napari_subboxer.interactivity_utils import point_in_bounding_box, \
     drag_data_to_projected_distance, point_in_layer_bounding_box
+from napari_subboxer.interaction_scheduler import InteractionScheduler
+from napari_subboxer.layer_utils import world_to_data
 
 
-def shift_plane_along_normal(viewer, event, layer: Optional[napari.layers.Image] = None):
+def shift_plane_along_normal(
+        viewer,
+        event,
+        layer: Optional[napari.layers.Image] = None,
+        scheduler: Optional[InteractionScheduler] = None,
+):
     """Shift a rendered plane along its normal vector.
     This function will shift a plane along its normal vector when the plane is
-    clicked and dragged."""
+    clicked and dragged. If a scheduler is provided, plane updates are
+    coalesced to at most one per frame."""
     # Early exit if alt clicking or layer not visible
     if 'Alt' in event.modifiers or layer.visible is False:
         return
 
     # Calculate intersection of click with plane through data in data coordinates
     intersection = layer.experimental_slicing_plane.intersect_with_line(
-        line_position=event.position,
+        line_position=world_to_data(layer, event.position),
         line_direction=event.view_direction
     )
 
@@ -32,36 +41,49 @@ def shift_plane_along_normal(viewer, event, layer: Optional[napari.layers.Image]
     original_plane_position = np.copy(layer.experimental_slicing_plane.position)
     layer.interactive = False
 
+    # The view, plane normal and bounding box are fixed during the drag
+    view_direction = np.asarray(event.view_direction)
+    plane_normal = np.array(layer.experimental_slicing_plane.normal)
+    bounding_box = layer._display_bounding_box(event.dims_displayed)
+
+    def set_plane_position(position):
+        layer.experimental_slicing_plane.position = position
+
     # Store mouse position at start of drag
-    start_position = np.copy(event.position)
+    start_position = world_to_data(layer, event.position)
     yield
 
     while event.type == 'mouse_move':
-        current_position = event.position
-        current_view_direction = event.view_direction
-        current_plane_normal = layer.experimental_slicing_plane.normal
+        current_position = world_to_data(layer, event.position)
 
         # Project mouse drag onto plane normal
         drag_distance = drag_data_to_projected_distance(
             start_position=start_position,
             end_position=current_position,
-            view_direction=current_view_direction,
-            vector=current_plane_normal,
+            view_direction=view_direction,
+            vector=plane_normal,
         )
 
         # Calculate updated plane position
         updated_position = original_plane_position + (
-                drag_distance * np.array(layer.experimental_slicing_plane.normal)
+                drag_distance * plane_normal
         )
 
         clamped_plane_position = clamp_point_to_bounding_box(
-            updated_position, layer._display_bounding_box(event.dims_displayed)
+            updated_position, bounding_box
         )
 
-        layer.experimental_slicing_plane.position = clamped_plane_position
+        if scheduler is None:
+            set_plane_position(clamped_plane_position)
+        else:
+            scheduler.schedule(
+                'plane position', partial(set_plane_position, clamped_plane_position)
+            )
         yield
 
-    # Re-enable volume_layer interactivity after the drag
+    # Apply the final position and re-enable interactivity after the drag
+    if scheduler is not None:
+        scheduler.flush()
     layer.interactive = True
 
 
@@ -78,7 +100,7 @@ def set_plane_normal_axis(
 
     new_plane_position = \
         layer.experimental_slicing_plane.intersect_with_line(
-            line_position=viewer.cursor.position,
+            line_position=world_to_data(layer, viewer.cursor.position),
             line_direction=viewer.camera.view_direction,
         )
     if not point_in_layer_bounding_box(new_plane_position, layer):
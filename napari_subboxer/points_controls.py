@@ -3,6 +3,7 @@ from typing import Callable, Optional
 import napari.layers
 
 from .interactivity_utils import point_in_bounding_box
+from .layer_utils import world_to_data, data_to_world
 
 
 def add_point(
@@ -11,6 +12,7 @@ def add_point(
         points_layer: napari.layers.Points = None,
         plane_layer: napari.layers.Image = None,
         append: bool = True,
+        refine: Optional[Callable] = None,
         callback: Optional[Callable] = None,
 ):
     # Early exit if not alt-clicked
@@ -26,7 +28,8 @@ def add_point(
 
     # Calculate intersection of click with plane through data in data coordinates
     intersection = plane_layer.experimental_slicing_plane.intersect_with_line(
-        line_position=viewer.cursor.position, line_direction=viewer.cursor._view_direction
+        line_position=world_to_data(plane_layer, viewer.cursor.position),
+        line_direction=viewer.cursor._view_direction
     )
 
     # Check if click was on plane by checking if intersection occurs within
@@ -34,6 +37,10 @@ def add_point(
     if not point_in_bounding_box(intersection, plane_layer.extent.data):
         return
 
+    # points are added in world coordinates
+    intersection = data_to_world(plane_layer, intersection)
+    if refine is not None:
+        intersection = refine(intersection)
     if append:
         points_layer.add(intersection)
     else:
@@ -1,31 +1,77 @@
+from pathlib import Path
+from typing import Optional, Sequence, TextIO
+
 import starfile
 import eulerangles
 import numpy as np
 import pandas as pd
 
+# row of a particle in the star file it was sharded from, see sharding.shard
+PARTICLE_INDEX_COLUMN = 'subboxerParticleIndex'
+
+
+def filter_particles(particles: pd.DataFrame, where: str) -> pd.DataFrame:
+    """Select particles matching an expression over star file columns.
+
+    The expression is evaluated as a vectorised boolean mask with
+    `pd.DataFrame.eval`, e.g.
+    'rlnClassNumber == 3 and rlnMaxValueProbDistribution > 0.2'
+    """
+    mask = np.asarray(particles.eval(where))
+    if mask.dtype != bool or mask.shape != (len(particles),):
+        raise ValueError(f'{where!r} does not evaluate to a boolean mask')
+    return particles[mask]
+
 
-def star2pose(star_file):
+def particles_on_map(particles: pd.DataFrame, map_file) -> pd.DataFrame:
+    """Select particles whose rlnMicrographName names a map.
+
+    Names are compared without directories and extensions, e.g. particles
+    from 'TS_01' or 'TS_01.tomostar' are on 'tomograms/TS_01.mrc'.
+    """
+    names = particles['rlnMicrographName'].astype(str)
+    stems = names.map(lambda name: Path(name).stem)
+    return particles[(stems == Path(map_file).stem).to_numpy()]
+
+
+def read_particles(star_file, where: Optional[str] = None) -> pd.DataFrame:
     star = starfile.read(star_file)
-    positions = star['particles'][[f'rlnCoordinate{ax}' for ax in 'XYZ']] \
-        .to_numpy()
-    shifts_angstroms = star['particles'][[f'rlnOrigin{ax}Angst' for ax in
-                                          'XYZ']].to_numpy()
-    pixel_sizes = star['particles']['rlnPixelSize'].to_numpy()
-    shifts = shifts_angstroms / pixel_sizes[:, np.newaxis]
-    positions -= shifts
-    eulers = star['particles'][[f'rlnAngle{e}' for e in ('Rot', 'Tilt',
-                                                         'Psi')]].to_numpy()
+    if isinstance(star, dict):
+        particles = star['particles']
+    else:  # files without an optics table
+        particles = star
+    if where is not None:
+        particles = filter_particles(particles, where)
+    return particles
+
+
+def particles2pose(particles: pd.DataFrame):
+    positions = particles[[f'rlnCoordinate{ax}' for ax in 'XYZ']] \
+        .to_numpy(dtype=float)
+    shift_columns = [f'rlnOrigin{ax}Angst' for ax in 'XYZ']
+    if set(shift_columns).issubset(particles.columns):
+        shifts_angstroms = particles[shift_columns].to_numpy()
+        pixel_sizes = particles['rlnPixelSize'].to_numpy()
+        shifts = shifts_angstroms / pixel_sizes[:, np.newaxis]
+        positions -= shifts
+    eulers = particles[[f'rlnAngle{e}' for e in ('Rot', 'Tilt',
+                                                 'Psi')]].to_numpy()
     orientations = eulerangles.euler2matrix(
         eulers,
         axes='zyz',
         intrinsic=True,
         right_handed_rotation=True
     ).swapaxes(-1, -2)
-    sources = star['particles']['rlnMicrographName'].to_numpy()
+    sources = particles['rlnMicrographName'].to_numpy()
     return positions, orientations, sources
 
 
-def pose2star(poses, micrograph_names, star_file):
+def star2pose(star_file, where: Optional[str] = None):
+    return particles2pose(read_particles(star_file, where=where))
+
+
+def pose2df(poses, micrograph_names, parent_indices=None,
+            transform_indices=None):
     eulers = eulerangles.matrix2euler(
         poses.orientations.swapaxes(-1, -2),
         axes='zyz',
@@ -41,9 +87,23 @@ def pose2star(poses, micrograph_names, star_file):
         'rlnAnglePsi': eulers[:, 2],
         'rlnMicrographName': np.asarray(micrograph_names),
     }
+    if parent_indices is not None:
+        star_data['subboxerParentIndex'] = np.asarray(parent_indices)
+    if transform_indices is not None:
+        star_data['subboxerTransformIndex'] = np.asarray(transform_indices)
     for k, v in star_data.items():
         star_data[k] = v.reshape(-1)
-    star_df = pd.DataFrame.from_dict(star_data)
+    return pd.DataFrame.from_dict(star_data)
+
+
+def pose2star(poses, micrograph_names, star_file, parent_indices=None,
+              transform_indices=None):
+    star_df = pose2df(
+        poses,
+        micrograph_names,
+        parent_indices=parent_indices,
+        transform_indices=transform_indices
+    )
     starfile.write(star_df, star_file, overwrite=True)
 
 
@@ -57,4 +117,56 @@ def read_transformations(subparticle_transformations):
         intrinsic=True,
         right_handed_rotation=True
     ).swapaxes(-1, -2)
-    return shifts, rotations
\ No newline at end of file
+    return shifts, rotations
+
+
+def projections2star(
+        positions, orientations, tilt_angles, micrograph_name, star_file,
+        tilt_indices=None
+):
+    """Write poses projected into the images of a tilt-series as a star file.
+
+    positions and orientations are (t, n, 2) and (t, n, 3, 3) arrays as
+    returned by `projection.project_poses`.
+    """
+    n_tilts, n_poses = positions.shape[:2]
+    eulers = eulerangles.matrix2euler(
+        orientations.reshape((-1, 3, 3)).swapaxes(-1, -2),
+        axes='zyz',
+        intrinsic=True,
+        right_handed_rotation=True,
+    )
+    if tilt_indices is None:
+        tilt_indices = np.arange(n_tilts)
+    tilt_indices = np.broadcast_to(
+        np.asarray(tilt_indices)[:, np.newaxis], shape=(n_tilts, n_poses)
+    )
+    tilt_angles = np.broadcast_to(
+        np.asarray(tilt_angles)[:, np.newaxis], shape=(n_tilts, n_poses)
+    )
+    star_data = {
+        'rlnCoordinateX': positions[..., 0],
+        'rlnCoordinateY': positions[..., 1],
+        'rlnAngleRot': eulers[:, 0],
+        'rlnAngleTilt': eulers[:, 1],
+        'rlnAnglePsi': eulers[:, 2],
+        'subboxerTiltIndex': tilt_indices,
+        'subboxerTiltAngle': tilt_angles,
+        'rlnMicrographName': np.full(n_tilts * n_poses, micrograph_name),
+    }
+    for k, v in star_data.items():
+        star_data[k] = np.asarray(v).reshape(-1)
+    star_df = pd.DataFrame.from_dict(star_data)
+    starfile.write(star_df, star_file, overwrite=True)
+
+
+def write_loop_header(file: TextIO, block_name: str, columns: Sequence[str]):
+    file.write(f'\ndata_{block_name}\n\nloop_\n')
+    for idx, column in enumerate(columns, start=1):
+        file.write(f'_{column} #{idx}\n')
+
+
+def write_loop_rows(file: TextIO, df: pd.DataFrame):
+    df.to_csv(
+        file, sep='\t', header=False, index=False, float_format='%.6f'
+    )
@@ -0,0 +1,47 @@
+from typing import Generator, Tuple, TypeVar
+
+ReturnType = TypeVar('ReturnType')
+
+# generators which yield the fraction of their work done (0 to 1) and
+# return their result, suitable for running in a napari thread_worker
+ProgressGenerator = Generator[float, None, ReturnType]
+
+
+def exhaust(generator: ProgressGenerator[ReturnType]) -> ReturnType:
+    """Run a progress generator to completion and return its result."""
+    while True:
+        try:
+            next(generator)
+        except StopIteration as stop:
+            return stop.value
+
+
+def rescale_progress(
+        generator: ProgressGenerator[ReturnType], start: float, stop: float
+) -> ProgressGenerator[ReturnType]:
+    """Map the progress of a generator onto the interval [start, stop]."""
+    try:
+        while True:
+            try:
+                fraction = next(generator)
+            except StopIteration as finished:
+                return finished.value
+            yield start + fraction * (stop - start)
+    finally:
+        # propagate cancellation to the wrapped generator
+        generator.close()
+
+
+def with_message(
+        generator: ProgressGenerator[ReturnType], message: str
+) -> Generator[Tuple[float, str], None, ReturnType]:
+    """Pair the progress of a generator with a message describing the work."""
+    try:
+        while True:
+            try:
+                fraction = next(generator)
+            except StopIteration as finished:
+                return finished.value
+            yield fraction, message
+    finally:
+        generator.close()
@@ -0,0 +1,115 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .eralda import Pose
+
+
+def read_tilt_angles(tlt_file) -> np.ndarray:
+    """Read tilt angles (degrees) from an IMOD style .tlt file."""
+    return np.loadtxt(tlt_file, dtype=float, ndmin=1)
+
+
+def read_xf(xf_file) -> Tuple[np.ndarray, np.ndarray]:
+    """Read tilt image alignments from an IMOD style .xf file.
+
+    Each line contains A11 A12 A21 A22 DX DY which map a raw tilt image
+    coordinate (relative to the image center) onto the aligned tilt image
+    (v -> v' | Av + d == v').
+
+    Returns
+    -------
+    matrices, shifts : (t, 2, 2) np.ndarray, (t, 2) np.ndarray
+    """
+    xf = np.loadtxt(xf_file, dtype=float, ndmin=2)
+    matrices = xf[:, :4].reshape((-1, 2, 2))
+    shifts = xf[:, 4:6]
+    return matrices, shifts
+
+
+def tilt_rotation_matrices(tilt_angles: np.ndarray) -> np.ndarray:
+    """
+    Ry = [[ c(t), 0, s(t)],
+          [    0, 1,    0],
+          [-s(t), 0, c(t)]]
+    """
+    theta = np.deg2rad(np.asarray(tilt_angles, dtype=float).reshape(-1))
+    rotation_matrices = np.zeros((theta.shape[0], 3, 3), dtype=float)
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
+    rotation_matrices[:, 1, 1] = 1
+    rotation_matrices[:, (0, 2), (0, 2)] = cos_theta[:, np.newaxis]
+    rotation_matrices[:, 0, 2] = sin_theta
+    rotation_matrices[:, 2, 0] = -sin_theta
+    return rotation_matrices
+
+
+def project_poses(
+        pose: Pose,
+        tilt_angles: np.ndarray,
+        tomogram_size: Tuple[int, int, int],
+        xf: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Project a set of 3D poses into every image of a tilt-series.
+
+    The tilt axis is taken to be parallel to the y-axis and positions are
+    xyz ordered pixel coordinates in the tomogram.
+
+    Parameters
+    ----------
+    pose : Pose
+        n poses in 3D, e.g. the (flattened) output of `Transform.apply`
+    tilt_angles : (t, ) np.ndarray
+        Tilt angles in degrees
+    tomogram_size : (3, ) tuple of int
+        xyz dimensions of the tomogram, the tilt images are assumed to have
+        the same xy dimensions
+    xf : optional tuple of (t, 2, 2) and (t, 2) np.ndarray
+        Tilt image alignments as returned by `read_xf`. If provided,
+        projections are expressed in raw (unaligned) tilt image coordinates.
+
+    Returns
+    -------
+    projected_poses: (projected_positions, projected_orientations)
+        (t, n, 2) xy positions in the tilt images and (t, n, 3, 3) rotation
+        matrices describing the orientation of each pose in each tilt image
+    """
+    tomogram_size = np.asarray(tomogram_size, dtype=float)
+    tilt_center = tomogram_size / 2
+    image_center = tomogram_size[:2] / 2
+
+    # tilt rotations               (t, 3, 3)
+    # broadcastable             (t, 1, 3, 3)
+    # centered positions           (n, 3, 1)
+    # projected positions       (t, n, 3, 1)
+    tilt_rotations = tilt_rotation_matrices(tilt_angles)
+    centered_positions = pose.positions - tilt_center.reshape((3, 1))
+    projected_positions = (
+            tilt_rotations[:, np.newaxis] @ centered_positions
+    )[..., :2, 0]
+    projection_rotations = tilt_rotations
+
+    if xf is not None:
+        # aligned -> raw: v == A^-1 (v' - d)
+        matrices, shifts = xf
+        inverse_matrices = np.linalg.inv(matrices)
+        projected_positions = np.einsum(
+            'tij, tnj -> tni',
+            inverse_matrices,
+            projected_positions - shifts[:, np.newaxis, :]
+        )
+        in_plane_rotations = np.zeros_like(tilt_rotations)
+        in_plane_rotations[:, :2, :2] = inverse_matrices / np.sqrt(
+            np.abs(np.linalg.det(inverse_matrices))
+        )[:, np.newaxis, np.newaxis]
+        in_plane_rotations[:, 2, 2] = 1
+        projection_rotations = in_plane_rotations @ tilt_rotations
+
+    # projection rotations         (t, 3, 3)
+    # broadcastable             (t, 1, 3, 3)
+    # pose orientations            (n, 3, 3)
+    # projected orientations    (t, n, 3, 3)
+    projected_orientations = (
+            projection_rotations[:, np.newaxis] @ pose.orientations
+    )
+    return projected_positions + image_center, projected_orientations
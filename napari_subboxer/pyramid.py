@@ -0,0 +1,135 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .cache import cache_directory, map_cache_key, touch
+from .progress import ProgressGenerator, exhaust, rescale_progress
+
+
+def block_mean_bin(volume: np.ndarray, factor: int = 2) -> np.ndarray:
+    """Bin a volume by averaging non-overlapping blocks of factor^3 voxels.
+
+    Trailing voxels which do not fill a complete block are discarded.
+    """
+    volume = np.asarray(volume, dtype=np.float32)
+    binned_shape = np.array(volume.shape) // factor
+    cropped = volume[tuple(slice(0, s * factor) for s in binned_shape)]
+    blocks = cropped.reshape(
+        (binned_shape[0], factor, binned_shape[1], factor, binned_shape[2], factor)
+    )
+    return blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def _write_binned_level(
+        volume: np.ndarray, output_file: Path, factor: int = 2, slab_size: int = 64
+) -> ProgressGenerator[np.ndarray]:
+    """Write a block-mean-binned volume to an .npy file slab by slab.
+
+    The fraction of slabs written is yielded after each slab, the partial
+    file is removed if the generator is closed before completion.
+    """
+    binned_shape = tuple(np.array(volume.shape) // factor)
+    temporary_file = output_file.with_suffix('.tmp.npy')
+    binned = np.lib.format.open_memmap(
+        temporary_file, mode='w+', dtype=np.float32, shape=binned_shape
+    )
+    try:
+        for start in range(0, binned_shape[0], slab_size):
+            stop = min(start + slab_size, binned_shape[0])
+            slab = volume[start * factor:stop * factor]
+            binned[start:stop] = block_mean_bin(slab, factor=factor)
+            yield stop / binned_shape[0]
+        binned.flush()
+        del binned
+        os.replace(temporary_file, output_file)
+    finally:
+        if temporary_file.exists():
+            temporary_file.unlink()
+    return np.load(output_file, mmap_mode='r')
+
+
+def pyramid_level_path(
+        map_file,
+        level: int,
+        source: str = 'normalised',
+        cache_dir: Optional[Path] = None,
+) -> Path:
+    """Path of a cached binned level of a map pyramid."""
+    if cache_dir is None:
+        cache_dir = cache_directory()
+    key = map_cache_key(map_file, derivative='pyramid', source=source)
+    return Path(cache_dir) / f'{key}_level{level}.npy'
+
+
+def iter_cached_pyramid(
+        map_file,
+        volume: np.ndarray,
+        min_size: int = 32,
+        cache_dir: Optional[Path] = None,
+        source: str = 'normalised',
+) -> ProgressGenerator[List[np.ndarray]]:
+    """Multiscale pyramid of a map, cached on disk.
+
+    Level 0 is `volume` itself, each subsequent level is binned by 2 from the
+    previous one until the smallest dimension would drop below `min_size`.
+    Binned levels are stored as .npy files in the cache directory, keyed on
+    the map file and `source` (the map derivative `volume` holds, see
+    derivatives.py), and returned memory-mapped. Later calls for an unchanged
+    map reuse the cached levels.
+
+    Progress is yielded while levels are written, level n having 8x fewer
+    voxels to write than level n - 1.
+    """
+    n_levels = 1
+    while np.min(np.array(volume.shape) // 2 ** n_levels) >= min_size:
+        n_levels += 1
+    # fraction of the total writing work done once each level is written
+    work = np.cumsum([8.0 ** -level for level in range(1, n_levels)])
+    work /= work[-1] if len(work) > 0 else 1
+
+    levels = [volume]
+    for level in range(1, n_levels):
+        level_file = pyramid_level_path(
+            map_file, level, source=source, cache_dir=cache_dir
+        )
+        if level_file.exists():
+            touch(level_file)
+            levels.append(np.load(level_file, mmap_mode='r'))
+        else:
+            start = work[level - 2] if level > 1 else 0
+            binned = yield from rescale_progress(
+                _write_binned_level(levels[-1], level_file),
+                start=start,
+                stop=work[level - 1]
+            )
+            levels.append(binned)
+    return levels
+
+
+def cached_pyramid(
+        map_file,
+        volume: np.ndarray,
+        min_size: int = 32,
+        cache_dir: Optional[Path] = None,
+        source: str = 'normalised',
+) -> List[np.ndarray]:
+    """Multiscale pyramid of a map cached on disk, see `iter_cached_pyramid`."""
+    return exhaust(
+        iter_cached_pyramid(
+            map_file, volume, min_size=min_size, cache_dir=cache_dir,
+            source=source
+        )
+    )
+
+
+def finest_level_within_budget(
+        levels: Sequence[np.ndarray], memory_budget: float
+) -> int:
+    """Index of the finest pyramid level using at most `memory_budget` bytes
+    as float32, the coarsest level is returned if none fit."""
+    for idx, level in enumerate(levels):
+        if np.prod(level.shape) * 4 <= memory_budget:
+            return idx
+    return len(levels) - 1
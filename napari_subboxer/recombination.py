@@ -0,0 +1,168 @@
+from enum import auto
+from typing import Tuple
+
+import numpy as np
+from napari.utils.misc import StringEnum
+
+from .eralda import Pose, Transform
+
+
+class RotationAveraging(StringEnum):
+    QUATERNION = auto()
+    CHORDAL = auto()
+
+
+def matrix2quaternion(rotations: np.ndarray) -> np.ndarray:
+    """(n, 3, 3) rotation matrices to (n, 4) unit quaternions (w, x, y, z).
+
+    Each quaternion is computed from the largest of its components to avoid
+    loss of precision, the sign of each quaternion is arbitrary.
+    """
+    r = np.asarray(rotations, dtype=float).reshape((-1, 3, 3))
+    trace = np.trace(r, axis1=-2, axis2=-1)
+    # squared magnitudes (x4) of w, x, y and z
+    magnitudes = np.stack([
+        1 + trace,
+        1 + r[:, 0, 0] - r[:, 1, 1] - r[:, 2, 2],
+        1 - r[:, 0, 0] + r[:, 1, 1] - r[:, 2, 2],
+        1 - r[:, 0, 0] - r[:, 1, 1] + r[:, 2, 2],
+    ], axis=-1)
+    largest = np.argmax(magnitudes, axis=-1)
+
+    # 4 * q_largest * q for each choice of largest component
+    products = np.empty((len(r), 4, 4))
+    products[:, :, 0] = np.stack([
+        magnitudes[:, 0],
+        r[:, 2, 1] - r[:, 1, 2],
+        r[:, 0, 2] - r[:, 2, 0],
+        r[:, 1, 0] - r[:, 0, 1],
+    ], axis=-1)
+    products[:, :, 1] = np.stack([
+        r[:, 2, 1] - r[:, 1, 2],
+        magnitudes[:, 1],
+        r[:, 0, 1] + r[:, 1, 0],
+        r[:, 0, 2] + r[:, 2, 0],
+    ], axis=-1)
+    products[:, :, 2] = np.stack([
+        r[:, 0, 2] - r[:, 2, 0],
+        r[:, 0, 1] + r[:, 1, 0],
+        magnitudes[:, 2],
+        r[:, 1, 2] + r[:, 2, 1],
+    ], axis=-1)
+    products[:, :, 3] = np.stack([
+        r[:, 1, 0] - r[:, 0, 1],
+        r[:, 0, 2] + r[:, 2, 0],
+        r[:, 1, 2] + r[:, 2, 1],
+        magnitudes[:, 3],
+    ], axis=-1)
+    quaternions = products[np.arange(len(r)), :, largest]
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def quaternion2matrix(quaternions: np.ndarray) -> np.ndarray:
+    """(n, 4) unit quaternions (w, x, y, z) to (n, 3, 3) rotation matrices."""
+    w, x, y, z = np.asarray(quaternions, dtype=float).reshape((-1, 4)).T
+    return np.stack([
+        1 - 2 * (y ** 2 + z ** 2), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x ** 2 + z ** 2), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x ** 2 + y ** 2),
+    ], axis=-1).reshape((-1, 3, 3))
+
+
+def _segments(group_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sort order, unique groups and segment starts for a segmented reduction."""
+    order = np.argsort(group_indices, kind='stable')
+    groups, starts = np.unique(group_indices[order], return_index=True)
+    return order, groups, starts
+
+
+def average_rotations(
+        rotations: np.ndarray,
+        group_indices: np.ndarray,
+        method: RotationAveraging = RotationAveraging.QUATERNION,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Average rotation matrices within groups.
+
+    QUATERNION finds the principal eigenvector of the summed quaternion outer
+    products of each group (insensitive to quaternion sign), CHORDAL projects
+    the summed rotation matrices of each group back onto SO(3).
+
+    Parameters
+    ----------
+    rotations : (n, 3, 3) np.ndarray
+    group_indices : (n, ) np.ndarray of int
+    method : RotationAveraging
+
+    Returns
+    -------
+    groups, average_rotations : (g, ) np.ndarray, (g, 3, 3) np.ndarray
+    """
+    rotations = np.asarray(rotations, dtype=float).reshape((-1, 3, 3))
+    order, groups, starts = _segments(np.asarray(group_indices).reshape(-1))
+    return groups, _reduce_rotations(rotations[order], starts, method)
+
+
+def _reduce_rotations(
+        sorted_rotations: np.ndarray,
+        starts: np.ndarray,
+        method: RotationAveraging
+) -> np.ndarray:
+    method = RotationAveraging(method)
+    if method == RotationAveraging.QUATERNION:
+        quaternions = matrix2quaternion(sorted_rotations)
+        outer_products = np.einsum('ni, nj -> nij', quaternions, quaternions)
+        summed = np.add.reduceat(outer_products, starts, axis=0)
+        _, eigenvectors = np.linalg.eigh(summed)
+        return quaternion2matrix(eigenvectors[..., -1])
+
+    summed = np.add.reduceat(sorted_rotations, starts, axis=0)
+    u, _, vt = np.linalg.svd(summed)
+    # ensure proper rotations (det == +1)
+    d = np.ones((len(starts), 3))
+    d[:, -1] = np.sign(np.linalg.det(u @ vt))
+    return (u * d[:, np.newaxis, :]) @ vt
+
+
+def recombine(
+        pose: Pose,
+        transform: Transform,
+        parent_indices: np.ndarray,
+        transform_indices: np.ndarray,
+        method: RotationAveraging = RotationAveraging.QUATERNION,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Fold (refined) subparticle poses back onto their parent particles.
+
+    Each subparticle transform is inverted to give an estimate of the parent
+    pose, estimates are then averaged per parent.
+
+    Parameters
+    ----------
+    pose : Pose
+        n subparticle poses
+    transform : Transform
+        Transforms which produced the subparticles
+    parent_indices : (n, ) np.ndarray of int
+        Parent of each subparticle
+    transform_indices : (n, ) np.ndarray of int
+        Transform which produced each subparticle
+    method : RotationAveraging
+        Method used for averaging rotations
+
+    Returns
+    -------
+    parents, positions, orientations, counts :
+        (p, ) parent indices, (p, 3) positions, (p, 3, 3) orientations and
+        (p, ) number of subparticles contributing to each parent
+    """
+    parent_indices = np.asarray(parent_indices).reshape(-1)
+    positions, orientations = transform.apply_inverse(pose, transform_indices)
+
+    order, parents, starts = _segments(parent_indices)
+    counts = np.diff(np.append(starts, len(order)))
+    summed_positions = np.add.reduceat(positions[order], starts, axis=0)
+    average_positions = summed_positions / counts[:, np.newaxis]
+
+    average_orientations = _reduce_rotations(
+        orientations[order], starts, method=method
+    )
+    return parents, average_positions, average_orientations, counts
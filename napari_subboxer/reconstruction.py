@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+
+import mrcfile
+import numpy as np
+
+from .resampling import box_grid, oriented_box_coordinates, sample_trilinear
+
+
+def _sum_subvolumes(
+        tomogram_file: Path,
+        positions: np.ndarray,
+        orientations: np.ndarray,
+        box_size: int,
+        batch_size: int = 16,
+) -> Tuple[np.ndarray, int]:
+    """Sum rotated boxes extracted from a single memory-mapped tomogram."""
+    grid = box_grid(box_size)
+    subvolume_sum = np.zeros((box_size, box_size, box_size), dtype=np.float32)
+    with mrcfile.mmap(tomogram_file, mode='r', permissive=True) as mrc:
+        tomogram = mrc.data
+        for start in range(0, len(positions), batch_size):
+            coordinates = oriented_box_coordinates(
+                positions[start:start + batch_size],
+                orientations[start:start + batch_size],
+                grid
+            )
+            subvolume_sum += sample_trilinear(tomogram, coordinates).sum(axis=0)
+    return subvolume_sum, len(positions)
+
+
+def quick_look_average(
+        positions: np.ndarray,
+        orientations: np.ndarray,
+        tomogram_files: np.ndarray,
+        box_size: int,
+        n_particles: Optional[int] = None,
+        n_workers: Optional[int] = None,
+        seed: Optional[int] = None,
+) -> np.ndarray:
+    """Average a random subset of subparticles in their own reference frame.
+
+    Boxes are resampled with trilinear interpolation directly from
+    memory-mapped tomograms, one tomogram per worker process.
+
+    Parameters
+    ----------
+    positions : (n, 3) np.ndarray
+        xyz subparticle positions in tomogram pixels
+    orientations : (n, 3, 3) np.ndarray
+        Subparticle orientations as rotation matrices which premultiply
+        column vectors
+    tomogram_files : (n, ) np.ndarray
+        Tomogram file for each subparticle
+    box_size : int
+        Sidelength of the cubic box
+    n_particles : optional int
+        Number of subparticles to average, all are averaged if None
+    n_workers : optional int
+        Number of worker processes
+    seed : optional int
+        Seed for the random selection of subparticles
+
+    Returns
+    -------
+    average : (b, b, b) np.ndarray
+        zyx ordered average normalised to zero mean and unit variance
+    """
+    tomogram_files = np.asarray(tomogram_files)
+    if n_particles is not None and n_particles < len(positions):
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(len(positions), n_particles, replace=False))
+        positions = positions[idx]
+        orientations = orientations[idx]
+        tomogram_files = tomogram_files[idx]
+
+    average = np.zeros((box_size, box_size, box_size), dtype=np.float32)
+    count = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _sum_subvolumes,
+                tomogram_file,
+                positions[tomogram_files == tomogram_file],
+                orientations[tomogram_files == tomogram_file],
+                box_size
+            )
+            for tomogram_file in np.unique(tomogram_files)
+        ]
+        for future in futures:
+            subvolume_sum, n = future.result()
+            average += subvolume_sum
+            count += n
+
+    average /= max(count, 1)
+    return (average - np.mean(average)) / (np.std(average) or 1)
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def sample_trilinear(volume: np.ndarray, coordinates: np.ndarray) -> np.ndarray:
+    """Sample a volume at arbitrary positions with trilinear interpolation.
+
+    Parameters
+    ----------
+    volume : (d, h, w) np.ndarray
+        Volume to sample, any array-like supporting fancy indexing (e.g. a
+        memory-mapped array) can be used.
+    coordinates : (..., 3) np.ndarray
+        zyx ordered positions in voxel coordinates. Samples outside of the
+        volume are set to zero.
+
+    Returns
+    -------
+    samples : (...) np.ndarray
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    output_shape = coordinates.shape[:-1]
+    coordinates = coordinates.reshape((-1, 3))
+    shape = np.array(volume.shape)
+
+    in_bounds = np.all(
+        (coordinates >= 0) & (coordinates <= shape - 1), axis=-1
+    )
+    coordinates = coordinates[in_bounds]
+
+    lower = np.floor(coordinates).astype(int)
+    lower = np.minimum(lower, shape - 2).clip(min=0)
+    weights_upper = (coordinates - lower).astype(np.float32)
+    weights_lower = 1 - weights_upper
+
+    # contiguous arrays are indexed by flat index, which is faster than
+    # indexing with three index arrays
+    if isinstance(volume, np.ndarray) and volume.flags.c_contiguous:
+        flat_volume = volume.reshape(-1)
+        flat_lower = np.ravel_multi_index(lower.T, volume.shape)
+        strides = (shape[1] * shape[2], shape[2], 1)
+
+        def corner_values(dz, dy, dx):
+            return flat_volume[
+                flat_lower + (dz * strides[0] + dy * strides[1] + dx)
+            ]
+    else:
+        def corner_values(dz, dy, dx):
+            return volume[
+                lower[:, 0] + dz, lower[:, 1] + dy, lower[:, 2] + dx
+            ]
+
+    samples_in_bounds = np.zeros(len(coordinates), dtype=np.float32)
+    for dz in (0, 1):
+        wz = weights_upper[:, 0] if dz else weights_lower[:, 0]
+        for dy in (0, 1):
+            wzy = wz * (weights_upper[:, 1] if dy else weights_lower[:, 1])
+            for dx in (0, 1):
+                wx = weights_upper[:, 2] if dx else weights_lower[:, 2]
+                samples_in_bounds += wzy * wx * corner_values(dz, dy, dx)
+
+    samples = np.zeros(len(in_bounds), dtype=np.float32)
+    samples[in_bounds] = samples_in_bounds
+    return samples.reshape(output_shape)
+
+
+def box_grid(box_size: int) -> np.ndarray:
+    """(b, b, b, 3) xyz ordered offsets from the center of a cubic box.
+
+    The grid is indexed [z, y, x] like the volumes it is used to sample.
+    """
+    offsets = np.arange(box_size) - box_size // 2
+    z, y, x = np.meshgrid(offsets, offsets, offsets, indexing='ij')
+    return np.stack((x, y, z), axis=-1).astype(float)
+
+
+def oriented_box_coordinates(
+        positions: np.ndarray, orientations: np.ndarray, grid: np.ndarray
+) -> np.ndarray:
+    """zyx coordinates of boxes aligned with a set of poses.
+
+    Parameters
+    ----------
+    positions : (n, 3) np.ndarray
+        xyz box centers
+    orientations : (n, 3, 3) np.ndarray
+        rotation matrices which premultiply xyz column vectors in the box
+        frame to place them in the frame of the volume
+    grid : (..., 3) np.ndarray
+        xyz offsets in the box frame as returned by `box_grid`
+
+    Returns
+    -------
+    coordinates : (n, ..., 3) np.ndarray
+        zyx ordered positions in the volume for use with `sample_trilinear`
+    """
+    positions = np.asarray(positions, dtype=float).reshape((-1, 3))
+    orientations = np.asarray(orientations, dtype=float).reshape((-1, 3, 3))
+    rotated = np.einsum('nij, ...j -> n...i', orientations, grid)
+    expand = (slice(None),) + (np.newaxis,) * (grid.ndim - 1)
+    return (rotated + positions[expand])[..., ::-1]
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .resampling import sample_trilinear
+
+
+def plane_basis(normal: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Orthonormal (row, column) vectors spanning the plane with `normal`.
+
+    Vectors are zyx ordered, for a plane normal to z rows run along y and
+    columns along x.
+    """
+    normal = np.asarray(normal, dtype=float)
+    normal = normal / np.linalg.norm(normal)
+    least_aligned_axis = np.eye(3)[np.argmin(np.abs(normal))]
+    if np.abs(normal[0]) == 1:
+        least_aligned_axis = np.array([0, 1, 0])
+    column_vector = np.cross(normal, least_aligned_axis)
+    column_vector /= np.linalg.norm(column_vector)
+    row_vector = np.cross(column_vector, normal)
+    return row_vector, column_vector
+
+
+class PlaneReslicer:
+    """Thickness-averaged 2D reslices of a volume on an arbitrary plane.
+
+    Slices are sampled on a cached (size, size) grid in the plane, centered
+    on the plane position, at integer steps along the normal. Sampled slices
+    are cached by depth so that when the plane shifts along its normal only
+    the slices entering the slab are sampled. The grid and slices are reset
+    when the plane normal changes or the plane moves within itself.
+
+    Positions, normals and thicknesses are in zyx voxel coordinates of
+    `volume`.
+    """
+    def __init__(self, volume: np.ndarray, size: int = 512, max_slices: int = 64):
+        self.volume = volume
+        self.size = size
+        self.max_slices = max_slices
+        self.n_sampled_slices = 0
+        self._origin = None
+        self._normal = None
+        self._grid = None
+        self._slices: Dict[int, np.ndarray] = OrderedDict()
+
+    def _reset(self, position: np.ndarray, normal: np.ndarray):
+        row_vector, column_vector = plane_basis(normal)
+        offsets = np.arange(self.size) - self.size // 2
+        self._grid = position + \
+            offsets[:, np.newaxis, np.newaxis] * row_vector + \
+            offsets[np.newaxis, :, np.newaxis] * column_vector
+        self._origin = position
+        self._normal = normal
+        self._slices.clear()
+
+    def _slice(self, depth: int) -> np.ndarray:
+        if depth in self._slices:
+            self._slices.move_to_end(depth)
+            return self._slices[depth]
+        sampled = sample_trilinear(self.volume, self._grid + depth * self._normal)
+        self.n_sampled_slices += 1
+        self._slices[depth] = sampled
+        if len(self._slices) > self.max_slices:
+            self._slices.popitem(last=False)
+        return sampled
+
+    def reslice(self, position, normal, thickness: float = 1) -> np.ndarray:
+        """(size, size) mean of the slices within a slab `thickness` thick."""
+        position = np.asarray(position, dtype=float)
+        normal = np.asarray(normal, dtype=float)
+        normal = normal / np.linalg.norm(normal)
+
+        same_normal = self._normal is not None and np.allclose(normal, self._normal)
+        if same_normal:
+            shift = position - self._origin
+            depth = shift @ normal
+            in_plane = np.linalg.norm(shift - depth * normal)
+        if not same_normal or in_plane > 1e-3:
+            self._reset(position, normal)
+            depth = 0
+
+        # the slab holds the same number of slices at any depth, centered on
+        # the plane to the nearest slice
+        n_slices = max(int(round(thickness)), 1)
+        start = int(np.floor(depth - (n_slices - 1) / 2 + 0.5))
+        depths = range(start, start + n_slices)
+        return np.mean([self._slice(d) for d in depths], axis=0)
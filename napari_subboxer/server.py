@@ -0,0 +1,136 @@
+import io
+import json
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.request import urlopen
+
+import numpy as np
+
+from .eralda import Pose, Transform
+from .expansion import expand_poses
+from .pose_io import star2pose, read_transformations, pose2df, \
+    write_loop_header, write_loop_rows
+
+
+class PoseServer(ThreadingHTTPServer):
+    """HTTP server holding a set of poses in memory.
+
+    Transformation star files POSTed to /apply are applied on the poses and
+    the expanded set of poses is returned as a star file, POSTing to
+    /summary returns summary statistics as JSON instead.
+
+        curl --data-binary @transformations.star localhost:8000/apply
+    """
+    daemon_threads = True
+
+    def __init__(self, poses: Pose, sources: np.ndarray, host: str = '127.0.0.1',
+                 port: int = 8000):
+        super().__init__((host, port), PoseRequestHandler)
+        self.poses = poses
+        self.sources = sources
+
+    @classmethod
+    def from_star(cls, star_file: Path, **kwargs):
+        positions, orientations, sources = star2pose(star_file)
+        poses = Pose(positions=positions, orientations=orientations)
+        return cls(poses=poses, sources=sources, **kwargs)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def apply(self, transforms: Transform):
+        positions, orientations, pose_indices, transform_indices = expand_poses(
+            self.poses.positions, self.poses.orientations, transforms
+        )
+        transformed_poses = Pose(positions=positions, orientations=orientations)
+        return transformed_poses, pose_indices, transform_indices
+
+    def summarise(self, transforms: Transform) -> dict:
+        transformed_poses, _, _ = self.apply(transforms)
+        positions = transformed_poses.positions.reshape((-1, 3))
+        return {
+            'n_poses': self.poses.count,
+            'n_transformations': transforms.count,
+            'n_subparticles': transformed_poses.count,
+            'n_micrographs': len(np.unique(self.sources)),
+            'positions_min': positions.min(axis=0).tolist(),
+            'positions_max': positions.max(axis=0).tolist(),
+            'positions_mean': positions.mean(axis=0).tolist(),
+        }
+
+
+class PoseRequestHandler(BaseHTTPRequestHandler):
+    server: PoseServer
+
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_error(404)
+            return
+        body = json.dumps({'n_poses': self.server.poses.count}).encode()
+        self._respond(body, content_type='application/json')
+
+    def do_POST(self):
+        if self.path not in ('/apply', '/summary'):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            transforms = _parse_transformations(self.rfile.read(length))
+        except Exception as e:
+            self.send_error(400, explain=str(e))
+            return
+
+        if self.path == '/summary':
+            body = json.dumps(self.server.summarise(transforms)).encode()
+            self._respond(body, content_type='application/json')
+            return
+
+        transformed_poses, pose_indices, transform_indices = \
+            self.server.apply(transforms)
+        star_df = pose2df(
+            poses=transformed_poses,
+            micrograph_names=self.server.sources[pose_indices],
+            parent_indices=pose_indices,
+            transform_indices=transform_indices,
+        )
+        star = io.StringIO()
+        write_loop_header(star, '', star_df.columns)
+        write_loop_rows(star, star_df)
+        self._respond(star.getvalue().encode(), content_type='text/plain')
+
+    def _respond(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _parse_transformations(data: bytes) -> Transform:
+    with tempfile.TemporaryDirectory() as directory:
+        star_file = Path(directory) / 'transformations.star'
+        star_file.write_bytes(data)
+        shifts, rotations = read_transformations(star_file)
+    return Transform(shifts=shifts, rotations=rotations)
+
+
+def submit(transformations: Path, url: str = 'http://127.0.0.1:8000',
+           summary: bool = False):
+    """Submit a transformations file to a running PoseServer.
+
+    Returns the expanded star file as a string or a dict of summary
+    statistics.
+    """
+    endpoint = '/summary' if summary else '/apply'
+    data = Path(transformations).read_bytes()
+    with urlopen(url + endpoint, data=data) as response:
+        body = response.read()
+    if summary:
+        return json.loads(body)
+    return body.decode()
@@ -0,0 +1,73 @@
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from .data_model import SubParticleRegistry
+
+
+class SubboxerSession(NamedTuple):
+    """State of a Subboxer session.
+
+    Positions and vectors are xyz ordered, the plane and camera are defined
+    in napari world coordinates (zyx, in voxels of the full resolution map).
+    """
+    map_file: str
+    map_fingerprint: str
+    subparticles: SubParticleRegistry
+    active_subparticle_id: int
+    mode: str
+    plane_position: Tuple[float, float, float]
+    plane_normal: Tuple[float, float, float]
+    plane_thickness: float
+    camera_center: Tuple[float, float, float]
+    camera_angles: Tuple[float, float, float]
+    camera_zoom: float
+
+
+def write_session(session: SubboxerSession, session_file):
+    """Write a session to a single (uncompressed) .npz file."""
+    subparticles = session.subparticles
+    with open(session_file, 'wb') as file:
+        np.savez(
+            file,
+            map_file=str(Path(session.map_file).resolve()),
+            map_fingerprint=session.map_fingerprint,
+            ids=subparticles.ids,
+            positions=subparticles.positions,
+            x_vectors=subparticles.x_vectors,
+            y_vectors=subparticles.y_vectors,
+            z_vectors=subparticles.z_vectors,
+            active_subparticle_id=session.active_subparticle_id,
+            mode=session.mode,
+            plane_position=session.plane_position,
+            plane_normal=session.plane_normal,
+            plane_thickness=session.plane_thickness,
+            camera_center=session.camera_center,
+            camera_angles=session.camera_angles,
+            camera_zoom=session.camera_zoom,
+        )
+
+
+def read_session(session_file) -> SubboxerSession:
+    with np.load(session_file, allow_pickle=False) as data:
+        subparticles = SubParticleRegistry.from_arrays(
+            ids=data['ids'],
+            positions=data['positions'],
+            x_vectors=data['x_vectors'],
+            y_vectors=data['y_vectors'],
+            z_vectors=data['z_vectors'],
+        )
+        return SubboxerSession(
+            map_file=str(data['map_file']),
+            map_fingerprint=str(data['map_fingerprint']),
+            subparticles=subparticles,
+            active_subparticle_id=int(data['active_subparticle_id']),
+            mode=str(data['mode']),
+            plane_position=tuple(data['plane_position']),
+            plane_normal=tuple(data['plane_normal']),
+            plane_thickness=float(data['plane_thickness']),
+            camera_center=tuple(data['camera_center']),
+            camera_angles=tuple(data['camera_angles']),
+            camera_zoom=float(data['camera_zoom']),
+        )
@@ -0,0 +1,137 @@
+import heapq
+import zlib
+from enum import auto
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import starfile
+from napari.utils.misc import StringEnum
+
+from .pose_io import PARTICLE_INDEX_COLUMN, write_loop_header, write_loop_rows
+
+
+class ShardingStrategy(StringEnum):
+    HASH = auto()
+    BALANCED = auto()
+
+
+def assign_shards(
+        micrograph_names: np.ndarray,
+        n_shards: int,
+        strategy: ShardingStrategy = ShardingStrategy.HASH
+) -> np.ndarray:
+    """Deterministically assign each particle to one of n shards.
+
+    All particles from the same micrograph (tomogram) end up in the same
+    shard.
+
+    HASH assigns each micrograph by a stable hash of its name, BALANCED
+    greedily assigns micrographs in order of decreasing particle count to the
+    shard with the fewest particles.
+
+    Returns
+    -------
+    shard_indices : (n, ) np.ndarray of int
+    """
+    strategy = ShardingStrategy(strategy)
+    names, inverse, counts = np.unique(
+        np.asarray(micrograph_names).astype(str),
+        return_inverse=True,
+        return_counts=True
+    )
+    if strategy == ShardingStrategy.HASH:
+        name_shards = np.array(
+            [zlib.crc32(name.encode()) % n_shards for name in names],
+            dtype=int
+        )
+    else:
+        name_shards = np.empty(len(names), dtype=int)
+        # (n_particles, shard index) heap of shard loads
+        loads = [(0, shard) for shard in range(n_shards)]
+        # stable sort keeps ties in name order
+        for idx in np.argsort(-counts, kind='stable'):
+            load, shard = heapq.heappop(loads)
+            name_shards[idx] = shard
+            heapq.heappush(loads, (load + counts[idx], shard))
+    return name_shards[inverse.reshape(-1)]
+
+
+def _read_star_blocks(star_file: Path):
+    star = starfile.read(star_file)
+    if not isinstance(star, dict):  # files without an optics table
+        return None, star
+    return star.get('optics'), star['particles']
+
+
+def shard(
+        star_file: Path,
+        output_directory: Path,
+        n_shards: int,
+        strategy: ShardingStrategy = ShardingStrategy.HASH
+) -> List[Path]:
+    """Partition a particle star file into n shards by micrograph name.
+
+    The optics table, if present, is written into every shard. The row of
+    each particle in `star_file` is kept in a subboxerParticleIndex column,
+    so subparticles from different shards keep distinct parent indices (see
+    `expansion.expand_particles`).
+    """
+    optics, particles = _read_star_blocks(star_file)
+    if PARTICLE_INDEX_COLUMN not in particles.columns:
+        particles[PARTICLE_INDEX_COLUMN] = np.arange(len(particles))
+    shard_indices = assign_shards(
+        particles['rlnMicrographName'].to_numpy(), n_shards, strategy
+    )
+    output_directory.mkdir(parents=True, exist_ok=True)
+    shard_files = []
+    for idx in range(n_shards):
+        shard_file = output_directory / f'{star_file.stem}_shard{idx:03d}.star'
+        shard_particles = particles[shard_indices == idx]
+        if optics is None:
+            starfile.write(shard_particles, shard_file, overwrite=True)
+        else:
+            starfile.write(
+                {'optics': optics, 'particles': shard_particles},
+                shard_file,
+                overwrite=True
+            )
+        shard_files.append(shard_file)
+    return shard_files
+
+
+def merge(
+        star_files: Sequence[Path],
+        output: Path,
+        optics_file: Optional[Path] = None
+):
+    """Concatenate the particles from a set of star files.
+
+    Files are streamed one at a time into the output. The optics table is
+    taken from the inputs (which must agree) or, if the inputs have none,
+    from `optics_file`.
+    """
+    optics = None
+    if optics_file is not None:
+        optics, _ = _read_star_blocks(optics_file)
+
+    columns = None
+    with open(output, 'w') as file:
+        file.write('# Created by napari-subboxer merge\n')
+        for star_file in star_files:
+            shard_optics, particles = _read_star_blocks(star_file)
+            if columns is None:
+                if optics is None:
+                    optics = shard_optics
+                if optics is not None:
+                    write_loop_header(file, 'optics', optics.columns)
+                    write_loop_rows(file, optics)
+                block_name = 'particles' if optics is not None else ''
+                columns = list(particles.columns)
+                write_loop_header(file, block_name, columns)
+            elif shard_optics is not None and optics_file is None \
+                    and not shard_optics.equals(optics):
+                raise ValueError(f'optics table in {star_file} differs')
+            if set(particles.columns) != set(columns):
+                raise ValueError(f'columns in {star_file} differ')
+            write_loop_rows(file, particles[columns])
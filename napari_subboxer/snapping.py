@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from itertools import product
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .filters import gaussian_kernel, separable_filter
+
+
+class DensitySnapper:
+    """Refine clicked positions onto nearby density.
+
+    The map is Gaussian filtered lazily in cubic blocks which are cached, so
+    snapping only filters the blocks around a position the first time they
+    are needed. Positions are moved to the filtered local maximum (or the
+    intensity-weighted centroid) within `radius` voxels.
+
+    Positions are zyx ordered voxel coordinates of `volume`.
+    """
+    def __init__(
+            self,
+            volume: np.ndarray,
+            sigma: float = 2,
+            radius: float = 6,
+            method: str = 'maximum',
+            invert: bool = False,
+            n_iterations: int = 3,
+            block_size: int = 32,
+            max_blocks: int = 256,
+    ):
+        if method not in ('maximum', 'centroid'):
+            raise ValueError(f"method must be 'maximum' or 'centroid', got {method}")
+        self.volume = volume
+        self.radius = radius
+        self.method = method
+        self.n_iterations = n_iterations
+        # density is dark in unprocessed tomograms
+        self.sign = -1 if invert else 1
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.kernel = gaussian_kernel(sigma)
+        self.halo = len(self.kernel) // 2
+        self._blocks: Dict[Tuple[int, int, int], np.ndarray] = OrderedDict()
+
+    def _filtered_block(self, block: Tuple[int, int, int]) -> np.ndarray:
+        if block in self._blocks:
+            self._blocks.move_to_end(block)
+            return self._blocks[block]
+        shape = np.array(self.volume.shape)
+        start = np.array(block) * self.block_size
+        stop = np.minimum(start + self.block_size, shape)
+        # read with a halo, padded by edge values at the map borders
+        read_start = np.maximum(start - self.halo, 0)
+        read_stop = np.minimum(stop + self.halo, shape)
+        region = np.asarray(
+            self.volume[tuple(slice(a, b) for a, b in zip(read_start, read_stop))],
+            dtype=np.float32
+        )
+        padding = [
+            (a - b, c - d) for a, b, c, d in zip(
+                read_start, start - self.halo, stop + self.halo, read_stop
+            )
+        ]
+        region = np.pad(region, padding, mode='edge')
+        filtered = separable_filter(region, self.kernel)
+
+        self._blocks[block] = filtered
+        if len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return filtered
+
+    def filtered_region(self, start, stop) -> np.ndarray:
+        """Gaussian filtered map between zyx voxel indices start and stop."""
+        start, stop = np.asarray(start), np.asarray(stop)
+        region = np.empty(stop - start, dtype=np.float32)
+        first_block = start // self.block_size
+        last_block = (stop - 1) // self.block_size
+        for block in product(*(
+                range(a, b + 1) for a, b in zip(first_block, last_block)
+        )):
+            block_start = np.array(block) * self.block_size
+            filtered = self._filtered_block(block)
+            overlap_start = np.maximum(start, block_start)
+            overlap_stop = np.minimum(stop, block_start + filtered.shape)
+            region[tuple(
+                slice(a, b) for a, b in zip(overlap_start - start, overlap_stop - start)
+            )] = filtered[tuple(
+                slice(a, b) for a, b in
+                zip(overlap_start - block_start, overlap_stop - block_start)
+            )]
+        return region
+
+    def _region_values(self, position: np.ndarray, radius: float):
+        # voxel indices and filtered values within a sphere around position
+        shape = np.array(self.volume.shape)
+        center = np.round(position).astype(int)
+        r = int(np.ceil(radius))
+        start = np.clip(center - r, 0, shape - 1)
+        stop = np.clip(center + r + 1, 1, shape)
+        region = self.sign * self.filtered_region(start, stop)
+        grid = np.indices(region.shape).reshape((3, -1)).T + start
+        in_sphere = np.linalg.norm(grid - position, axis=1) <= radius
+        return grid[in_sphere], region.reshape(-1)[in_sphere]
+
+    def snap(self, position) -> np.ndarray:
+        """Refined zyx position of density near `position`."""
+        position = np.asarray(position, dtype=float)
+        center = np.round(position)
+        if np.any(center < 0) or np.any(center >= self.volume.shape):
+            return position
+        grid, values = self._region_values(position, self.radius)
+        if len(values) == 0:
+            return position
+
+        if self.method == 'maximum':
+            # centroid of the maximum and its neighbours, for subvoxel precision
+            maximum = grid[np.argmax(values)]
+            neighbourhood = np.all(np.abs(grid - maximum) <= 1, axis=1)
+            weights = values[neighbourhood] - values[neighbourhood].min()
+            if weights.sum() <= 0:
+                return maximum.astype(float)
+            return weights @ grid[neighbourhood] / weights.sum()
+
+        # mean shift, the sphere is recentred on the centroid a few times so
+        # density cut by the initial sphere still pulls the centroid over
+        snapped = position
+        for _ in range(self.n_iterations):
+            weights = np.clip(values - np.median(values), 0, None)
+            if weights.sum() <= 0:
+                break
+            snapped = weights @ grid / weights.sum()
+            grid, values = self._region_values(snapped, self.radius)
+        return snapped
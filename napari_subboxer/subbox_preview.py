@@ -0,0 +1,59 @@
+import numpy as np
+
+from .resampling import box_grid, oriented_box_coordinates, sample_trilinear
+
+
+class SubboxPreviewer:
+    """Sub-box around a subparticle resampled into its own x/y/z frame.
+
+    Either the three central sections (xy, xz and yz side by side) or the
+    projection along z of the box is produced. Sampling grids in the box
+    frame are computed once per box size, each preview only rotates and
+    shifts them before sampling.
+
+    Positions are xyz ordered voxel coordinates of `volume`, orientations
+    have x, y and z vectors as columns.
+    """
+    def __init__(self, volume: np.ndarray, box_size: int = 48, mode: str = 'sections'):
+        self.volume = volume
+        self.mode = mode
+        self.box_size = box_size
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @mode.setter
+    def mode(self, value: str):
+        if value not in ('sections', 'projection'):
+            raise ValueError(f"mode must be 'sections' or 'projection', got {value}")
+        self._mode = value
+
+    @property
+    def box_size(self) -> int:
+        return self._box_size
+
+    @box_size.setter
+    def box_size(self, value: int):
+        self._box_size = int(value)
+        grid = box_grid(self._box_size)
+        center = self._box_size // 2
+        # grids are indexed [z, y, x], sections are taken through the center
+        self._section_grids = np.stack((
+            grid[center],
+            grid[:, center],
+            grid[:, :, center],
+        ))
+        self._box_grid = grid
+
+    def preview(self, position, orientation) -> np.ndarray:
+        """(b, 3b) central sections or (b, b) projection along z."""
+        if self.mode == 'sections':
+            grid = self._section_grids
+        else:
+            grid = self._box_grid
+        coordinates = oriented_box_coordinates(position, orientation, grid)[0]
+        samples = sample_trilinear(self.volume, coordinates)
+        if self.mode == 'sections':
+            return np.concatenate(samples, axis=1)
+        return samples.mean(axis=0)
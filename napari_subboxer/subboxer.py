@@ -1,23 +1,53 @@
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import auto
-from functools import partial, reduce
-from typing import Optional, Dict
+from functools import partial
+from pathlib import Path
+from typing import Optional, Dict, Generator, List, NamedTuple, Tuple
 
-import mrcfile
 import napari
 import napari.layers
 import numpy as np
+from napari.qt.threading import GeneratorWorker, create_worker
+from napari.utils.colormaps.standardize_color import transform_color
 from napari.utils.misc import StringEnum
 from psygnal import Signal
-import eulerangles
 import pandas as pd
 import starfile
 
-from .data_model import SubParticlePose
-from .layer_utils import reset_contrast_limits
+from .data_model import SubParticleRegistry
+from .eralda import Transform
+from .expansion import expand_poses
+from .overlay import SubparticleOverlay
+from .pose_io import particles2pose, particles_on_map, read_particles, \
+    read_transformations
+from .journal import SessionJournal, journal_path, read_journal, \
+    registry_from_records, registry_records
+from .cache import map_fingerprint, prune_cache
+from .session_io import SubboxerSession, read_session, write_session
+from .interaction_scheduler import InteractionScheduler
+from .latency_monitor import LatencyMonitor, monitored
+from .layer_utils import data_to_world, layer_nbytes, set_binned_data, \
+    set_contrast_limits, update_vectors_rows, world_to_data
+from .derivatives import derivative_name, derivative_path, \
+    iter_cached_derivative
+from .progress import exhaust, rescale_progress, with_message
+from .pyramid import finest_level_within_budget, iter_cached_pyramid, \
+    pyramid_level_path
 from .oriented_points_controls import update_in_plane_rotation
 from .plane_controls import shift_plane_along_normal, set_plane_normal_axis, \
     orient_plane_perpendicular_to_camera
 from .points_controls import add_point
+from .reslicing import PlaneReslicer
+from .snapping import DensitySnapper
+from .subbox_preview import SubboxPreviewer
+from .volume_cache import VolumeCache
+
+
+# colour and length of subparticle axes, shared by all axis vectors layers
+AXIS_COLORS = {'x': 'green', 'y': 'orange', 'z': 'blue'}
+AXIS_LENGTHS = {'x': 8, 'y': 8, 'z': 18}
 
 
 class SubboxerMode(StringEnum):
@@ -26,82 +56,192 @@ class SubboxerMode(StringEnum):
     ROTATE_IN_PLANE = auto()
 
 
+class LoadedMap(NamedTuple):
+    map_file: str
+    derivative: str
+    pyramid: List[np.ndarray]
+    volume_level: int
+    plane_level: int
+    contrast_limits: Tuple[float, float]
+    contrast_limits_range: Tuple[float, float]
+    subparticles: SubParticleRegistry
+
+
+def _displayed_nbytes(loaded_map: LoadedMap) -> int:
+    # memory-mapped levels are held by the page cache, not by the map
+    levels = {loaded_map.volume_level, loaded_map.plane_level}
+    return sum(
+        loaded_map.pyramid[level].nbytes for level in levels
+        if not isinstance(loaded_map.pyramid[level], np.memmap)
+    )
+
+
 class Subboxer:
     plane_thickness_changed = Signal(float)
     mode_changed = Signal(str)
     active_subparticle_changed = Signal(int)
-
-    def __init__(self, viewer: napari.Viewer):
+    map_loading_progress = Signal(float, str)
+    map_loaded = Signal(str)
+    map_loading_cancelled = Signal()
+    map_loading_failed = Signal(str, str)
+    write_failed = Signal(str, str)
+    open_maps_changed = Signal()
+    plane_resliced = Signal(object)
+    subbox_previewed = Signal(object)
+
+    def __init__(
+            self,
+            viewer: napari.Viewer,
+            volume_memory_budget: float = 64e6,
+            plane_memory_budget: float = 2e9,
+            single_vectors_layer: bool = False,
+            journal: bool = True,
+            snap_to_density: bool = False,
+            dark_density: bool = True,
+            map_derivative: str = 'normalised',
+            gaussian_sigma: float = 2,
+            statistics_subsample: Optional[float] = None,
+            contrast_percentiles: Tuple[float, float] = (0.5, 99.5),
+            map_cache_memory_budget: float = 4e9,
+            disk_cache_budget: float = 50e9,
+    ):
         self.viewer = viewer
         self.viewer.dims.ndisplay = 3
 
-        self.subparticles: Dict[int, SubParticlePose] = {}
+        # latency of interactive handlers and layer updates
+        self.latency_monitor = LatencyMonitor()
+        # coalesces drag updates to at most one per frame
+        self.scheduler = InteractionScheduler(
+            max_rate=60, monitor=self.latency_monitor
+        )
+
+        # derivative of the map which is displayed, see derivatives.py
+        self.map_derivative = map_derivative
+        self.gaussian_sigma = gaussian_sigma
+        # fraction of the map normalisation statistics are computed from,
+        # all of it if None, and percentiles of the map used as contrast limits
+        self.statistics_subsample = statistics_subsample
+        self.contrast_percentiles = contrast_percentiles
+
+        # bytes of float32 data used to render the map and plane layers
+        self.volume_memory_budget = volume_memory_budget
+        self.plane_memory_budget = plane_memory_budget
+
+        # several maps can be open, each with its own subparticles. Displayed
+        # data of recently used maps is kept in memory for instant switching,
+        # the state of maps which aren't displayed is kept as a session
+        self.map_cache = VolumeCache(map_cache_memory_budget)
+        # bytes of derivatives and pyramids kept in the cache directory, the
+        # least recently used are deleted when a map is loaded
+        self.disk_cache_budget = disk_cache_budget
+        self._open_maps: Dict[str, Optional[SubboxerSession]] = OrderedDict()
+
+        self.subparticles = SubParticleRegistry()
+
+        # clicked subparticle centers are optionally refined onto density,
+        # which is dark in tomograms and bright in e.g. averages
+        self.snap_to_density = snap_to_density
+        self.snapper: Optional[DensitySnapper] = None
+        self.dark_density = dark_density
+
+        # 2D reslice of the volume on the plane, only computed when enabled
+        self.plane_reslicing = False
+        self.reslicer: Optional[PlaneReslicer] = None
+
+        # active subparticle resampled into its own frame, when enabled
+        self.subbox_previewing = False
+        self.subbox_previewer: Optional[SubboxPreviewer] = None
+        self.subbox_preview_size = 48
+        self.subbox_preview_mode = 'sections'
+        self.active_subparticle_changed.connect(self.schedule_subbox_preview)
+
+        # subparticle edits are journaled per map and replayed on reopening
+        self.journal_enabled = journal
+        self.journal: Optional[SessionJournal] = None
+        # star files are written in the background
+        self._io_executor = ThreadPoolExecutor(max_workers=1)
 
         self.volume_layer: napari.layers.Image = self.create_volume_layer()
         self.plane_layer: napari.layers.Image = self.create_plane_layer()
         self.bounding_box_layer: napari.layers.Points = self.create_bounding_box_layer()
         self.subparticles_layer: napari.layers.Points = self.create_subparticles_layer()
         self.current_subparticle_z_layer: napari.layers.Points = self.create_current_subparticle_z_layer()
-        self.subparticle_z_vectors_layer = \
-            self.create_subparticle_z_vectors_layer()
-        self.subparticle_y_vectors_layer = \
-            self.create_subparticle_y_vectors_layer()
-        self.subparticle_x_vectors_layer = \
-            self.create_subparticle_x_vectors_layer()
+        # points deleted in napari are removed from the registry
+        self.subparticles_layer.events.data.connect(
+            self._on_subparticles_layer_data
+        )
+        # axes drawn as one layer with per-vector colours or one layer per axis
+        self.single_vectors_layer = single_vectors_layer
+        if self.single_vectors_layer:
+            self.subparticle_vectors_layer = \
+                self.create_subparticle_vectors_layer()
+        else:
+            self.subparticle_z_vectors_layer = \
+                self.create_subparticle_z_vectors_layer()
+            self.subparticle_y_vectors_layer = \
+                self.create_subparticle_y_vectors_layer()
+            self.subparticle_x_vectors_layer = \
+                self.create_subparticle_x_vectors_layer()
+        # row of the vectors layer drawing each axis of each subparticle, by
+        # registry row, -1 where the axis isn't defined
+        self._vector_layer_rows: Dict[str, np.ndarray] = {}
 
         self.mode: SubboxerMode = SubboxerMode.ADD
         self._active_transformation_index: int = 0
         self._volume_center: Optional[int] = None
+        self._map_shape: Optional[tuple] = None
+        self._map_loading_worker: Optional[GeneratorWorker] = None
+        self._map_file: Optional[str] = None
+        self._pending_session: Optional[SubboxerSession] = None
+        self._callbacks_connected = False
+        self.overlay: Optional[SubparticleOverlay] = None
 
     @property
     def n_subparticles(self):
-        return len(self.subparticle_ids)
+        return len(self.subparticles)
 
     @property
     def subparticle_ids(self):
-        return np.sort(np.unique(self.subparticles_layer.properties['id']))
+        return self.subparticles.ids
 
     @property
     def active_subparticle_id(self):
         # active subparticle is defined by selection of point in napari
         if self.n_subparticles == 0:
             return 0
-        idx = next(iter(self.subparticles_layer.selected_data))
+        # the last subparticle if none is selected
+        idx = next(
+            iter(self.subparticles_layer.selected_data), self.n_subparticles - 1
+        )
         return self.subparticles_layer.properties['id'][idx]
 
     @active_subparticle_id.setter
     def active_subparticle_id(self, id: int):
-        # find data index of active subparticle
-        idx = list(self.subparticles_layer.properties['id']).index(id)
+        # rows of the registry and the points layer differ once points are
+        # deleted, points are found by their id
+        idx = self._subparticles_layer_row(id)
         self.subparticles_layer.selected_data = [idx]
         self.active_subparticle_changed.emit(id)
         self._on_active_subparticle_change()
 
-    @property
-    def active_subparticle(self):
-        return self.subparticles[self.active_subparticle_id]
-
-    @property
-    def _next_subparticle_id(self):
-        return np.max(self.subparticle_ids) + 1
+    def _subparticles_layer_row(self, id: int) -> int:
+        ids = self.subparticles_layer.properties['id']
+        return int(np.flatnonzero(ids == id)[0])
 
     def next_subparticle(self, event=None):
-        current_idx = list(self.subparticle_ids).index(
-            self.active_subparticle_id
-        )
+        current_idx = self.subparticles.row(self.active_subparticle_id)
         next_idx = (current_idx + 1) % self.n_subparticles
         self.active_subparticle_id = self.subparticle_ids[next_idx]
 
     def previous_subparticle(self, event=None):
-        current_idx = list(self.subparticle_ids).index(
-            self.active_subparticle_id
-        )
+        current_idx = self.subparticles.row(self.active_subparticle_id)
         next_idx = (current_idx - 1) % self.n_subparticles
         self.active_subparticle_id = self.subparticle_ids[next_idx]
 
     @property
     def _active_subparticle_center(self):
-        return tuple(self.subparticles_layer.data[self.active_subparticle_id])
+        position = self.subparticles.position(self.active_subparticle_id)
+        return tuple(position[::-1])
 
     @property
     def _active_subparticle_z_point(self):
@@ -165,31 +305,456 @@ class Subboxer:
         self.plane_layer.experimental_slicing_plane.thickness -= 1
         self.plane_thickness_changed.emit()
 
-    def open_map(self, map_file: str):
-        with mrcfile.open(map_file) as mrc:
-            map = mrc.data
-        normalised_map = (map - np.mean(map)) / np.std(map)
+    @property
+    def dark_density(self) -> bool:
+        """Whether snapping looks for dark (rather than bright) density."""
+        return self._dark_density
+
+    @dark_density.setter
+    def dark_density(self, value: bool):
+        self._dark_density = value
+        if self.snapper is not None:
+            self.snapper.sign = -1 if value else 1
 
-        self.volume_layer.data = normalised_map
-        self.plane_layer.data = normalised_map
-        self._volume_center = np.array(map.shape) / 2
-        self.plane_layer.experimental_slicing_plane.position = self._volume_center
+    @property
+    def loading_map(self) -> bool:
+        return self._map_loading_worker is not None
+
+    @property
+    def map_file(self) -> Optional[str]:
+        """Map which is displayed."""
+        return self._map_file
+
+    @property
+    def open_maps(self) -> List[str]:
+        """Open maps, from least to most recently displayed."""
+        return list(self._open_maps)
+
+    def open_map(
+            self,
+            map_file: str,
+            blocking: bool = False,
+            session: Optional[SubboxerSession] = None,
+    ):
+        """Open a map, reading and normalising it in a background thread.
+
+        Layers are only updated once the map is ready, progress is emitted
+        through `map_loading_progress`. Loading can be stopped with
+        `cancel_map_loading`, set `blocking` to load in the calling thread.
+        The state of a `session` on this map is restored once it is loaded.
+
+        Other open maps stay open, reopening one of them restores its state.
+        Maps still in `map_cache` are displayed immediately.
+        """
+        self._stop_map_loading()
+        map_file = str(map_file)
+        if session is None:
+            if map_file == self._map_file:
+                session = self.session()
+            else:
+                session = self._open_maps.get(map_file)
+        self._pending_session = session
+        loaded_map = self.map_cache.get(self._map_cache_key(map_file))
+        if loaded_map is not None:
+            self._on_map_loaded(loaded_map)
+            return
+        if blocking:
+            self._on_map_loaded(exhaust(self._load_map(map_file)))
+            return
+        worker = create_worker(
+            self._load_map, map_file, _start_thread=False, _ignore_errors=True
+        )
+        # signals of a stopped worker may arrive after the next one started,
+        # only those of the current worker are handled
+        for signal, handler in (
+                (worker.yielded, self._on_map_loading_progress),
+                (worker.returned, self._on_map_loaded),
+                (worker.errored, partial(self._on_map_loading_errored, map_file)),
+                (worker.finished, self._on_map_loading_finished),
+        ):
+            signal.connect(partial(self._if_current_worker, worker, handler))
+        self._map_loading_worker = worker
+        worker.start()
+
+    def switch_map(self, map_file: str, blocking: bool = False):
+        """Display another open map, see `open_map`."""
+        if str(map_file) not in self._open_maps:
+            raise ValueError(f'{map_file} is not open')
+        self.open_map(map_file, blocking=blocking)
+
+    def prune_disk_cache(self):
+        """Delete derivatives and pyramids of maps beyond `disk_cache_budget`,
+        except those of maps in `map_cache`, see `prune_cache`."""
+        in_use = []
+        for loaded_map in self.map_cache.values:
+            map_file, derivative = loaded_map.map_file, loaded_map.derivative
+            in_use.append(derivative_path(map_file, derivative))
+            in_use.append(pyramid_level_path(map_file, 1, source=derivative))
+        prune_cache(self.disk_cache_budget, keep=in_use)
+
+    def _map_cache_key(self, map_file: str) -> Tuple[str, str]:
+        derivative = derivative_name(
+            self.map_derivative,
+            self.gaussian_sigma,
+            subsample=self.statistics_subsample
+        )
+        return map_file, derivative
+
+    def cancel_map_loading(self):
+        """Stop loading a map, emitting `map_loading_cancelled`."""
+        if self._map_loading_worker is not None:
+            self._stop_map_loading()
+            self.map_loading_cancelled.emit()
+
+    def _stop_map_loading(self):
+        if self._map_loading_worker is not None:
+            self._map_loading_worker.quit()
+            self._map_loading_worker = None
+
+    def _if_current_worker(self, worker: GeneratorWorker, handler, *args):
+        if worker is self._map_loading_worker:
+            handler(*args)
+
+    def _load_map(
+            self, map_file: str
+    ) -> Generator[Tuple[float, str], None, LoadedMap]:
+        # normalised (and filtered) maps are cached on disk and memory-mapped
+        # with their statistics, computed in the same pass
+        derivative = derivative_name(
+            self.map_derivative,
+            self.gaussian_sigma,
+            subsample=self.statistics_subsample
+        )
+        derivative_construction = rescale_progress(
+            iter_cached_derivative(
+                map_file,
+                self.map_derivative,
+                sigma=self.gaussian_sigma,
+                subsample=self.statistics_subsample
+            ),
+            start=0,
+            stop=0.5
+        )
+        map_data, statistics = yield from with_message(
+            derivative_construction,
+            'normalising map' if self.map_derivative == 'normalised'
+            else 'filtering map'
+        )
+        pyramid_construction = rescale_progress(
+            iter_cached_pyramid(map_file, map_data, source=derivative),
+            start=0.5,
+            stop=1
+        )
+        pyramid = yield from with_message(
+            pyramid_construction, 'binning map'
+        )
+
+        # render the volume coarse, sample the plane as finely as possible
+        volume_level = finest_level_within_budget(
+            pyramid, self.volume_memory_budget
+        )
+        plane_level = finest_level_within_budget(
+            pyramid, self.plane_memory_budget
+        )
+        contrast_limits = tuple(
+            float(limit) for limit in
+            statistics.percentiles(self.contrast_percentiles)
+        )
+        # displayed binned levels are read into memory once, where they stay
+        # while the map is in the map cache, the full map stays memory-mapped
+        yield 1, 'reading map'
+        pyramid = list(pyramid)
+        for level in {volume_level, plane_level} - {0}:
+            pyramid[level] = np.array(pyramid[level])
+        yield 1, 'displaying map'
+        if self.journal_enabled:
+            subparticles = registry_from_records(
+                read_journal(journal_path(map_file))
+            )
+        else:
+            subparticles = SubParticleRegistry()
+        return LoadedMap(
+            map_file=map_file,
+            derivative=derivative,
+            pyramid=pyramid,
+            volume_level=volume_level,
+            plane_level=plane_level,
+            contrast_limits=contrast_limits,
+            contrast_limits_range=(statistics.min, statistics.max),
+            subparticles=subparticles,
+        )
+
+    def _on_map_loading_progress(self, progress: Tuple[float, str]):
+        self.map_loading_progress.emit(*progress)
+
+    def _on_map_loading_errored(self, map_file: str, error: Exception):
+        self.map_loading_failed.emit(map_file, f'{type(error).__name__}: {error}')
+
+    def _on_map_loading_finished(self):
+        self._map_loading_worker = None
+
+    @monitored('display map')
+    def _on_map_loaded(self, loaded_map: LoadedMap):
+        # the state of a map being replaced is kept to switch back to it
+        if self._map_file not in (None, loaded_map.map_file):
+            self._open_maps[self._map_file] = self.session()
+            self.hide_expanded_subparticles()
+        self._open_maps.pop(loaded_map.map_file, None)
+        self._open_maps[loaded_map.map_file] = None
+        self.map_cache.put(
+            (loaded_map.map_file, loaded_map.derivative),
+            loaded_map,
+            nbytes=_displayed_nbytes(loaded_map)
+        )
+        self.prune_disk_cache()
+
+        # all layer updates happen together, in the main thread
+        pyramid = loaded_map.pyramid
+        set_binned_data(
+            self.volume_layer,
+            pyramid[loaded_map.volume_level],
+            binning=2 ** loaded_map.volume_level
+        )
+        set_binned_data(
+            self.plane_layer,
+            pyramid[loaded_map.plane_level],
+            binning=2 ** loaded_map.plane_level
+        )
+        self._map_shape = pyramid[0].shape
+        self.snapper = DensitySnapper(pyramid[0], invert=self.dark_density)
+        self.reslicer = PlaneReslicer(pyramid[0])
+        self.subbox_previewer = SubboxPreviewer(
+            pyramid[0],
+            box_size=self.subbox_preview_size,
+            mode=self.subbox_preview_mode
+        )
+        self._volume_center = np.array(self._map_shape) / 2
+        self.plane_layer.experimental_slicing_plane.position = world_to_data(
+            self.plane_layer, self._volume_center
+        )
         self.update_bounding_box()
 
         for layer in self.volume_layer, self.plane_layer:
             layer.visible = True
-            reset_contrast_limits(layer)
+            set_contrast_limits(
+                layer,
+                loaded_map.contrast_limits,
+                contrast_limits_range=loaded_map.contrast_limits_range
+            )
 
-        self.connect_callbacks()
+        if not self._callbacks_connected:
+            self.connect_callbacks()
         self.viewer.reset_view()
         self.viewer.camera.angles = (140, -55, -140)
         self.viewer.camera.zoom = 0.8
         self.viewer.layers.selection.active = self.volume_layer
+        self._map_file = loaded_map.map_file
+
+        # a session being loaded takes precedence over the journal
+        subparticles = loaded_map.subparticles
+        session, self._pending_session = self._pending_session, None
+        if session is not None:
+            subparticles = session.subparticles
+        self.close_journal()
+        self.set_subparticles(subparticles)
+        if self.journal_enabled:
+            path = journal_path(loaded_map.map_file)
+            self.journal = SessionJournal(
+                path,
+                records=registry_records(subparticles),
+                error_callback=partial(self._on_write_failed, path),
+            )
+        if session is not None:
+            self._restore_view(session)
+        self.map_loaded.emit(loaded_map.map_file)
+        self.open_maps_changed.emit()
+
+    def session(self) -> SubboxerSession:
+        plane = self.plane_layer.experimental_slicing_plane
+        binning = self.plane_layer.scale[0]
+        return SubboxerSession(
+            map_file=self._map_file,
+            map_fingerprint=map_fingerprint(self._map_file),
+            subparticles=self.subparticles,
+            active_subparticle_id=self.active_subparticle_id,
+            mode=str(self.mode),
+            plane_position=tuple(data_to_world(self.plane_layer, plane.position)),
+            plane_normal=tuple(plane.normal),
+            plane_thickness=plane.thickness * binning,
+            camera_center=tuple(self.viewer.camera.center),
+            camera_angles=tuple(self.viewer.camera.angles),
+            camera_zoom=self.viewer.camera.zoom,
+        )
 
-    def close_map(self):
-        self.disconnect_callbacks()
-        self.viewer.layers.remove(self.volume_layer)
-        self.viewer.layers.remove(self.bounding_box_layer)
+    def save_session(self, session_file):
+        """Save subparticles, plane and camera of this session to one file."""
+        write_session(self.session(), session_file)
+
+    def load_session(self, session_file, blocking: bool = False):
+        """Reopen the map of a saved session and restore its state."""
+        session = read_session(session_file)
+        if not Path(session.map_file).exists():
+            raise FileNotFoundError(f'map {session.map_file} not found')
+        if map_fingerprint(session.map_file) != session.map_fingerprint:
+            warnings.warn(
+                f'{session.map_file} has changed since the session was saved'
+            )
+        self.open_map(session.map_file, blocking=blocking, session=session)
+
+    def set_map_derivative(
+            self,
+            derivative: str = 'normalised',
+            sigma: float = 2,
+            blocking: bool = False
+    ):
+        """Display a derivative of the map (see derivatives.py).
+
+        An open map is reloaded from the derivative cache, keeping the state
+        of the session.
+        """
+        derivative_name(derivative, sigma)  # validates the derivative
+        self.map_derivative = derivative
+        self.gaussian_sigma = sigma
+        if self._map_file is not None:
+            self.open_map(
+                self._map_file, blocking=blocking, session=self.session()
+            )
+
+    def _restore_view(self, session: SubboxerSession):
+        plane = self.plane_layer.experimental_slicing_plane
+        plane.position = world_to_data(self.plane_layer, session.plane_position)
+        plane.normal = session.plane_normal
+        plane.thickness = session.plane_thickness / self.plane_layer.scale[0]
+        self.mode = session.mode
+        if session.active_subparticle_id in self.subparticles:
+            self.active_subparticle_id = session.active_subparticle_id
+        # after selecting the active subparticle, which may move the camera
+        self.viewer.camera.center = session.camera_center
+        self.viewer.camera.angles = session.camera_angles
+        self.viewer.camera.zoom = session.camera_zoom
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def record_subparticle(self, id: int):
+        """Record the current state of a subparticle in the session journal."""
+        if self.journal is not None:
+            self.journal.record_subparticle(self.subparticles, id)
+
+    def _on_subparticles_layer_data(self, event=None):
+        # points are appended before they are registered, only deletions
+        # are handled here
+        if len(self.subparticles_layer.data) >= self.n_subparticles:
+            return
+        removed = np.isin(
+            self.subparticle_ids,
+            self.subparticles_layer.properties['id'],
+            invert=True,
+        )
+        for id in self.subparticle_ids[removed].tolist():
+            self.subparticles.remove(id)
+            if self.journal is not None:
+                self.journal.record_removal(id)
+        self.populate_subparticle_vectors_layers()
+        self.active_subparticle_changed.emit(self.active_subparticle_id)
+
+    @monitored('set subparticles')
+    def set_subparticles(self, subparticles: SubParticleRegistry):
+        """Replace all subparticles, e.g. when restoring a session."""
+        self.subparticles = subparticles
+        # ids of the layer are only set after its data
+        with self.subparticles_layer.events.data.blocker(
+                self._on_subparticles_layer_data
+        ):
+            self.subparticles_layer.data = subparticles.positions[:, ::-1]
+        if len(subparticles) > 0:
+            # properties can't be set on an empty layer
+            self.subparticles_layer.properties = {'id': subparticles.ids.copy()}
+            self.subparticles_layer.selected_data = {len(subparticles) - 1}
+        self.subparticles_layer.current_properties['id'] = \
+            subparticles.next_id
+        self.populate_subparticle_vectors_layers()
+
+    def show_expanded_subparticles(
+            self,
+            particles_file,
+            transformations_file,
+            where: Optional[str] = None,
+            max_points: int = 20000,
+            all_micrographs: bool = False,
+    ):
+        """Overlay the subparticles obtained by applying transformations on
+        particles from a consensus refinement, e.g. over their tomogram.
+
+        Only particles on the displayed map (see `particles_on_map`) are
+        transformed, unless `all_micrographs` is set. Only the subparticles in
+        the slab rendered by the plane and in view of the camera are drawn,
+        see `SubparticleOverlay`.
+        """
+        particles = read_particles(particles_file, where=where)
+        if not all_micrographs and self._map_file is not None:
+            particles = particles_on_map(particles, self._map_file)
+            if len(particles) == 0:
+                warnings.warn(
+                    f'no particles in {particles_file} are on {self._map_file}'
+                )
+        positions, orientations, _ = particles2pose(particles)
+        shifts, rotations = read_transformations(transformations_file)
+        positions, orientations, _, _ = expand_poses(
+            positions,
+            orientations,
+            Transform(shifts=shifts, rotations=rotations)
+        )
+        self.hide_expanded_subparticles()
+        self.overlay = SubparticleOverlay(
+            self.viewer,
+            positions=positions,
+            orientations=orientations,
+            plane_layer=self.plane_layer,
+            scheduler=self.scheduler,
+            max_points=max_points,
+        )
+
+    def hide_expanded_subparticles(self):
+        if self.overlay is not None:
+            self.overlay.close()
+            self.overlay = None
+
+    def close_map(self, blocking: bool = False):
+        """Close the displayed map and release its data.
+
+        The most recently displayed of the other open maps is displayed
+        instead, if any.
+        """
+        if self._map_file is None:
+            return
+        self._stop_map_loading()
+        self.close_journal()
+        self.hide_expanded_subparticles()
+        self._open_maps.pop(self._map_file, None)
+        for key in self.map_cache.keys:
+            if key[0] == self._map_file:
+                self.map_cache.pop(key)
+        self._map_file = None
+
+        # nothing can be edited until another map is loaded
+        self.snapper = None
+        self.reslicer = None
+        self.subbox_previewer = None
+        self._map_shape = None
+        if self._callbacks_connected:
+            self.disconnect_callbacks()
+        self.set_subparticles(SubParticleRegistry())
+        # layers are kept for the next map, without references to this one
+        for layer in self.volume_layer, self.plane_layer:
+            layer.visible = False
+            set_binned_data(layer, np.zeros((32, 32, 32)), binning=1)
+        self.bounding_box_layer.data = np.empty((0, 3))
+        if len(self._open_maps) > 0:
+            self.open_map(next(reversed(self._open_maps)), blocking=blocking)
+        self.open_maps_changed.emit()
 
     def create_volume_layer(self):
         volume_layer = self.viewer.add_image(
@@ -257,7 +822,7 @@ class Subboxer:
         return bounding_box_layer
 
     def update_bounding_box(self):
-        bounding_box_max = self.volume_layer.data.shape
+        bounding_box_max = self._map_shape
         bounding_box_points = np.array(
             [
                 [0, 0, 0],
@@ -293,32 +858,118 @@ class Subboxer:
 
         return inner
 
+    def enable_plane_reslicing(self):
+        self.plane_reslicing = True
+        self.schedule_plane_reslice()
+
+    def disable_plane_reslicing(self):
+        self.plane_reslicing = False
+
+    def schedule_plane_reslice(self, event=None):
+        if self.plane_reslicing and self.reslicer is not None:
+            self.scheduler.schedule('plane reslice', self.update_plane_reslice)
+
+    def update_plane_reslice(self):
+        """Emit the thickness-averaged reslice of the map on the plane."""
+        if self.reslicer is None:
+            return
+        plane = self.plane_layer.experimental_slicing_plane
+        image = self.reslicer.reslice(
+            position=data_to_world(self.plane_layer, plane.position),
+            normal=plane.normal,
+            thickness=plane.thickness * self.plane_layer.scale[0],
+        )
+        self.plane_resliced.emit(image)
+
+    def enable_subbox_preview(self):
+        self.subbox_previewing = True
+        self.schedule_subbox_preview()
+
+    def disable_subbox_preview(self):
+        self.subbox_previewing = False
+
+    def set_subbox_preview(self, box_size: int = None, mode: str = None):
+        if box_size is not None:
+            self.subbox_preview_size = box_size
+        if mode is not None:
+            self.subbox_preview_mode = mode
+        if self.subbox_previewer is not None:
+            self.subbox_previewer.box_size = self.subbox_preview_size
+            self.subbox_previewer.mode = self.subbox_preview_mode
+        self.schedule_subbox_preview()
+
+    def schedule_subbox_preview(self, id: Optional[int] = None):
+        if self.subbox_previewing and self.subbox_previewer is not None:
+            self.scheduler.schedule('subbox preview', self.update_subbox_preview)
+
+    def update_subbox_preview(self):
+        """Emit the active subparticle's sub-box resampled in its frame."""
+        if self.subbox_previewer is None or self.n_subparticles == 0 or \
+                len(self.subparticles_layer.selected_data) == 0:
+            return
+        id = self.active_subparticle_id
+        image = self.subbox_previewer.preview(
+            position=self.subparticles.position(id),
+            orientation=self.subparticles.orientation(id, complete=True),
+        )
+        self.subbox_previewed.emit(image)
+
+    def _snap_position(self, position: np.ndarray) -> np.ndarray:
+        if self.snap_to_density and self.snapper is not None:
+            return self.snapper.snap(position)
+        return position
+
     def _on_add_subparticle_center(self):
-        # update id to be assigned to next particle
-        self.subparticles_layer.current_properties[
-            'id'] = self._next_subparticle_id
+        # napari gives new points the properties of the selected point, the
+        # id of the newly added point is assigned by the registry
+        z, y, x = self.subparticles_layer.data[-1]
+        id = self.subparticles.add(position=(x, y, z))
+        self.subparticles_layer.properties['id'][-1] = id
 
-        # create subparticle and add to dict of subparticles
-        z, y, x = self._active_subparticle_center
-        subparticle = SubParticlePose(x=x, y=y, z=z)
-        self.subparticles[self.active_subparticle_id] = subparticle
-        self.active_subparticle_changed.emit(self.active_subparticle_id)
-        self.populate_subparticle_vectors_layers()
+        # update id to be assigned to next particle
+        self.subparticles_layer.current_properties['id'] = \
+            self.subparticles.next_id
+        self.record_subparticle(id)
+        self.active_subparticle_changed.emit(id)
 
     def _on_add_subparticle_z(self):
         start = np.asarray(self._active_subparticle_center)
         end = np.asarray(self._active_subparticle_z_point)
         z_vector = end - start
-        self.subparticles[self.active_subparticle_id].z_vector = z_vector[::-1]
+        self.subparticles.set_vectors(
+            self.active_subparticle_id, z_vector=z_vector[::-1]
+        )
         self.current_subparticle_z_layer.visible = True
-        self.populate_subparticle_vectors_layers()
+        self.update_subparticle_vectors(self.active_subparticle_id)
+        self.record_subparticle(self.active_subparticle_id)
+
+    def _on_write_done(self, path, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            self._on_write_failed(path, future.exception())
+
+    def _on_write_failed(self, path, error: Exception):
+        # called from writer threads
+        self.write_failed.emit(str(path), f'{type(error).__name__}: {error}')
+
+    def layer_memory(self) -> Dict[str, int]:
+        """Bytes of data held by each layer of the viewer."""
+        return {layer.name: layer_nbytes(layer) for layer in self.viewer.layers}
+
+    def dump_latency(self, output_file):
+        """Write latency statistics and layer memory to JSON."""
+        self.latency_monitor.dump(output_file, layer_memory=self.layer_memory())
 
     def connect_callbacks(self):
+        self._callbacks_connected = True
+        # every handler is timed by the latency monitor
+        timed = self.latency_monitor.timed
+
         # plane click and drag
-        self._shift_plane_callback = partial(
+        self._shift_plane_callback = timed('shift plane', partial(
             shift_plane_along_normal,
-            layer=self.plane_layer
-        )
+            layer=self.plane_layer,
+            scheduler=self.scheduler,
+        ))
         self.viewer.mouse_drag_callbacks.append(
             self._shift_plane_callback
         )
@@ -330,21 +981,21 @@ class Subboxer:
                 layer=self.plane_layer,
                 axis=key
             )
-            self.viewer.bind_key(key, callback)
+            self.viewer.bind_key(key, timed('plane normal', callback))
 
         # plane orientation (camera)
-        self._orient_plane_callback = partial(
+        self._orient_plane_callback = timed('orient plane', partial(
             orient_plane_perpendicular_to_camera,
             layer=self.plane_layer
-        )
+        ))
         self.viewer.bind_key('o', self._orient_plane_callback)
 
         # plane thickness (buttons)
         self.viewer.bind_key(
-            '[', self.decrease_plane_thickness
+            '[', timed('plane thickness', self.decrease_plane_thickness)
         )
         self.viewer.bind_key(
-            ']', self.increase_plane_thickness
+            ']', timed('plane thickness', self.increase_plane_thickness)
         )
 
         # plane thickness event emission
@@ -352,12 +1003,19 @@ class Subboxer:
             partial(self.plane_thickness_changed.emit, self.plane_thickness)
         )
 
+        # plane reslice
+        plane = self.plane_layer.experimental_slicing_plane
+        for event in plane.events.position, plane.events.normal, \
+                plane.events.thickness:
+            event.connect(self.schedule_plane_reslice)
+
         # add subparticle (in add mode)
         self._add_subparticle_callback = partial(
-            self.if_add_mode_enabled(add_point),
+            self.if_add_mode_enabled(timed('add subparticle', add_point)),
             points_layer=self.subparticles_layer,
             plane_layer=self.plane_layer,
             append=True,
+            refine=self._snap_position,
             callback=self._on_add_subparticle_center,
         )
         self.viewer.mouse_drag_callbacks.append(
@@ -366,7 +1024,7 @@ class Subboxer:
 
         # add point for defining z-axis
         self._define_z_axis_callback = partial(
-            self.if_define_z_mode_enabled(add_point),
+            self.if_define_z_mode_enabled(timed('define z axis', add_point)),
             points_layer=self.current_subparticle_z_layer,
             plane_layer=self.plane_layer,
             append=False,
@@ -377,12 +1035,17 @@ class Subboxer:
         )
 
         # left right to navigate subparticles
-        self.viewer.bind_key('Left', self.previous_subparticle)
-        self.viewer.bind_key('Right', self.next_subparticle)
+        self.viewer.bind_key(
+            'Left', timed('previous subparticle', self.previous_subparticle)
+        )
+        self.viewer.bind_key(
+            'Right', timed('next subparticle', self.next_subparticle)
+        )
 
         # rotate in plane callback
+        rotate_in_plane = timed('rotate in plane', update_in_plane_rotation)
         self._rotate_in_plane_callback = partial(
-            self.if_rotate_in_plane_mode_enabled(update_in_plane_rotation),
+            self.if_rotate_in_plane_mode_enabled(rotate_in_plane),
             subboxer=self,
             callback=self.populate_subparticle_vectors_layers
         )
@@ -392,18 +1055,41 @@ class Subboxer:
         )
 
     def disconnect_callbacks(self):
+        self._callbacks_connected = False
         self.viewer.mouse_drag_callbacks.remove(self._shift_plane_callback)
         self.viewer.mouse_drag_callbacks.remove(
             self._add_subparticle_callback)
+        self.viewer.mouse_drag_callbacks.remove(
+            self._define_z_axis_callback)
+        self.viewer.mouse_drag_callbacks.remove(
+            self._rotate_in_plane_callback)
+        plane = self.plane_layer.experimental_slicing_plane
+        for event in plane.events.position, plane.events.normal, \
+                plane.events.thickness:
+            event.disconnect(self.schedule_plane_reslice)
         for key in 'xyzo[]':
             self.viewer.keymap.pop(key.upper())
+        for key in 'Left', 'Right':
+            self.viewer.keymap.pop(key)
+
+    def create_subparticle_vectors_layer(self):
+        # axis lengths are encoded in the vectors data
+        vectors_layer = self.viewer.add_vectors(
+            data=np.zeros(6).reshape((1, 2, 3)),
+            ndim=3,
+            length=1,
+            name='subparticle axes',
+            edge_color=AXIS_COLORS['z'],
+            edge_width=3
+        )
+        return vectors_layer
 
     def create_subparticle_z_vectors_layer(self):
         z_vectors_layer = self.viewer.add_vectors(
             data=np.zeros(6).reshape((1, 2, 3)),
-            length=18,
+            length=AXIS_LENGTHS['z'],
             name='subparticle z vectors',
-            edge_color='blue',
+            edge_color=AXIS_COLORS['z'],
             edge_width=3
         )
         return z_vectors_layer
@@ -412,9 +1098,9 @@ class Subboxer:
         y_vectors_layer = self.viewer.add_vectors(
             data=np.zeros(6).reshape((1, 2, 3)),
             ndim=3,
-            length=8,
+            length=AXIS_LENGTHS['y'],
             name='subparticle y vectors',
-            edge_color='orange',
+            edge_color=AXIS_COLORS['y'],
             edge_width=3
         )
         return y_vectors_layer
@@ -423,66 +1109,105 @@ class Subboxer:
         x_vectors_layer = self.viewer.add_vectors(
             data=np.zeros(6).reshape((1, 2, 3)),
             ndim=3,
-            length=8,
+            length=AXIS_LENGTHS['x'],
             name='subparticle x vectors',
-            edge_color='green',
+            edge_color=AXIS_COLORS['x'],
             edge_width=3
         )
         return x_vectors_layer
 
+    @property
+    def _subparticle_vectors_layers(self):
+        """(axes, layer) pairs for the layers drawing subparticle axes."""
+        if self.single_vectors_layer:
+            return [('xyz', self.subparticle_vectors_layer)]
+        return [
+            ('x', self.subparticle_x_vectors_layer),
+            ('y', self.subparticle_y_vectors_layer),
+            ('z', self.subparticle_z_vectors_layer),
+        ]
+
+    def _axis_vectors(self, axis: str, vectors: np.ndarray) -> np.ndarray:
+        # a single layer draws every vector with length 1
+        if self.single_vectors_layer:
+            vectors = vectors.copy()
+            vectors[..., 1, :] *= AXIS_LENGTHS[axis]
+        return vectors
+
+    @monitored('populate subparticle vectors')
     def populate_subparticle_vectors_layers(self):
-        vectors_data_attributes = [f'{ax}_vector_napari' for ax in 'xyz']
-        vectors_layers = (
-            self.subparticle_x_vectors_layer,
-            self.subparticle_y_vectors_layer,
-            self.subparticle_z_vectors_layer
-        )
-        for attr, layer in zip(vectors_data_attributes, vectors_layers):
+        for axes, layer in self._subparticle_vectors_layers:
             vector_data = [
-                getattr(subparticle, attr)
-                for subparticle in self.subparticles.values()
-                if getattr(subparticle, attr) is not None
+                self._axis_vectors(axis, self.subparticles.napari_vectors(axis))
+                for axis in axes
             ]
-            if len(vector_data) > 0:
-                layer.data = np.stack(vector_data, axis=0)
-
-    def save_subparticles(self, output_filename):
-        shifts = []
-        eulers = []
-        for subparticle in self.subparticles.values():
-            dx = subparticle.x - self._volume_center[2]
-            dy = subparticle.y - self._volume_center[1]
-            dz = subparticle.z - self._volume_center[0]
-            subparticle_shifts = np.array([dx, dy, dz])
-            shifts.append(subparticle_shifts)
-
-            orientation = np.column_stack(
-                (
-                    subparticle.x_vector,
-                    subparticle.y_vector,
-                    subparticle.z_vector
+            n_vectors = [len(vectors) for vectors in vector_data]
+            offset = 0
+            for axis in axes:
+                defined = self.subparticles.defined(axis)
+                self._vector_layer_rows[axis] = np.where(
+                    defined, offset + np.cumsum(defined) - 1, -1
+                )
+                offset += np.count_nonzero(defined)
+            if sum(n_vectors) == 0:
+                layer.data = np.zeros(6).reshape((1, 2, 3))
+                continue
+            layer.data = np.concatenate(vector_data, axis=0)
+            if self.single_vectors_layer:
+                layer.edge_color = np.repeat(
+                    transform_color([AXIS_COLORS[axis] for axis in axes]),
+                    n_vectors,
+                    axis=0
                 )
-            )
-            subparticle_eulers = eulerangles.matrix2euler(
-                orientation.swapaxes(-1, -2),
-                axes='zyz',
-                intrinsic=True,
-                right_handed_rotation=True
-            )
-            eulers.append(subparticle_eulers)
 
+    @monitored('update subparticle vectors')
+    def update_subparticle_vectors(self, id: int):
+        """Update the axes drawn for one subparticle.
+
+        Only the rows of the vectors layers holding this subparticle are
+        rewritten, all layers are repopulated if its axes are newly defined.
+        """
+        self.schedule_subbox_preview()
+        row = self.subparticles.row(id)
+        for axes, layer in self._subparticle_vectors_layers:
+            # vectors layers hold the defined vectors of each axis in turn
+            layer_rows, vector_data = [], []
+            for axis in axes:
+                vector = self.subparticles.napari_vector(id, axis)
+                defined = not np.any(np.isnan(vector))
+                rows = self._vector_layer_rows.get(axis, ())
+                layer_row = rows[row] if row < len(rows) else -1
+                if defined != (layer_row >= 0):
+                    self.populate_subparticle_vectors_layers()
+                    return
+                if defined:
+                    layer_rows.append(layer_row)
+                    vector_data.append(self._axis_vectors(axis, vector))
+            if len(layer_rows) > 0:
+                update_vectors_rows(layer, layer_rows, np.stack(vector_data))
+
+    def save_subparticles(self, output_filename, blocking: bool = False):
+        """Write subparticle transformations to a STAR file.
+
+        The table is built immediately and written in a background thread,
+        set `blocking` to wait for the returned future. Failed writes are
+        emitted through `write_failed`.
+        """
+        shifts = self.subparticles.positions - self._volume_center[::-1]
+        eulers = self.subparticles.eulers()
         data = {
-            'subboxerShiftX': np.array([shift[0] for shift in shifts]),
-            'subboxerShiftY': np.array([shift[1] for shift in shifts]),
-            'subboxerShiftZ': np.array([shift[2] for shift in shifts]),
-            'subboxerAngleRot': np.array(triplet[0] for triplet in eulers),
-            'subboxerAngleTilt': np.array(triplet[1] for triplet in eulers),
-            'subboxerAnglePsi': np.array(triplet[2] for triplet in eulers),
+            'subboxerShiftX': shifts[:, 0],
+            'subboxerShiftY': shifts[:, 1],
+            'subboxerShiftZ': shifts[:, 2],
+            'subboxerAngleRot': eulers[:, 0],
+            'subboxerAngleTilt': eulers[:, 1],
+            'subboxerAnglePsi': eulers[:, 2],
         }
         df = pd.DataFrame.from_dict(data)
-        starfile.write(df, output_filename, force_loop=True, overwrite=True)
-
-
-
-
-
+        future = self._io_executor.submit(
+            starfile.write, df, output_filename, force_loop=True, overwrite=True
+        )
+        future.add_done_callback(partial(self._on_write_done, output_filename))
+        if blocking:
+            future.result()
+        return future
@@ -0,0 +1,41 @@
+import mrcfile
+import numpy as np
+
+from ..benchmark import run_benchmark, write_synthetic_map
+
+
+def test_synthetic_map_has_blobs_at_centers(tmp_path):
+    map_file = tmp_path / 'synthetic.mrc'
+    centers = write_synthetic_map(
+        map_file, size=48, blob_spacing=16, noise=0.05, slab_size=10
+    )
+    assert centers.shape == (27, 3)
+    with mrcfile.open(map_file) as mrc:
+        volume = np.array(mrc.data)
+    assert volume.shape == (48, 48, 48) and volume.dtype == np.float32
+
+    # blobs are continuous across slabs, peaking at their centers
+    peaks = volume[tuple(np.round(centers).astype(int).T)]
+    assert np.median(peaks) > 0.8
+    assert abs(np.median(volume)) < 0.1
+
+
+def test_benchmark_replays_every_scenario(make_napari_viewer):
+    viewer = make_napari_viewer()
+    report = run_benchmark(size=64, n_subparticles=3, n_drag_steps=3, viewer=viewer)
+    assert report['map'] == {
+        'shape': [64, 64, 64],
+        'open_seconds': report['map']['open_seconds'],
+        'n_subparticles': 3,
+    }
+    assert set(report['events']) == {
+        'add subparticle', 'next subparticle', 'define z axis',
+        'rotate in plane', 'drag plane', 'plane normal', 'plane thickness',
+    }
+    # a press and a release per added subparticle
+    assert report['events']['add subparticle']['count'] == 6
+    assert set(report['totals']) == {
+        'add subparticle', 'define z axis', 'rotate in plane', 'drag plane',
+        'change plane',
+    }
+    assert report['handlers']['add subparticle']['count'] > 0
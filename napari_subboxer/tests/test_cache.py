@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+from typer.testing import CliRunner
+
+from ..cache import prune_cache
+from ..cli import cli
+
+
+def _write(path, nbytes: int, mtime: float):
+    path.write_bytes(b'\0' * nbytes)
+    os.utime(path, (mtime, mtime))
+
+
+def test_least_recently_used_derivatives_are_pruned(tmp_path):
+    keys = ['a' * 40, 'b' * 40, 'c' * 40]
+    for i, key in enumerate(keys):
+        _write(tmp_path / f'{key}.npy', 1000, mtime=i)
+        _write(tmp_path / f'{key}_statistics.npz', 100, mtime=i)
+    _write(tmp_path / f'{"b" * 40}_level1.npy', 100, mtime=10)
+    _write(tmp_path / f'{"d" * 40}.tmp.npy', 1000, mtime=0)
+    _write(tmp_path / f'{"e" * 40}.jsonl', 1000, mtime=0)
+
+    # 'a' is the least recently used, 'b' was used most recently
+    assert prune_cache(2500, cache_dir=tmp_path) == 1100
+    remaining = {path.name for path in tmp_path.iterdir()}
+    assert f'{"a" * 40}.npy' not in remaining
+    assert f'{"a" * 40}_statistics.npz' not in remaining
+    assert f'{"c" * 40}.npy' in remaining
+
+    # kept keys and files being written or journals are never deleted
+    assert prune_cache(0, keep=[tmp_path / f'{"c" * 40}.npy'],
+                       cache_dir=tmp_path) == 1200
+    assert sorted(remaining - {path.name for path in tmp_path.iterdir()}) == [
+        f'{"b" * 40}.npy', f'{"b" * 40}_level1.npy', f'{"b" * 40}_statistics.npz'
+    ]
+
+
+def test_clear_cache_command(tmp_path, monkeypatch):
+    monkeypatch.setenv('NAPARI_SUBBOXER_CACHE', str(tmp_path))
+    np.save(tmp_path / f'{"a" * 40}.npy', np.zeros(10))
+    (tmp_path / f'{"a" * 40}.jsonl').write_text('{}\n')
+    result = CliRunner().invoke(cli, ['clear-cache'])
+    assert result.exit_code == 0, result.output
+    assert [path.suffix for path in tmp_path.iterdir()] == ['.jsonl']
@@ -0,0 +1,52 @@
+import eulerangles
+import numpy as np
+
+from ..data_model import SubParticleRegistry
+
+
+def test_registry_add_remove():
+    registry = SubParticleRegistry(capacity=2)
+    ids = [registry.add(position=(i, 2 * i, 3 * i)) for i in range(5)]
+    assert ids == [0, 1, 2, 3, 4]
+    assert registry.capacity == 8
+    assert np.allclose(registry.position(3), (3, 6, 9))
+
+    registry.remove(1)
+    assert len(registry) == 4
+    assert 1 not in registry
+    assert list(registry.ids) == [0, 4, 2, 3]
+    assert registry.row(4) == 1
+    assert np.allclose(registry.position(4), (4, 8, 12))
+    assert registry.add(position=(0, 0, 0)) == 5
+
+
+def test_registry_vectors():
+    registry = SubParticleRegistry()
+    registry.add(position=(1, 2, 3))
+    registry.add(position=(4, 5, 6))
+    registry.set_vectors(1, z_vector=(0, 0, 2))
+    assert np.allclose(registry.vector(1, 'z'), (0, 0, 1))
+
+    z_vectors = registry.napari_vectors('z')
+    assert z_vectors.shape == (1, 2, 3)
+    assert np.allclose(z_vectors[0], [(6, 5, 4), (1, 0, 0)])
+    assert len(registry.napari_vectors('x')) == 0
+
+    registry.initialise_xy_vectors(1)
+    orientation = registry.orientation(1)
+    assert np.allclose(orientation.T @ orientation, np.eye(3))
+    assert np.allclose(orientation[:, 2], (0, 0, 1))
+
+
+def test_registry_eulers():
+    registry = SubParticleRegistry()
+    registry.add(position=(0, 0, 0))
+    registry.add(position=(0, 0, 0))
+    registry.set_vectors(1, x_vector=(0, 1, 0), y_vector=(-1, 0, 0), z_vector=(0, 0, 1))
+    eulers = registry.eulers()
+    assert eulers.shape == (2, 3)
+    matrices = eulerangles.euler2matrix(
+        eulers, axes='zyz', intrinsic=True, right_handed_rotation=True
+    )
+    assert np.allclose(matrices.swapaxes(-1, -2), registry.orientations())
+    assert np.allclose(matrices[0], np.eye(3))
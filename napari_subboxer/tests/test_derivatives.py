@@ -0,0 +1,57 @@
+import mrcfile
+import numpy as np
+
+from ..derivatives import cached_derivative, iter_cached_derivative
+from ..filters import gaussian_kernel, separable_filter
+
+
+def test_cached_derivatives(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    volume = np.random.default_rng(0).normal(loc=5, scale=3, size=(40, 30, 20))
+    mrcfile.new(map_file, data=volume.astype(np.float32))
+
+    normalised, statistics = cached_derivative(
+        map_file, 'normalised', cache_dir=tmp_path
+    )
+    assert isinstance(normalised, np.memmap)
+    expected = (volume - np.mean(volume)) / np.std(volume)
+    assert np.allclose(normalised, expected, atol=1e-4)
+    assert np.isclose(statistics.mean, 0) and np.isclose(statistics.std, 1)
+    assert np.isclose(statistics.max, expected.max(), atol=1e-4)
+
+    # filtered in slabs, matching a filter over the whole (edge padded) map
+    filtered, statistics = cached_derivative(
+        map_file, 'gaussian', sigma=1.5, cache_dir=tmp_path
+    )
+    kernel = gaussian_kernel(1.5)
+    padded = np.pad(np.asarray(normalised), len(kernel) // 2, mode='edge')
+    assert np.allclose(filtered, separable_filter(padded, kernel), atol=1e-5)
+    assert np.isclose(statistics.std, np.std(filtered))
+
+    # statistics are stored with the derivative
+    _, cached_statistics = cached_derivative(
+        map_file, 'gaussian', sigma=1.5, cache_dir=tmp_path
+    )
+    assert np.all(cached_statistics.counts == statistics.counts)
+
+    # cached files are reused, new parameters add a file
+    cached_files = sorted(tmp_path.glob('*.npy'))
+    assert len(cached_files) == 2
+    modification_times = [f.stat().st_mtime_ns for f in cached_files]
+    cached_derivative(map_file, 'gaussian', sigma=1.5, cache_dir=tmp_path)
+    assert [f.stat().st_mtime_ns for f in cached_files] == modification_times
+    cached_derivative(map_file, 'gaussian', sigma=3, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+
+
+def test_cancelled_derivative_leaves_no_files(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    volume = np.random.random((256, 16, 16)).astype(np.float32)
+    mrcfile.new(map_file, data=volume)
+
+    generator = iter_cached_derivative(map_file, 'normalised', cache_dir=tmp_path)
+    while next(generator) < 0.5:
+        pass
+    next(generator)
+    generator.close()
+    assert list(tmp_path.glob('*.npy')) == []
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from ..eralda import Pose, Transform, children_index
+
+
+def _random_rotations(n):
+    q = np.random.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    return np.stack([
+        1 - 2 * (y ** 2 + z ** 2), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x ** 2 + z ** 2), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x ** 2 + y ** 2),
+    ], axis=-1).reshape((n, 3, 3))
+
+
+def test_expansion_indices_match_apply():
+    pose = Pose(
+        positions=np.random.uniform(0, 100, size=(7, 3)),
+        orientations=_random_rotations(7),
+    )
+    transform = Transform(
+        shifts=np.random.normal(size=(3, 3)), rotations=_random_rotations(3)
+    )
+    positions, _ = transform.apply(pose)
+    pose_indices, transform_indices = transform.expansion_indices(pose)
+    assert pose_indices.shape == transform_indices.shape == (3, 7)
+
+    i, j = 2, 5
+    p, t = pose_indices[i, j], transform_indices[i, j]
+    expected = pose.positions[p] + pose.orientations[p] @ transform.shifts[t]
+    assert np.allclose(positions[i, j], expected.squeeze())
+
+
+def test_children_index():
+    parent_indices = np.array([2, 0, 2, 1, 0, 2])
+    indptr, children = children_index(parent_indices, n_parents=4)
+    assert np.array_equal(indptr, [0, 2, 3, 6, 6])
+    assert np.array_equal(children[indptr[0]:indptr[1]], [1, 4])
+    assert np.array_equal(children[indptr[2]:indptr[3]], [0, 2, 5])
+
+
+@pytest.mark.parametrize('bad_index', [4, -1])
+def test_children_index_rejects_out_of_range_parents(bad_index):
+    with pytest.raises(ValueError, match=f'parent index {bad_index} '):
+        children_index(np.array([2, bad_index, 0]), n_parents=4)
+
+
+def test_apply_inverse_recovers_poses():
+    pose = Pose(
+        positions=np.random.uniform(0, 100, size=(7, 3)),
+        orientations=_random_rotations(7),
+    )
+    transform = Transform(
+        shifts=np.random.normal(size=(3, 3)), rotations=_random_rotations(3)
+    )
+    positions, orientations = transform.apply(pose)
+    pose_indices, transform_indices = transform.expansion_indices(pose)
+    transformed = Pose(positions=positions, orientations=orientations)
+
+    recovered_positions, recovered_orientations = transform.apply_inverse(
+        transformed, transform_indices
+    )
+    expected_positions = pose.positions[pose_indices.reshape(-1)]
+    expected_orientations = pose.orientations[pose_indices.reshape(-1)]
+    assert np.allclose(recovered_positions, expected_positions.squeeze())
+    assert np.allclose(recovered_orientations, expected_orientations)
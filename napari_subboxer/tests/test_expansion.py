@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from ..eralda import Transform
+from ..expansion import expand_particles, expand_poses
+from ..pose_io import particles2pose
+from .test_eralda import _random_rotations
+
+
+def _particles(n=10):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'rlnCoordinateX': rng.uniform(0, 100, n),
+        'rlnCoordinateY': rng.uniform(0, 100, n),
+        'rlnCoordinateZ': rng.uniform(0, 100, n),
+        'rlnAngleRot': rng.uniform(-180, 180, n),
+        'rlnAngleTilt': rng.uniform(0, 180, n),
+        'rlnAnglePsi': rng.uniform(-180, 180, n),
+        'rlnClassNumber': rng.integers(1, 3, n),
+        'rlnMicrographName': rng.choice(['TS_01.mrc', 'TS_02.mrc'], n),
+    })
+
+
+def _transform(m=3):
+    return Transform(
+        shifts=np.random.normal(size=(m, 3)), rotations=_random_rotations(m)
+    )
+
+
+def test_expand_poses_accepts_memmap(tmp_path):
+    positions = np.lib.format.open_memmap(
+        tmp_path / 'positions.npy', mode='w+', dtype=float, shape=(10, 3)
+    )
+    positions[:] = np.random.uniform(0, 100, size=(10, 3))
+    orientations = _random_rotations(10)
+    transform = _transform()
+
+    expanded_positions, expanded_orientations, pose_indices, transform_indices = \
+        expand_poses(positions, orientations, transform)
+    assert expanded_positions.shape == (30, 3)
+    assert expanded_orientations.shape == (30, 3, 3)
+    expected = positions[pose_indices[7]] + \
+        orientations[pose_indices[7]] @ transform.shifts[transform_indices[7]][:, 0]
+    assert np.allclose(expanded_positions[7], expected)
+
+
+def test_expand_particles():
+    particles = _particles()
+    subparticles = expand_particles(particles, _transform(), where='rlnClassNumber == 1')
+
+    selected = particles[particles['rlnClassNumber'] == 1]
+    assert len(subparticles) == 3 * len(selected)
+    parent_indices = subparticles['subboxerParentIndex'].to_numpy()
+    assert set(parent_indices) == set(selected.index)
+    assert np.array_equal(
+        subparticles['rlnMicrographName'].to_numpy(),
+        particles['rlnMicrographName'].to_numpy()[parent_indices]
+    )
+
+    # identity transform reproduces the parents
+    identity = Transform(shifts=np.zeros((1, 3)), rotations=np.eye(3))
+    subparticles = expand_particles(particles, identity)
+    positions, orientations, _ = particles2pose(subparticles)
+    expected_positions, expected_orientations, _ = particles2pose(particles)
+    assert np.allclose(positions, expected_positions)
+    assert np.allclose(orientations, expected_orientations)
@@ -0,0 +1,44 @@
+import time
+from unittest.mock import MagicMock
+
+from ..interaction_scheduler import InteractionScheduler
+
+
+def test_scheduler_coalesces_updates(qtbot):
+    scheduler = InteractionScheduler(max_rate=60)
+    updates = []
+    for i in range(100):
+        scheduler.schedule('position', lambda i=i: updates.append(i))
+    other_update = MagicMock()
+    scheduler.schedule('rotation', other_update)
+
+    # only the latest update for each key is applied, on the next frame
+    qtbot.waitUntil(lambda: len(updates) > 0, timeout=1000)
+    assert updates == [99]
+    other_update.assert_called_once()
+    assert scheduler.n_scheduled['position'] == 100
+    assert scheduler.n_applied['position'] == 1
+    assert scheduler.update_rate('position') == 1
+    assert scheduler.update_rate() == 2
+
+
+def test_scheduler_flush():
+    scheduler = InteractionScheduler()
+    update = MagicMock()
+    scheduler.schedule('position', update)
+    scheduler.flush()
+    update.assert_called_once()
+    scheduler.flush()
+    update.assert_called_once()
+
+
+def test_scheduler_keeps_update_times_within_rate_window():
+    scheduler = InteractionScheduler(rate_window=0.05)
+    for _ in range(10):
+        scheduler.schedule('position', MagicMock())
+        scheduler.flush()
+    assert len(scheduler._update_times['position']) == 10
+    time.sleep(0.1)
+    scheduler.schedule('position', MagicMock())
+    scheduler.flush()
+    assert len(scheduler._update_times['position']) == 1
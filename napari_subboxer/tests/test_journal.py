@@ -0,0 +1,61 @@
+import mrcfile
+import numpy as np
+
+from ..data_model import SubParticleRegistry
+from ..journal import SessionJournal, journal_path, read_journal, \
+    registry_from_records
+
+
+def test_journal_replay(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    mrcfile.new(map_file, data=np.zeros((4, 4, 4), dtype=np.float32))
+    path = journal_path(map_file, cache_dir=tmp_path)
+
+    registry = SubParticleRegistry()
+    journal = SessionJournal(path, compact_every=3)
+    for i in range(4):
+        registry.add(position=(i, 0, 0))
+        journal.record_subparticle(registry, i)
+    registry.set_vectors(2, z_vector=(0, 1, 0))
+    journal.record_subparticle(registry, 2)
+    journal.record_removal(0)
+    journal.close()
+
+    records = read_journal(path)
+    assert list(records.keys()) == [1, 2, 3]
+    restored = registry_from_records(records)
+    assert np.allclose(restored.position(3), (3, 0, 0))
+    assert np.allclose(restored.vector(2, 'z'), (0, 1, 0))
+    assert not restored.defined('x').any()
+
+
+def test_journal_compaction_and_truncation(tmp_path):
+    path = tmp_path / 'session.jsonl'
+    registry = SubParticleRegistry()
+    registry.add(position=(1, 2, 3))
+    journal = SessionJournal(path, compact_every=10)
+    for i in range(25):
+        registry.set_position(0, (i, 0, 0))
+        journal.record_subparticle(registry, 0)
+    journal.close()
+    assert len(path.read_text().splitlines()) <= 10
+
+    # a crash while writing leaves a partial last line
+    with open(path, 'a') as file:
+        file.write('{"id": 0, "posi')
+    records = read_journal(path)
+    assert records[0]['position'] == [24, 0, 0]
+
+    # reopening compacts the journal
+    SessionJournal(path, records=records).close()
+    assert len(path.read_text().splitlines()) == 1
+
+
+def test_journal_write_errors_are_reported(tmp_path):
+    errors = []
+    journal = SessionJournal(
+        tmp_path / 'missing' / 'session.jsonl', error_callback=errors.append
+    )
+    journal.close()
+    assert len(errors) == 1 and journal.error is errors[0]
+    assert isinstance(journal.error, FileNotFoundError)
@@ -0,0 +1,52 @@
+import itertools
+import json
+from types import SimpleNamespace
+
+from .. import latency_monitor
+from ..latency_monitor import LatencyMonitor
+
+
+def test_latency_monitor_times_calls_and_drag_steps(tmp_path):
+    monitor = LatencyMonitor()
+    for duration in range(1, 101):
+        monitor.record('update', duration / 1000)
+    statistics = monitor.statistics()['update']
+    assert statistics['count'] == 100 and statistics['rate'] == 100
+    assert abs(statistics['p50'] - 50.5) < 1e-6 and statistics['max'] == 100
+
+    def drag(viewer, event):
+        if event == 'ignored':
+            return
+        yield  # press
+        for _ in range(3):  # moves
+            yield
+        # release
+
+    timed_drag = monitor.timed('drag', drag)
+    for _ in timed_drag(None, 'dragged'):
+        pass
+    list(timed_drag(None, 'ignored'))
+    assert monitor.n_events['drag'] == 5
+
+    timed_key = monitor.timed('key', lambda viewer: 'pressed')
+    assert timed_key(None) == 'pressed' and monitor.n_events['key'] == 1
+
+    output_file = tmp_path / 'latency.json'
+    monitor.dump(output_file, layer_memory={'map': 1024})
+    report = json.loads(output_file.read_text())
+    assert set(report['handlers']) == {'update', 'drag', 'key'}
+    assert report['layer_memory'] == {'map': 1024}
+
+
+def test_latency_monitor_keeps_only_recent_event_times(monkeypatch):
+    # one event per millisecond, without asking for the rate
+    clock = itertools.count(step=0.001)
+    monkeypatch.setattr(
+        latency_monitor, 'time', SimpleNamespace(perf_counter=lambda: next(clock))
+    )
+    monitor = LatencyMonitor(max_samples=10, rate_window=0.1)
+    for _ in range(10000):
+        monitor.record('move', 0.001)
+    assert monitor.n_events['move'] == 10000
+    assert len(monitor._times['move']) <= 101
+    assert len(monitor._durations['move']) == 10
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from napari.layers import Image
+from napari.utils.transforms import Affine
+
+from .. import layer_utils
+from ..layer_utils import data_to_world, set_binned_data, world_to_data
+
+
+def test_data_to_world_inverts_world_to_data():
+    layer = Image(
+        np.zeros((4, 5, 6)),
+        scale=(2, 3, 4),
+        translate=(1, 2, 3),
+        rotate=30,
+        shear=[0.1, 0.2, 0.3],
+        affine=Affine(scale=(1, 2, 1), translate=(5, 0, 0)),
+    )
+    position = np.array([1.5, 2, 3])
+    assert np.allclose(world_to_data(layer, data_to_world(layer, position)), position)
+
+    # binned voxel centers are at their unbinned positions
+    layer = Image(np.zeros((8, 8, 8)))
+    set_binned_data(layer, np.zeros((2, 2, 2)), binning=4)
+    assert np.allclose(data_to_world(layer, [1, 0, 1]), [5.5, 1.5, 5.5])
+
+
+@pytest.mark.parametrize('patch', [True, False])
+def test_updated_vectors_rows_match_a_new_layer(make_napari_viewer, monkeypatch,
+                                                patch):
+    if not patch:
+        monkeypatch.setattr(layer_utils, 'PATCHABLE_VECTORS_VERSIONS', ())
+    viewer = make_napari_viewer()
+    viewer.dims.ndisplay = 3
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(6, 2, 3))
+    layer = viewer.add_vectors(data.copy(), length=5, edge_width=2)
+    vectors = rng.normal(size=(2, 2, 3))
+    layer_utils.update_vectors_rows(layer, [1, 4], vectors)
+
+    data[[1, 4]] = vectors
+    expected = viewer.add_vectors(data, length=5, edge_width=2)
+    assert np.allclose(layer.data, expected.data)
+    assert np.allclose(layer._mesh_vertices, expected._mesh_vertices)
@@ -0,0 +1,23 @@
+import mrcfile
+import numpy as np
+
+from ..map_io import chunked_mean_std, open_normalised_map
+
+
+def test_chunked_mean_std():
+    volume = np.random.normal(loc=5, scale=3, size=(50, 20, 20))
+    mean, std = chunked_mean_std(volume, chunk_size=7)
+    assert np.isclose(mean, np.mean(volume))
+    assert np.isclose(std, np.std(volume))
+
+
+def test_open_normalised_map(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    volume = np.random.normal(loc=5, scale=3, size=(40, 30, 20))
+    mrcfile.new(map_file, data=volume.astype(np.float32))
+
+    normalised_map = open_normalised_map(map_file, chunk_size=16)
+    assert normalised_map.shape == volume.shape
+    assert normalised_map.dtype == np.float32
+    expected = (volume - np.mean(volume)) / np.std(volume)
+    assert np.allclose(np.asarray(normalised_map), expected, atol=1e-4)
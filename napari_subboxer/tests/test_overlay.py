@@ -0,0 +1,31 @@
+import numpy as np
+
+from ..overlay import GridIndex
+
+
+def test_grid_index_query_matches_brute_force():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 500, size=(20000, 3))
+    index = GridIndex(points, cell_size=40)
+
+    plane_position = np.array([250, 250, 250])
+    plane_normal = np.array([1, 1, 0]) / np.sqrt(2)
+    view_center = np.array([200, 300, 250])
+    view_direction = np.array([0, 0, 1])
+    found = index.query(
+        plane_position=plane_position,
+        plane_normal=plane_normal,
+        half_thickness=10,
+        view_center=view_center,
+        view_direction=view_direction,
+        view_radius=120,
+    )
+
+    in_slab = np.abs((points - plane_position) @ plane_normal) <= 10
+    in_view = np.linalg.norm((points - view_center)[:, :2], axis=1) <= 120
+    expected = np.flatnonzero(in_slab & in_view)
+    assert len(expected) > 0
+    assert np.array_equal(np.sort(found), expected)
+
+    # without a query region every point is returned
+    assert len(index.query()) == len(points)
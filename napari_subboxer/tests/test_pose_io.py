@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..pose_io import filter_particles, particles_on_map
+
+
+def test_filter_particles():
+    particles = pd.DataFrame({
+        'rlnClassNumber': [1, 3, 3, 2],
+        'rlnMaxValueProbDistribution': [0.5, 0.1, 0.3, 0.9],
+        'rlnMicrographName': ['a.mrc', 'a.mrc', 'b.mrc', 'c.mrc'],
+    })
+    selected = filter_particles(
+        particles, 'rlnClassNumber == 3 and rlnMaxValueProbDistribution > 0.2'
+    )
+    assert np.array_equal(selected.index, [2])
+
+    selected = filter_particles(
+        particles, 'rlnMicrographName in ["a.mrc", "c.mrc"]'
+    )
+    assert np.array_equal(selected.index, [0, 1, 3])
+
+
+def test_filter_particles_requires_boolean_expression():
+    particles = pd.DataFrame({'rlnClassNumber': [1, 3]})
+    with pytest.raises(ValueError):
+        filter_particles(particles, 'rlnClassNumber + 1')
+
+
+def test_particles_on_map():
+    particles = pd.DataFrame({
+        'rlnMicrographName': ['TS_01', 'TS_01.tomostar', 'TS_02.mrc', 'TS_011'],
+    })
+    selected = particles_on_map(particles, '/data/tomograms/TS_01.mrc')
+    assert np.array_equal(selected.index, [0, 1])
@@ -0,0 +1,50 @@
+import numpy as np
+
+from ..eralda import Pose
+from ..projection import project_poses, tilt_rotation_matrices
+
+
+def test_project_poses_untilted():
+    positions = np.random.uniform(low=0, high=100, size=(10, 3))
+    orientations = np.tile(np.eye(3), (10, 1, 1))
+    pose = Pose(positions=positions, orientations=orientations)
+
+    projected_positions, projected_orientations = project_poses(
+        pose, tilt_angles=[0], tomogram_size=(100, 100, 50)
+    )
+    assert projected_positions.shape == (1, 10, 2)
+    assert projected_orientations.shape == (1, 10, 3, 3)
+    assert np.allclose(projected_positions[0], positions[:, :2])
+    assert np.allclose(projected_orientations[0], orientations)
+
+
+def test_project_poses_batched_over_tilts():
+    tilt_angles = np.linspace(-60, 60, 41)
+    positions = np.random.uniform(low=0, high=100, size=(25, 3))
+    orientations = np.tile(np.eye(3), (25, 1, 1))
+    pose = Pose(positions=positions, orientations=orientations)
+    tomogram_size = (100, 100, 50)
+
+    projected_positions, projected_orientations = project_poses(
+        pose, tilt_angles=tilt_angles, tomogram_size=tomogram_size
+    )
+    assert projected_positions.shape == (41, 25, 2)
+
+    # check against a single tilt projected by hand
+    rotation = tilt_rotation_matrices(tilt_angles[3])[0]
+    centered = positions - np.array(tomogram_size) / 2
+    expected = (rotation @ centered.T).T[:, :2] + np.array([50, 50])
+    assert np.allclose(projected_positions[3], expected)
+    assert np.allclose(projected_orientations[3], rotation)
+
+
+def test_project_poses_identity_alignment():
+    positions = np.random.uniform(low=0, high=100, size=(5, 3))
+    orientations = np.tile(np.eye(3), (5, 1, 1))
+    pose = Pose(positions=positions, orientations=orientations)
+    xf = (np.tile(np.eye(2), (3, 1, 1)), np.zeros((3, 2)))
+
+    aligned = project_poses(pose, [-30, 0, 30], (100, 100, 50))
+    raw = project_poses(pose, [-30, 0, 30], (100, 100, 50), xf=xf)
+    assert np.allclose(aligned[0], raw[0])
+    assert np.allclose(aligned[1], raw[1])
@@ -0,0 +1,57 @@
+import mrcfile
+import numpy as np
+
+from ..pyramid import block_mean_bin, cached_pyramid, finest_level_within_budget, \
+    iter_cached_pyramid
+
+
+def test_block_mean_bin():
+    volume = np.arange(5 * 4 * 4, dtype=np.float32).reshape((5, 4, 4))
+    binned = block_mean_bin(volume)
+    assert binned.shape == (2, 2, 2)
+    assert np.isclose(binned[0, 0, 0], volume[:2, :2, :2].mean())
+    assert np.isclose(binned[1, 1, 0], volume[2:4, 2:4, :2].mean())
+
+
+def test_cached_pyramid_is_reused(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    volume = np.random.random((64, 64, 128)).astype(np.float32)
+    mrcfile.new(map_file, data=volume)
+
+    levels = cached_pyramid(map_file, volume, min_size=16, cache_dir=tmp_path)
+    assert [level.shape for level in levels] == \
+           [(64, 64, 128), (32, 32, 64), (16, 16, 32)]
+    assert np.allclose(levels[2], block_mean_bin(block_mean_bin(volume)))
+
+    cached_files = sorted(tmp_path.glob('*_level*.npy'))
+    modification_times = [f.stat().st_mtime_ns for f in cached_files]
+    levels = cached_pyramid(map_file, volume, min_size=16, cache_dir=tmp_path)
+    assert isinstance(levels[1], np.memmap)
+    assert [f.stat().st_mtime_ns for f in cached_files] == modification_times
+
+    assert finest_level_within_budget(levels, memory_budget=64 ** 3 * 4) == 1
+    assert finest_level_within_budget(levels, memory_budget=1) == 2
+
+
+def test_pyramid_progress_and_cancellation(tmp_path):
+    map_file = tmp_path / 'map.mrc'
+    volume = np.random.random((64, 64, 64)).astype(np.float32)
+    mrcfile.new(map_file, data=volume)
+
+    # closing the generator part way through leaves no partial files behind
+    construction = iter_cached_pyramid(map_file, volume, min_size=8, cache_dir=tmp_path)
+    next(construction)
+    construction.close()
+    assert list(tmp_path.glob('*.npy')) == []
+
+    construction = iter_cached_pyramid(map_file, volume, min_size=8, cache_dir=tmp_path)
+    progress = []
+    while True:
+        try:
+            progress.append(next(construction))
+        except StopIteration as finished:
+            levels = finished.value
+            break
+    assert len(levels) == 4
+    assert np.all(np.diff(progress) > 0)
+    assert np.isclose(progress[-1], 1)
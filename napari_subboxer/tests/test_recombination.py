@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from ..eralda import Pose, Transform
+from ..recombination import RotationAveraging, average_rotations, \
+    matrix2quaternion, quaternion2matrix, recombine
+from .test_eralda import _random_rotations
+
+
+def test_quaternion_roundtrip():
+    rotations = _random_rotations(100)
+    assert np.allclose(quaternion2matrix(matrix2quaternion(rotations)), rotations)
+
+
+@pytest.mark.parametrize('method', list(RotationAveraging))
+def test_average_rotations_of_identical_rotations(method):
+    rotations = _random_rotations(4)
+    groups, averages = average_rotations(
+        np.repeat(rotations, 3, axis=0), np.repeat([3, 0, 2, 1], 3), method
+    )
+    assert np.array_equal(groups, [0, 1, 2, 3])
+    assert np.allclose(averages, rotations[[1, 3, 2, 0]])
+
+
+@pytest.mark.parametrize('method', list(RotationAveraging))
+def test_recombine_recovers_parents(method):
+    parents = Pose(
+        positions=np.random.uniform(0, 100, size=(20, 3)),
+        orientations=_random_rotations(20),
+    )
+    transform = Transform(
+        shifts=np.random.normal(size=(4, 3)) * 10,
+        rotations=_random_rotations(4)
+    )
+    positions, orientations = transform.apply(parents)
+    pose_indices, transform_indices = transform.expansion_indices(parents)
+    subparticles = Pose(positions=positions, orientations=orientations)
+
+    parent_indices, parent_positions, parent_orientations, counts = recombine(
+        subparticles, transform, pose_indices, transform_indices, method
+    )
+    assert np.array_equal(parent_indices, np.arange(20))
+    assert np.all(counts == 4)
+    assert np.allclose(parent_positions, parents.positions.squeeze())
+    assert np.allclose(parent_orientations, parents.orientations)
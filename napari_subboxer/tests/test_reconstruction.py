@@ -0,0 +1,33 @@
+import mrcfile
+import numpy as np
+
+from ..reconstruction import quick_look_average
+
+
+def test_quick_look_average_at_identity_poses(tmp_path):
+    rng = np.random.default_rng(0)
+    box = rng.normal(size=(8, 8, 8)).astype(np.float32)
+    tomogram_files = []
+    positions = []
+    for i, corner in enumerate([(2, 3, 4), (10, 5, 1)]):
+        # the same subvolume, at a different (zyx) corner of each tomogram
+        tomogram = np.zeros((24, 24, 24), dtype=np.float32)
+        z, y, x = corner
+        tomogram[z:z + 8, y:y + 8, x:x + 8] = box
+        tomogram_file = tmp_path / f'tomogram_{i}.mrc'
+        mrcfile.write(tomogram_file, tomogram)
+        # boxes are centered on voxel box_size // 2, positions are xyz
+        for _ in range(2):
+            tomogram_files.append(str(tomogram_file))
+            positions.append((x + 4, y + 4, z + 4))
+
+    average = quick_look_average(
+        positions=np.array(positions, dtype=float),
+        orientations=np.tile(np.eye(3), (4, 1, 1)),
+        tomogram_files=np.array(tomogram_files),
+        box_size=8,
+        n_workers=1,
+    )
+    expected = (box - box.mean()) / box.std()
+    assert average.shape == (8, 8, 8)
+    assert np.allclose(average, expected, atol=1e-4)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from ..resampling import box_grid, oriented_box_coordinates, sample_trilinear
+
+
+def test_sample_trilinear_linear_function():
+    z, y, x = np.meshgrid(*[np.arange(16)] * 3, indexing='ij')
+    volume = (2 * z + 3 * y - x).astype(np.float32)
+    coordinates = np.random.uniform(low=0, high=15, size=(100, 3))
+    expected = coordinates @ np.array([2, 3, -1])
+    assert np.allclose(sample_trilinear(volume, coordinates), expected, atol=1e-4)
+
+
+def test_sample_trilinear_out_of_bounds_is_zero():
+    volume = np.ones((8, 8, 8))
+    samples = sample_trilinear(volume, [[-1, 0, 0], [4, 4, 4], [0, 0, 7.5]])
+    assert np.allclose(samples, [0, 1, 0])
+
+
+def test_identity_oriented_box_matches_slicing():
+    volume = np.random.random((32, 32, 32)).astype(np.float32)
+    coordinates = oriented_box_coordinates(
+        positions=[[10, 12, 14]], orientations=np.eye(3), grid=box_grid(8)
+    )
+    box = sample_trilinear(volume, coordinates)[0]
+    assert np.allclose(box, volume[10:18, 8:16, 6:14])
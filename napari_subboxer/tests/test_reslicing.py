@@ -0,0 +1,53 @@
+import numpy as np
+
+from ..reslicing import PlaneReslicer, plane_basis
+
+
+def test_plane_basis():
+    rows, columns = plane_basis([1, 0, 0])
+    assert np.allclose(rows, [0, 1, 0]) and np.allclose(columns, [0, 0, 1])
+
+    normal = np.array([1, 2, 3]) / np.sqrt(14)
+    rows, columns = plane_basis(normal)
+    basis = np.stack((normal, rows, columns))
+    assert np.allclose(basis @ basis.T, np.eye(3))
+
+
+def test_reslice_reuses_slices_when_shifted_along_normal():
+    volume = np.random.default_rng(0).normal(size=(30, 40, 50))
+    reslicer = PlaneReslicer(volume, size=32)
+    position = np.array([15, 20, 25])
+
+    image = reslicer.reslice(position, normal=[1, 0, 0], thickness=3)
+    assert image.shape == (32, 32)
+    assert reslicer.n_sampled_slices == 3
+    # grid is centered on the plane position, rows along y and columns along x
+    assert np.allclose(image[16 - 20 + 5, 16 - 25 + 10], volume[14:17, 5, 10].mean())
+
+    image = reslicer.reslice(position + [1, 0, 0], normal=[1, 0, 0], thickness=3)
+    assert reslicer.n_sampled_slices == 4
+    assert np.allclose(image[16 - 20 + 5, 16 - 25 + 10], volume[15:18, 5, 10].mean())
+
+    # moving within the plane or changing the normal resamples everything
+    reslicer.reslice(position + [0, 1, 0], normal=[1, 0, 0], thickness=3)
+    assert reslicer.n_sampled_slices == 7
+    reslicer.reslice(position, normal=[1, 1, 0], thickness=1)
+    assert reslicer.n_sampled_slices == 8
+
+
+def test_slab_slice_count_is_independent_of_depth():
+    volume = np.random.default_rng(0).normal(size=(30, 40, 50))
+    reslicer = PlaneReslicer(volume, size=16)
+    sampled_depths = []
+    sample = reslicer._slice
+    reslicer._slice = lambda depth: sampled_depths.append(depth) or sample(depth)
+
+    position = np.array([15, 20, 25])
+    reslicer.reslice(position, normal=[1, 0, 0])
+    for thickness in (1, 3, 10):
+        for depth in (0, 0.3, 0.5, 1.3, 2.7, -1.5):
+            sampled_depths.clear()
+            reslicer.reslice(position + [depth, 0, 0], [1, 0, 0], thickness)
+            assert len(sampled_depths) == thickness
+            # centered on the plane to the nearest slice
+            assert abs(np.mean(sampled_depths) - depth) <= 0.5
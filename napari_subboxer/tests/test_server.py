@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import starfile
+
+from ..eralda import Pose
+from ..server import PoseServer, submit
+
+
+@pytest.fixture
+def server():
+    n = 50
+    poses = Pose(
+        positions=np.random.uniform(0, 100, size=(n, 3)),
+        orientations=np.tile(np.eye(3), (n, 1, 1)),
+    )
+    sources = np.random.choice(['TS_01.mrc', 'TS_02.mrc'], size=n)
+    server = PoseServer(poses=poses, sources=sources, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transformations(tmp_path):
+    transformations_file = tmp_path / 'transformations.star'
+    df = pd.DataFrame({
+        'subboxerShiftX': [10., 0., 0.],
+        'subboxerShiftY': [0., 5., 0.],
+        'subboxerShiftZ': [0., 0., 2.],
+        'subboxerAngleRot': [0., 0., 0.],
+        'subboxerAngleTilt': [0., 0., 0.],
+        'subboxerAnglePsi': [0., 0., 0.],
+    })
+    starfile.write(df, transformations_file)
+    return transformations_file
+
+
+def test_apply_on_localhost(server, transformations, tmp_path):
+    star = submit(transformations, url=server.url)
+    output = tmp_path / 'output.star'
+    output.write_text(star)
+    df = starfile.read(output)
+
+    assert len(df) == 3 * server.poses.count
+    expected_x = server.poses.positions[:, 0, 0] + 10
+    assert np.allclose(
+        df['rlnCoordinateX'][:server.poses.count], expected_x, atol=1e-5
+    )
+
+
+def test_summary_on_localhost(server, transformations):
+    summary = submit(transformations, url=server.url, summary=True)
+    assert summary['n_poses'] == server.poses.count
+    assert summary['n_transformations'] == 3
+    assert summary['n_subparticles'] == 3 * server.poses.count
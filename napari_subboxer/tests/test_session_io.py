@@ -0,0 +1,42 @@
+import numpy as np
+
+from ..data_model import SubParticleRegistry
+from ..session_io import SubboxerSession, read_session, write_session
+
+
+def test_session_round_trip(tmp_path):
+    registry = SubParticleRegistry()
+    for i in range(100):
+        registry.add(position=np.random.random(3))
+    registry.set_vectors(7, z_vector=(0, 0, 1))
+    registry.initialise_xy_vectors(7)
+    registry.remove(3)
+
+    session = SubboxerSession(
+        map_file=str(tmp_path / 'map.mrc'),
+        map_fingerprint='abc',
+        subparticles=registry,
+        active_subparticle_id=7,
+        mode='define_z_axis',
+        plane_position=(1, 2, 3),
+        plane_normal=(0, 1, 0),
+        plane_thickness=5,
+        camera_center=(4, 5, 6),
+        camera_angles=(10, 20, 30),
+        camera_zoom=1.5,
+    )
+    session_file = tmp_path / 'session.npz'
+    write_session(session, session_file)
+    restored = read_session(session_file)
+
+    assert restored.map_file == session.map_file
+    assert restored.mode == 'define_z_axis'
+    assert restored.plane_position == (1, 2, 3)
+    assert restored.camera_zoom == 1.5
+    subparticles = restored.subparticles
+    assert list(subparticles.ids) == list(registry.ids)
+    assert 3 not in subparticles
+    assert subparticles.next_id == 100
+    assert np.allclose(subparticles.positions, registry.positions)
+    assert np.allclose(subparticles.orientation(7), registry.orientation(7))
+    assert not subparticles.defined('z')[subparticles.row(8)]
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import starfile
+from typer.testing import CliRunner
+
+from ..cli import cli
+from ..sharding import ShardingStrategy, assign_shards, merge, shard
+
+
+def _particles(n=100):
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'rlnCoordinateX': rng.uniform(0, 100, n),
+        'rlnMicrographName': rng.choice([f'TS_{i:02d}.mrc' for i in range(7)], n),
+        'rlnOpticsGroup': np.ones(n, dtype=int),
+    })
+
+
+def test_assign_shards_keeps_micrographs_together():
+    names = _particles()['rlnMicrographName'].to_numpy()
+    for strategy in ShardingStrategy:
+        shards = assign_shards(names, n_shards=3, strategy=strategy)
+        assert np.array_equal(shards, assign_shards(names, 3, strategy))
+        for name in np.unique(names):
+            assert len(np.unique(shards[names == name])) == 1
+
+
+def test_balanced_shards_are_balanced():
+    names = np.repeat(['a', 'b', 'c', 'd'], [40, 30, 20, 10])
+    shards = assign_shards(names, n_shards=2, strategy='balanced')
+    assert np.array_equal(np.bincount(shards), [50, 50])
+
+
+def test_shard_merge_roundtrip(tmp_path):
+    particles = _particles()
+    optics = pd.DataFrame({'rlnOpticsGroup': [1], 'rlnImagePixelSize': [1.35]})
+    star_file = tmp_path / 'particles.star'
+    starfile.write({'optics': optics, 'particles': particles}, star_file)
+
+    shard_files = shard(star_file, tmp_path / 'shards', n_shards=3)
+    merge(shard_files, tmp_path / 'merged.star')
+
+    merged = starfile.read(tmp_path / 'merged.star')
+    assert merged['optics'].equals(optics)
+    # rows in the original file are kept through sharding
+    merged_particles = merged['particles'].sort_values('subboxerParticleIndex')
+    assert np.array_equal(merged_particles['subboxerParticleIndex'], np.arange(100))
+    pd.testing.assert_frame_equal(
+        merged_particles.drop(columns='subboxerParticleIndex')
+        .reset_index(drop=True),
+        particles,
+        check_exact=False
+    )
+
+
+def test_sharded_apply_recombines_like_single_node(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 40
+    particles = pd.DataFrame({
+        'rlnCoordinateX': rng.uniform(0, 100, n),
+        'rlnCoordinateY': rng.uniform(0, 100, n),
+        'rlnCoordinateZ': rng.uniform(0, 100, n),
+        'rlnAngleRot': rng.uniform(-180, 180, n),
+        'rlnAngleTilt': rng.uniform(0, 180, n),
+        'rlnAnglePsi': rng.uniform(-180, 180, n),
+        'rlnMicrographName': rng.choice([f'TS_{i:02d}.mrc' for i in range(5)], n),
+    })
+    star_file = tmp_path / 'particles.star'
+    starfile.write(particles, star_file)
+    transformations = tmp_path / 'transformations.star'
+    starfile.write(pd.DataFrame({
+        'subboxerShiftX': [5.0, -3.0], 'subboxerShiftY': [0.0, 2.0],
+        'subboxerShiftZ': [1.0, 4.0], 'subboxerAngleRot': [0.0, 30.0],
+        'subboxerAngleTilt': [0.0, 60.0], 'subboxerAnglePsi': [0.0, -45.0],
+    }), transformations)
+
+    runner = CliRunner()
+
+    def run(*args):
+        result = runner.invoke(cli, [str(arg) for arg in args])
+        assert result.exit_code == 0, result.output
+
+    run('apply', transformations, star_file, tmp_path / 'single.star')
+    run('recombine', transformations, tmp_path / 'single.star',
+        tmp_path / 'single_parents.star')
+
+    run('shard', star_file, tmp_path / 'shards', '--n-shards', 3)
+    shard_files = sorted((tmp_path / 'shards').glob('*.star'))
+    for shard_file in shard_files:
+        run('apply', transformations, shard_file,
+            shard_file.with_suffix('.subparticles'))
+    run('merge', *[f.with_suffix('.subparticles') for f in shard_files],
+        '--output', tmp_path / 'merged.star')
+    run('recombine', transformations, tmp_path / 'merged.star',
+        tmp_path / 'sharded_parents.star')
+
+    def parents(star_file):
+        parents = starfile.read(star_file)
+        return parents.sort_values('subboxerParentIndex').reset_index(drop=True)
+
+    single, sharded = parents(tmp_path / 'single_parents.star'), \
+        parents(tmp_path / 'sharded_parents.star')
+    assert len(sharded) == n
+    pd.testing.assert_frame_equal(sharded, single, check_exact=False)
+    # parents are recovered at their original positions and micrographs
+    assert np.allclose(sharded['rlnCoordinateX'], particles['rlnCoordinateX'])
+    assert np.array_equal(
+        sharded['rlnMicrographName'], particles['rlnMicrographName']
+    )
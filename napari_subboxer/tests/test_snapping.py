@@ -0,0 +1,39 @@
+import numpy as np
+
+from ..filters import gaussian_kernel, separable_filter
+from ..snapping import DensitySnapper
+
+
+def _volume_with_blob(center, shape=(64, 80, 72), sigma=2.5, seed=0):
+    volume = np.random.default_rng(seed).normal(scale=0.2, size=shape)
+    grid = np.indices(shape).reshape((3, -1)).T
+    distance2 = np.sum((grid - center) ** 2, axis=1).reshape(shape)
+    return (volume + 3 * np.exp(-distance2 / (2 * sigma ** 2))).astype(np.float32)
+
+
+def test_filtered_region_matches_whole_volume_filter():
+    volume = np.random.default_rng(0).normal(size=(40, 50, 45))
+    snapper = DensitySnapper(volume, sigma=1.5, block_size=16)
+    kernel = gaussian_kernel(1.5)
+    halo = len(kernel) // 2
+    expected = separable_filter(np.pad(volume, halo, mode='edge'), kernel)
+
+    start, stop = np.array([5, 12, 30]), np.array([37, 50, 45])
+    region = snapper.filtered_region(start, stop)
+    assert np.allclose(region, expected[5:37, 12:50, 30:45], atol=1e-5)
+
+
+def test_snap_to_blob():
+    center = np.array([30.3, 41.0, 20.6])
+    volume = _volume_with_blob(center)
+    for method in 'maximum', 'centroid':
+        snapper = DensitySnapper(volume, radius=6, method=method)
+        snapped = snapper.snap(center + [3, -2, 2])
+        assert np.linalg.norm(snapped - center) < 1
+
+    dark_snapper = DensitySnapper(-volume, invert=True)
+    assert np.linalg.norm(dark_snapper.snap(center + [2, 2, 0]) - center) < 1
+
+    # positions outside the map are not moved
+    outside = np.array([-5.0, 10, 10])
+    assert np.all(snapper.snap(outside) == outside)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from ..subbox_preview import SubboxPreviewer
+
+
+def test_subbox_preview_sections_and_projection():
+    volume = np.random.default_rng(0).normal(size=(40, 50, 60))
+    previewer = SubboxPreviewer(volume, box_size=16)
+    position = np.array([30, 25, 20])  # xyz
+
+    sections = previewer.preview(position, np.eye(3))
+    assert sections.shape == (16, 48)
+    xy, xz, yz = np.split(sections, 3, axis=1)
+    assert np.allclose(xy, volume[20, 17:33, 22:38])
+    assert np.allclose(xz, volume[12:28, 25, 22:38])
+    assert np.allclose(yz, volume[12:28, 17:33, 30])
+
+    # a box rotated by -90 degrees about x has its z axis along y
+    rotation = np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]])
+    rotated_xz = np.split(previewer.preview(position, rotation), 3, axis=1)[1]
+    assert np.allclose(rotated_xz, volume[20, 17:33, 22:38])
+
+    previewer.mode = 'projection'
+    projection = previewer.preview(position, np.eye(3))
+    assert np.allclose(projection, volume[12:28, 17:33, 22:38].mean(axis=0))
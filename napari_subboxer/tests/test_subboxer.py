@@ -0,0 +1,240 @@
+import mrcfile
+import numpy as np
+import pandas as pd
+import pytest
+import starfile
+
+from ..journal import journal_path, read_journal
+from ..subboxer import Subboxer
+
+
+@pytest.fixture
+def make_subboxer(make_napari_viewer, tmp_path, monkeypatch):
+    """Factory of Subboxers in their own viewer, caching in `tmp_path`."""
+    monkeypatch.setenv('NAPARI_SUBBOXER_CACHE', str(tmp_path / 'cache'))
+    subboxers = []
+
+    def make_subboxer(**kwargs) -> Subboxer:
+        subboxers.append(Subboxer(make_napari_viewer(), **kwargs))
+        return subboxers[-1]
+
+    yield make_subboxer
+    for subboxer in subboxers:
+        subboxer.close_journal()
+
+
+@pytest.fixture
+def subboxer(make_subboxer):
+    return make_subboxer()
+
+
+def write_map(map_file, shape=(32, 32, 32), seed: int = 0) -> str:
+    volume = np.random.default_rng(seed).normal(size=shape)
+    mrcfile.write(map_file, volume.astype(np.float32))
+    return str(map_file)
+
+
+@pytest.fixture
+def map_file(tmp_path):
+    return write_map(tmp_path / 'map.mrc')
+
+
+def add_subparticle(subboxer: Subboxer, position) -> int:
+    """Add a subparticle at a zyx position as a click would."""
+    subboxer.subparticles_layer.add(position)
+    subboxer._on_add_subparticle_center()
+    return int(subboxer.subparticles_layer.properties['id'][-1])
+
+
+def test_deleted_points_are_removed_from_registry(subboxer, map_file):
+    subboxer.open_map(map_file, blocking=True)
+    ids = [add_subparticle(subboxer, (i, 2 * i, 3 * i)) for i in range(4)]
+    subboxer.subparticles.set_vectors(ids[3], z_vector=(0, 0, 1))
+    subboxer.update_subparticle_vectors(ids[3])
+
+    # delete the second point as napari does
+    subboxer.subparticles_layer.selected_data = {1}
+    subboxer.subparticles_layer.remove_selected()
+    assert subboxer.subparticle_ids.tolist() == [ids[0], ids[3], ids[2]]
+    assert subboxer._vector_layer_rows['z'].tolist() == [-1, 0, -1]
+
+    # points are selected by id although registry rows have moved
+    subboxer.active_subparticle_id = ids[3]
+    assert subboxer.subparticles_layer.selected_data == {2}
+    assert subboxer.active_subparticle_id == ids[3]
+    for _ in range(3):
+        subboxer.next_subparticle()
+    assert subboxer.active_subparticle_id == ids[3]
+
+    subboxer.close_journal()
+    assert set(read_journal(journal_path(map_file))) == {ids[0], ids[2], ids[3]}
+
+
+@pytest.mark.parametrize('single_vectors_layer', [False, True])
+def test_updated_vectors_match_repopulated_layers(make_subboxer, map_file,
+                                                  single_vectors_layer):
+    subboxer = make_subboxer(single_vectors_layer=single_vectors_layer)
+    subboxer.open_map(map_file, blocking=True)
+    rng = np.random.default_rng(1)
+    ids = [add_subparticle(subboxer, position)
+           for position in rng.uniform(0, 32, size=(5, 3))]
+    for id in ids[:4]:
+        subboxer.subparticles.set_vectors(id, z_vector=rng.normal(size=3))
+        subboxer.subparticles.initialise_xy_vectors(id)
+    subboxer.populate_subparticle_vectors_layers()
+
+    # as a drag would, move a subparticle and change its axes
+    subboxer.subparticles.set_position(ids[2], (1, 2, 3))
+    subboxer.subparticles.set_vectors(ids[2], z_vector=(0, 0, 1))
+    subboxer.subparticles.initialise_xy_vectors(ids[2])
+    subboxer.update_subparticle_vectors(ids[2])
+    layers = [layer for _, layer in subboxer._subparticle_vectors_layers]
+    updated = [(layer._data.copy(), layer._mesh_vertices.copy())
+               for layer in layers]
+
+    subboxer.populate_subparticle_vectors_layers()
+    for layer, (data, mesh_vertices) in zip(layers, updated):
+        assert np.allclose(data, layer._data)
+        assert mesh_vertices.shape == layer._mesh_vertices.shape
+        assert np.allclose(mesh_vertices, layer._mesh_vertices)
+
+
+def test_failed_writes_are_emitted(subboxer, map_file, tmp_path, qtbot):
+    subboxer.open_map(map_file, blocking=True)
+    add_subparticle(subboxer, (1, 2, 3))
+    errors = []
+    subboxer.write_failed.connect(lambda path, message: errors.append(path))
+    output_file = tmp_path / 'missing' / 'transformations.star'
+    subboxer.save_subparticles(output_file)
+    qtbot.waitUntil(lambda: len(errors) > 0, timeout=5000)
+    assert errors == [str(output_file)]
+
+
+def test_overlay_only_shows_particles_on_displayed_map(subboxer, map_file,
+                                                       tmp_path):
+    subboxer.open_map(map_file, blocking=True)
+    particles_file = tmp_path / 'particles.star'
+    starfile.write(pd.DataFrame({
+        'rlnCoordinateX': [1., 2., 3.],
+        'rlnCoordinateY': [4., 5., 6.],
+        'rlnCoordinateZ': [7., 8., 9.],
+        'rlnAngleRot': [0., 0., 0.],
+        'rlnAngleTilt': [0., 0., 0.],
+        'rlnAnglePsi': [0., 0., 0.],
+        'rlnMicrographName': ['map.tomostar', 'other.tomostar', 'map.tomostar'],
+    }), particles_file)
+    add_subparticle(subboxer, (16, 16, 17))
+    transformations_file = tmp_path / 'transformations.star'
+    subboxer.save_subparticles(transformations_file, blocking=True)
+
+    subboxer.show_expanded_subparticles(particles_file, transformations_file)
+    assert np.allclose(subboxer.overlay.positions[:, 2], [2, 4])
+
+    subboxer.show_expanded_subparticles(
+        particles_file, transformations_file, all_micrographs=True
+    )
+    assert len(subboxer.overlay.positions) == 3
+    subboxer.hide_expanded_subparticles()
+
+
+def test_snapping_defaults_to_dark_density(subboxer, tmp_path):
+    map_file = tmp_path / 'dark.mrc'
+    z, y, x = np.mgrid[:32, :32, :32]
+    blob = np.exp(-((z - 16) ** 2 + (y - 14) ** 2 + (x - 18) ** 2) / 8)
+    mrcfile.write(map_file, (-blob).astype(np.float32))
+    subboxer.open_map(map_file, blocking=True)
+    subboxer.snap_to_density = True
+    assert np.allclose(subboxer._snap_position(np.array([15, 15, 16])), [16, 14, 18])
+
+    subboxer.dark_density = False
+    snapped = subboxer._snap_position(np.array([15, 15, 16]))
+    assert np.linalg.norm(snapped - [16, 14, 18]) > 1
+
+
+def test_maps_keep_their_own_subparticles(subboxer, tmp_path):
+    map_a = write_map(tmp_path / 'a.mrc', shape=(64, 64, 64), seed=1)
+    map_b = write_map(tmp_path / 'b.mrc', seed=2)
+    subboxer.plane_memory_budget = 64 ** 3 * 4
+    subboxer.volume_memory_budget = 32 ** 3 * 4
+
+    subboxer.open_map(map_a, blocking=True)
+    # the full map stays memory-mapped, only binned levels are in memory
+    assert isinstance(subboxer.plane_layer.data, np.memmap)
+    assert not isinstance(subboxer.volume_layer.data, np.memmap)
+    assert subboxer.map_cache.nbytes == 32 ** 3 * 4
+    id_a = add_subparticle(subboxer, (10, 20, 30))
+
+    subboxer.open_map(map_b, blocking=True)
+    assert subboxer.open_maps == [map_a, map_b]
+    assert subboxer.n_subparticles == 0
+    id_b = add_subparticle(subboxer, (1, 2, 3))
+    add_subparticle(subboxer, (4, 5, 6))
+    subboxer.plane_layer.experimental_slicing_plane.normal = (1, 0, 0)
+
+    subboxer.switch_map(map_a, blocking=True)
+    assert subboxer.map_file == map_a
+    assert subboxer.subparticle_ids.tolist() == [id_a]
+    assert np.allclose(subboxer.subparticles.position(id_a), (30, 20, 10))
+    add_subparticle(subboxer, (7, 8, 9))
+
+    subboxer.switch_map(map_b, blocking=True)
+    assert subboxer.n_subparticles == 2
+    assert np.allclose(subboxer.subparticles.position(id_b), (3, 2, 1))
+    assert np.allclose(
+        subboxer.plane_layer.experimental_slicing_plane.normal, (1, 0, 0)
+    )
+
+    # closing a map displays the other, with the edits made on it
+    subboxer.close_map(blocking=True)
+    assert subboxer.open_maps == [map_a] and subboxer.map_file == map_a
+    assert subboxer.n_subparticles == 2
+    subboxer.close_map()
+    assert subboxer.open_maps == [] and subboxer.n_subparticles == 0
+
+    # edits were journaled per map
+    subboxer.open_map(map_b, blocking=True)
+    assert subboxer.n_subparticles == 2
+    subboxer.open_map(map_a, blocking=True)
+    assert subboxer.n_subparticles == 2
+
+
+def test_closing_a_map_disables_editing_until_the_next_loads(subboxer,
+                                                             tmp_path):
+    map_a = write_map(tmp_path / 'a.mrc', seed=1)
+    map_b = write_map(tmp_path / 'b.mrc', seed=2)
+    subboxer.open_map(map_a, blocking=True)
+    subboxer.open_map(map_b, blocking=True)
+    add_subparticle(subboxer, (1, 2, 3))
+    subboxer.map_cache.pop((map_a, subboxer.map_cache.keys[0][1]))
+
+    # map a is loaded again in the background
+    subboxer.close_map()
+    assert subboxer.loading_map and subboxer.map_file is None
+    assert subboxer.n_subparticles == 0
+    assert not subboxer._callbacks_connected
+    assert not subboxer.plane_layer.visible
+    subboxer.cancel_map_loading()
+
+
+def test_opening_a_map_while_another_loads(subboxer, tmp_path, qtbot):
+    map_a = write_map(tmp_path / 'a.mrc', seed=1)
+    map_b = write_map(tmp_path / 'b.mrc', seed=2)
+    loaded, cancelled = [], []
+    subboxer.map_loaded.connect(loaded.append)
+    subboxer.map_loading_cancelled.connect(lambda: cancelled.append(True))
+
+    subboxer.open_map(map_a)
+    worker_a = subboxer._map_loading_worker
+    subboxer.open_map(map_b)
+    qtbot.waitUntil(lambda: not subboxer.loading_map, timeout=10000)
+    # let the stopped worker deliver any late signals
+    qtbot.waitUntil(lambda: not worker_a.is_running, timeout=10000)
+    qtbot.wait(50)
+    assert loaded == [map_b] and cancelled == []
+    assert subboxer.map_file == map_b and subboxer.open_maps == [map_b]
+
+    # cancelling is reported
+    subboxer.open_map(map_a)
+    subboxer.cancel_map_loading()
+    qtbot.wait(50)
+    assert cancelled == [True] and subboxer.map_file == map_b
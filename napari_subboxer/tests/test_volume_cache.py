@@ -0,0 +1,25 @@
+import numpy as np
+
+from ..volume_cache import VolumeCache
+
+
+def test_least_recently_used_volumes_are_evicted():
+    cache = VolumeCache(memory_budget=3e3)
+    volumes = {key: np.zeros(1000, dtype=np.uint8) for key in 'abcd'}
+    for key in 'abc':
+        cache.put(key, volumes[key], nbytes=volumes[key].nbytes)
+    assert cache.keys == ['a', 'b', 'c'] and cache.nbytes == 3000
+
+    # using 'a' makes 'b' the least recently used
+    assert cache.get('a') is volumes['a']
+    cache.put('d', volumes['d'], nbytes=volumes['d'].nbytes)
+    assert cache.keys == ['c', 'a', 'd']
+    assert 'b' not in cache and cache.get('b') is None
+    assert cache.n_evicted == 1
+
+    # the latest volume is kept even if over budget
+    cache.put('e', np.zeros(5000), nbytes=5000)
+    assert cache.keys == ['e']
+
+    cache.set_memory_budget(1e3)
+    assert cache.pop('e') is not None and len(cache) == 0
@@ -0,0 +1,107 @@
+import numpy as np
+
+from ..progress import exhaust
+from ..volume_statistics import RunningStatistics, iter_volume_statistics, \
+    slab_length
+
+
+def test_running_statistics_match_numpy():
+    values = np.random.default_rng(0).normal(loc=3, scale=2, size=(64, 32, 32))
+    statistics = exhaust(iter_volume_statistics(values, chunk_size=8))
+    assert statistics.count == values.size
+    assert np.isclose(statistics.mean, values.mean())
+    assert np.isclose(statistics.std, values.std())
+    assert statistics.min == values.min() and statistics.max == values.max()
+    assert statistics.counts.sum() == values.size
+
+    q = [0.5, 5, 50, 95, 99.5]
+    tolerance = 2 * statistics.bin_width
+    assert np.allclose(statistics.percentiles(q), np.percentile(values, q), atol=tolerance)
+
+    # normalised statistics follow from the statistics of the values
+    normalised = statistics.scaled(offset=values.mean(), scale=values.std())
+    assert np.isclose(normalised.mean, 0) and np.isclose(normalised.std, 1)
+    expected = np.percentile((values - values.mean()) / values.std(), q)
+    assert np.allclose(normalised.percentiles(q), expected, atol=tolerance / values.std())
+
+
+def test_histogram_range_grows_and_merges():
+    statistics = RunningStatistics(n_bins=64)
+    statistics.update(np.linspace(0, 1, 100))
+    statistics.update(np.array([5.0, -3.0]))
+    assert statistics.bin_edges[0] <= -3 and statistics.bin_edges[-1] > 5
+    assert statistics.counts.sum() == 102
+
+    other = RunningStatistics(n_bins=64)
+    other.update(np.linspace(10, 20, 50))
+    statistics.merge(other)
+    assert statistics.counts.sum() == 152
+    assert statistics.max == 20 and statistics.min == -3
+    values = np.concatenate((np.linspace(0, 1, 100), [5, -3], np.linspace(10, 20, 50)))
+    assert np.isclose(statistics.mean, values.mean())
+    assert np.isclose(statistics.std, values.std())
+
+
+def test_constant_first_chunk_does_not_fix_the_bin_width(tmp_path):
+    values = np.random.default_rng(4).normal(loc=0.005, scale=0.001, size=100000)
+    values = np.concatenate((np.zeros(1000), values))
+    statistics = RunningStatistics()
+    statistics.update(values[:1000])
+    assert np.all(statistics.percentiles([1, 99]) == 0)
+    statistics.update(values[1000:])
+    assert statistics.counts.sum() == values.size
+
+    q = [1, 50, 99]
+    tolerance = 4 * statistics.bin_width
+    assert tolerance < 1e-4
+    assert np.allclose(statistics.percentiles(q), np.percentile(values, q), atol=tolerance)
+    normalised = statistics.scaled(offset=values.mean(), scale=values.std())
+    expected = np.percentile((values - values.mean()) / values.std(), q)
+    assert np.allclose(normalised.percentiles(q), expected, atol=tolerance / values.std())
+
+    # constant statistics merge and round trip without a histogram
+    merged, constant = RunningStatistics(), RunningStatistics()
+    constant.update(np.zeros(1000))
+    constant.save(tmp_path / 'constant.npz')
+    constant = RunningStatistics.load(tmp_path / 'constant.npz')
+    merged.merge(constant)
+    other = RunningStatistics()
+    other.update(values[1000:])
+    merged.merge(other)
+    assert merged.counts.sum() == values.size
+    assert np.allclose(merged.percentiles(q), np.percentile(values, q), atol=tolerance)
+
+
+def test_subsampled_statistics_are_reproducible():
+    values = np.random.default_rng(1).normal(size=(64, 64, 64))
+    first = exhaust(iter_volume_statistics(values, chunk_size=16, subsample=0.25, seed=3))
+    second = exhaust(iter_volume_statistics(values, chunk_size=16, subsample=0.25, seed=3))
+    assert first.count == 16 * 16 ** 3
+    assert first.mean == second.mean and np.all(first.counts == second.counts)
+    assert abs(first.std - 1) < 0.05
+
+
+def test_slabs_and_pieces_are_bounded():
+    values = np.random.default_rng(2).normal(size=(40, 30, 20)).astype(np.float32)
+    section_bytes = 30 * 20 * 4
+    assert slab_length(values, memory_budget=3.5 * section_bytes) == 3
+    assert slab_length(values, memory_budget=1) == 1
+
+    # one section per slab, each split into pieces
+    RunningStatistics.max_piece_size = 100
+    try:
+        progress = iter_volume_statistics(values, memory_budget=section_bytes)
+        n_slabs = 0
+        while True:
+            try:
+                next(progress)
+                n_slabs += 1
+            except StopIteration as stop:
+                statistics = stop.value
+                break
+    finally:
+        RunningStatistics.max_piece_size = 2 ** 20
+    assert n_slabs == 40
+    assert statistics.count == values.size
+    assert np.isclose(statistics.mean, values.mean(dtype=np.float64))
+    assert np.isclose(statistics.std, values.std(dtype=np.float64))
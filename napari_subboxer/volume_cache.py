@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class VolumeCache:
+    """Least recently used cache of volumes within a memory budget.
+
+    Entries are stored with their size in bytes, the least recently used
+    entries are evicted once the total exceeds `memory_budget`. The most
+    recently added entry is always kept, even if it alone exceeds the budget.
+    """
+    def __init__(self, memory_budget: float = 4e9):
+        self.memory_budget = memory_budget
+        self._entries: Dict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self.n_evicted = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def keys(self) -> List[Hashable]:
+        """Keys from least to most recently used."""
+        return list(self._entries)
+
+    @property
+    def values(self) -> List[Any]:
+        """Values from least to most recently used."""
+        return [value for value, _ in self._entries.values()]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        self._entries[key] = (value, int(nbytes))
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.pop(key, None)
+        return None if entry is None else entry[0]
+
+    def set_memory_budget(self, memory_budget: float):
+        self.memory_budget = memory_budget
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > 1 and self.nbytes > self.memory_budget:
+            self._entries.popitem(last=False)
+            self.n_evicted += 1
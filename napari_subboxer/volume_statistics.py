@@ -0,0 +1,231 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .progress import ProgressGenerator
+
+
+class RunningStatistics:
+    """Count, mean, variance, min, max and histogram of streamed values.
+
+    Statistics of chunks are combined as they arrive (Chan et al. for the
+    moments) and two sets of statistics can be merged, so chunks can be
+    processed in any order or in parallel. The histogram has a fixed number
+    of bins, its range doubles (merging pairs of bins) whenever values fall
+    outside of it, percentiles are interpolated within bins. The histogram
+    range is only set once values differ, before that the values are all
+    equal to `min`.
+
+    Chunks are processed in pieces of at most `max_piece_size` values, which
+    bounds the memory of float64 and bin index temporaries.
+    """
+    max_piece_size = 2 ** 20
+
+    def __init__(self, n_bins: int = 1024):
+        if n_bins % 2 != 0:
+            raise ValueError('n_bins must be even')
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.lower: Optional[float] = None
+        self.bin_width = 1.0
+
+    @property
+    def n_bins(self) -> int:
+        return len(self.counts)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count > 0 else np.nan
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    @property
+    def bin_edges(self) -> np.ndarray:
+        return self.lower + self.bin_width * np.arange(self.n_bins + 1)
+
+    def _cover(self, minimum: float, maximum: float):
+        # double the histogram range until it contains [minimum, maximum]
+        if self.lower is None:
+            # constant values are held as (min, count) until the span is known
+            minimum, maximum = min(minimum, self.min), max(maximum, self.max)
+            span = maximum - minimum
+            if span <= 0:
+                return
+            self.bin_width = span / (self.n_bins - 1)
+            self.lower = minimum
+            if self.count > 0:
+                self.counts[self._bin(np.array([self.min]))] += self.count
+        half = self.n_bins // 2
+        while maximum >= self.lower + self.n_bins * self.bin_width:
+            merged = self.counts.reshape((half, 2)).sum(axis=1)
+            self.counts = np.concatenate((merged, np.zeros_like(merged)))
+            self.bin_width *= 2
+        while minimum < self.lower:
+            merged = self.counts.reshape((half, 2)).sum(axis=1)
+            self.counts = np.concatenate((np.zeros_like(merged), merged))
+            self.lower -= self.n_bins * self.bin_width
+            self.bin_width *= 2
+
+    def _bin(self, values: np.ndarray) -> np.ndarray:
+        # computed in the precision of the values
+        bins = ((values - self.lower) / self.bin_width).astype(np.intp)
+        return np.clip(bins, 0, self.n_bins - 1, out=bins)
+
+    def _combine_moments(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update(self, values: np.ndarray):
+        """Add a chunk of values."""
+        values = np.asarray(values).reshape(-1)
+        for start in range(0, values.size, self.max_piece_size):
+            self._update_piece(values[start:start + self.max_piece_size])
+
+    def _update_piece(self, values: np.ndarray):
+        piece_mean = values.mean(dtype=np.float64)
+        piece_m2 = np.var(values, dtype=np.float64) * values.size
+        piece_min, piece_max = float(values.min()), float(values.max())
+
+        self._cover(piece_min, piece_max)
+        if self.lower is not None:
+            self.counts += np.bincount(self._bin(values), minlength=self.n_bins)
+        self._combine_moments(values.size, piece_mean, piece_m2)
+        self.min = min(self.min, piece_min)
+        self.max = max(self.max, piece_max)
+
+    def merge(self, other: 'RunningStatistics'):
+        """Add the values summarised by another set of statistics.
+
+        Histogram counts of `other` are assigned to the bins containing the
+        centers of its bins.
+        """
+        if other.count == 0:
+            return
+        self._cover(other.min, other.max)
+        if other.lower is None:
+            centers, counts = np.array([other.min]), np.array([other.count])
+        else:
+            centers = np.clip(
+                other.bin_edges[:-1] + other.bin_width / 2, other.min, other.max
+            )
+            counts = other.counts
+        if self.lower is not None:
+            self.counts += np.bincount(
+                self._bin(centers), weights=counts, minlength=self.n_bins
+            ).astype(np.int64)
+        self._combine_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def scaled(self, offset: float, scale: float) -> 'RunningStatistics':
+        """Statistics of (values - offset) / scale, for a positive scale."""
+        scaled = RunningStatistics(n_bins=self.n_bins)
+        scaled.count = self.count
+        scaled.mean = (self.mean - offset) / scale
+        scaled.m2 = self.m2 / scale ** 2
+        scaled.min = (self.min - offset) / scale
+        scaled.max = (self.max - offset) / scale
+        scaled.counts = self.counts.copy()
+        if self.lower is not None:
+            scaled.lower = (self.lower - offset) / scale
+        scaled.bin_width = self.bin_width / scale
+        return scaled
+
+    def percentiles(self, q: Sequence[float]) -> np.ndarray:
+        """Percentiles (0 to 100) estimated from the histogram."""
+        q = np.asarray(q, dtype=float)
+        if self.lower is None:
+            # no histogram yet, all values are equal
+            return np.full(q.shape, self.min)
+        cumulative = np.cumsum(self.counts)
+        targets = q / 100 * self.count
+        bins = np.clip(
+            np.searchsorted(cumulative, targets, side='left'), 0, self.n_bins - 1
+        )
+        before = cumulative[bins] - self.counts[bins]
+        within = (targets - before) / np.maximum(self.counts[bins], 1)
+        values = self.lower + (bins + np.clip(within, 0, 1)) * self.bin_width
+        return np.clip(values, self.min, self.max)
+
+    def save(self, file):
+        np.savez(
+            file,
+            moments=np.array([self.count, self.mean, self.m2]),
+            range=np.array([self.min, self.max]),
+            histogram=np.array([
+                np.nan if self.lower is None else self.lower, self.bin_width
+            ]),
+            counts=self.counts,
+        )
+
+    @classmethod
+    def load(cls, file) -> 'RunningStatistics':
+        with np.load(file) as data:
+            statistics = cls(n_bins=len(data['counts']))
+            count, statistics.mean, statistics.m2 = data['moments']
+            statistics.count = int(count)
+            statistics.min, statistics.max = data['range']
+            lower, statistics.bin_width = data['histogram']
+            statistics.lower = None if np.isnan(lower) else lower
+            statistics.counts = data['counts']
+        return statistics
+
+
+def slab_length(volume: np.ndarray, memory_budget: float) -> int:
+    """Number of sections along the first axis of a volume within a budget
+    in bytes, at least one."""
+    section_bytes = np.prod(volume.shape[1:]) * np.dtype(volume.dtype).itemsize
+    return max(1, int(memory_budget // max(section_bytes, 1)))
+
+
+def iter_volume_statistics(
+        volume: np.ndarray,
+        chunk_size: Optional[int] = None,
+        subsample: Optional[float] = None,
+        seed: int = 0,
+        n_bins: int = 1024,
+        memory_budget: float = 64e6,
+) -> ProgressGenerator[RunningStatistics]:
+    """Statistics of a volume in one streaming pass over chunks.
+
+    By default every slab of `chunk_size` along the first axis is read, slabs
+    are as long as fit in `memory_budget` bytes if `chunk_size` is None. If
+    `subsample` is a fraction, only that fraction of the chunk_size^3 blocks
+    (64^3 by default) of the volume, chosen reproducibly from `seed`, is
+    read. The fraction of chunks processed is yielded after each chunk.
+    """
+    statistics = RunningStatistics(n_bins=n_bins)
+    if subsample is None:
+        if chunk_size is None:
+            chunk_size = slab_length(volume, memory_budget)
+        chunks = [
+            (slice(start, start + chunk_size), )
+            for start in range(0, volume.shape[0], chunk_size)
+        ]
+    else:
+        if chunk_size is None:
+            chunk_size = 64
+        grid_shape = -(-np.array(volume.shape) // chunk_size)
+        n_blocks = int(np.prod(grid_shape))
+        n_chosen = int(np.clip(np.round(subsample * n_blocks), 1, n_blocks))
+        blocks = np.random.default_rng(seed).choice(
+            n_blocks, size=n_chosen, replace=False
+        )
+        # read in storage order
+        chunks = [
+            tuple(slice(i * chunk_size, (i + 1) * chunk_size) for i in block)
+            for block in zip(*np.unravel_index(np.sort(blocks), grid_shape))
+        ]
+    for idx, chunk in enumerate(chunks, start=1):
+        statistics.update(np.asarray(volume[chunk]))
+        yield idx / len(chunks)
+    return statistics